@@ -16,8 +16,23 @@ admin.site.register(User, CustomUserAdmin)
 admin.site.register(Category)
 admin.site.register(UserProfile)
 admin.site.register(Transaction)
+admin.site.register(ArchivedTransaction)
+admin.site.register(TransactionSummary)
 admin.site.register(Budget)
 admin.site.register(RecurringPayment)
 admin.site.register(Alert)
 admin.site.register(RecurringIncome)
 admin.site.register(Goal)
+admin.site.register(ArchivedAlert)
+admin.site.register(GoalContribution)
+
+
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    list_display = ('job', 'run_date', 'status', 'attempts', 'processed', 'skipped', 'failed', 'duration', 'rows_per_second')
+    list_filter = ('job', 'status')
+
+
+admin.site.register(JobItem)
+admin.site.register(ExchangeRate)
+admin.site.register(ChangeLog)
@@ -0,0 +1,163 @@
+"""
+Instantánea columnar de las transacciones de un usuario para los gráficos.
+
+Las transacciones se leen una sola vez con ``values_list`` y se guardan como
+arrays de NumPy: día local (int64, días desde 1970-01-01), importe en
+céntimos ya convertido a la divisa del perfil (int64), categoría (int32, -1
+sin categoría) y tipo (bool). Son 21 bytes por transacción, frente a varios
+cientos de un objeto del ORM con su ``Decimal``.
+
+Todas las series del dashboard se calculan sobre esos arrays con
+agrupaciones vectorizadas (``np.unique`` + ``np.bincount``). La instantánea se
+guarda en la caché como un blob binario y se invalida al cambiar las
+transacciones o el perfil del usuario.
+"""
+import struct
+from datetime import date
+
+import numpy as np
+from django.db.models import BigIntegerField
+from django.db.models.functions import Cast, Round, TruncDate
+from django.utils import timezone
+
+from .cache import UserCache
+from .categories import category_registry
+from .currency import converted_amount, rate_table
+from .models import Transaction
+
+EPOCH = date(1970, 1, 1)
+HEADER = struct.Struct('<Q')
+
+analytics_cache = UserCache('analytics', timeout=600)
+
+
+def day_number(moment):
+    """Días desde 1970-01-01 de una fecha o de un datetime (en su propia zona)"""
+    if hasattr(moment, 'hour'):
+        moment = moment.date()
+    return (moment - EPOCH).days
+
+
+def month_bounds(periods):
+    """Límites en días de una lista de meses contiguos: n+1 valores para n meses"""
+    return [day_number(period.start) for period in periods] + [day_number(periods[-1].end)]
+
+
+def category_name(category_id):
+    category = category_registry.get(category_id) if category_id >= 0 else None
+    return category.name if category else None
+
+
+class TransactionSnapshot:
+    __slots__ = ('days', 'cents', 'categories', 'is_expense')
+
+    def __init__(self, days, cents, categories, is_expense):
+        self.days = days
+        self.cents = cents
+        self.categories = categories
+        self.is_expense = is_expense
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def nbytes(self):
+        return self.days.nbytes + self.cents.nbytes + self.categories.nbytes + self.is_expense.nbytes
+
+    @classmethod
+    def build(cls, user, tz=None):
+        """Lee las transacciones del usuario en una sola consulta"""
+        tz = tz or timezone.get_current_timezone()
+        rows = list(Transaction.objects.filter(user=user).order_by().values_list(
+            TruncDate('date', tzinfo=tz),
+            Cast(Round(converted_amount(user.profile.currency) * 100), BigIntegerField()),
+            'category_id',
+            'is_expense',
+        ))
+        days, cents, categories, is_expense = zip(*rows) if rows else ((), (), (), ())
+        return cls(
+            np.array(days, dtype='datetime64[D]').astype(np.int64),
+            np.array(cents, dtype=np.int64),
+            np.array([-1 if c is None else c for c in categories], dtype=np.int32),
+            np.array(is_expense, dtype=bool),
+        )
+
+    def to_bytes(self):
+        return b''.join((
+            HEADER.pack(len(self)),
+            self.days.tobytes(),
+            self.cents.tobytes(),
+            self.categories.tobytes(),
+            self.is_expense.tobytes(),
+        ))
+
+    @classmethod
+    def from_bytes(cls, blob):
+        (count,) = HEADER.unpack_from(blob)
+        offset = HEADER.size
+        columns = []
+        for dtype in (np.int64, np.int64, np.int32, bool):
+            column = np.frombuffer(blob, dtype=dtype, count=count, offset=offset)
+            offset += column.nbytes
+            columns.append(column)
+        return cls(*columns)
+
+    def _mask(self, start=None, end=None, is_expense=None):
+        """Filas en ``[start, end)`` (números de día) y del tipo indicado"""
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self.days >= start
+        if end is not None:
+            mask &= self.days < end
+        if is_expense is not None:
+            mask &= self.is_expense == is_expense
+        return mask
+
+    def totals_by_category(self, start=None, end=None, is_expense=True):
+        """Diccionario {categoría: céntimos}; las categorías sin filas no aparecen"""
+        mask = self._mask(start, end, is_expense)
+        categories, inverse = np.unique(self.categories[mask], return_inverse=True)
+        totals = np.bincount(inverse, weights=self.cents[mask], minlength=len(categories))
+        return {int(c): int(t) for c, t in zip(categories, totals)}
+
+    def top_categories(self, k, is_expense=True, extra=None):
+        """Las ``k`` categorías con más importe acumulado, sumando los céntimos de ``extra`` (archivo)"""
+        totals = self.totals_by_category(is_expense=is_expense)
+        for category_id, cents in (extra or {}).items():
+            totals[category_id] = totals.get(category_id, 0) + cents
+        return sorted(totals, key=totals.get, reverse=True)[:k]
+
+    def totals_by_bucket(self, bounds, is_expense=None, categories=None):
+        """
+        Suma por intervalo ``[bounds[i], bounds[i+1])``. Con ``categories``
+        devuelve una matriz categoría x intervalo.
+        """
+        bounds = np.asarray(bounds, dtype=np.int64)
+        buckets = len(bounds) - 1
+        mask = self._mask(bounds[0], bounds[-1], is_expense)
+        bucket = np.searchsorted(bounds, self.days[mask], side='right') - 1
+        cents = self.cents[mask]
+
+        if categories is None:
+            return np.bincount(bucket, weights=cents, minlength=buckets).astype(np.int64)
+
+        selected = np.isin(self.categories[mask], categories)
+        order = np.argsort(categories)
+        sorted_categories = np.asarray(categories, dtype=np.int32)[order]
+        position = np.searchsorted(sorted_categories, self.categories[mask][selected])
+        row = order[position]
+        flat = np.bincount(
+            row * buckets + bucket[selected], weights=cents[selected], minlength=len(categories) * buckets
+        )
+        return flat.reshape(len(categories), buckets).astype(np.int64)
+
+
+def load_snapshot(user):
+    """Instantánea del usuario, cacheada como blob binario"""
+    tz = timezone.get_current_timezone()
+    blob = analytics_cache.get_or_set(
+        user.pk,
+        lambda: TransactionSnapshot.build(user, tz).to_bytes(),
+        user.profile.currency, str(tz), rate_table.version()
+    )
+    return TransactionSnapshot.from_bytes(blob)
@@ -0,0 +1,202 @@
+"""
+Detección de gastos anómalos sobre el histórico de transacciones.
+
+Para cada grupo (usuario, categoría, divisa) se calculan estadísticos robustos
+con NumPy, sin bucles por grupo:
+
+- Transacciones: puntuación z robusta ``0.6745 * (x - mediana) / MAD`` frente
+  a los gastos del último año; se marca por encima de ``Z_THRESHOLD``.
+- Meses: el total del mes en curso frente a la mediana de los 12 meses
+  anteriores, corregida por estacionalidad con el mismo mes del año pasado.
+
+El proceso es incremental: solo se analizan los usuarios y grupos con
+transacciones nuevas desde la última marca de agua (el último pk procesado).
+"""
+import numpy as np
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .categories import category_registry
+from .models import Alert, Transaction
+from .periods import month_period
+
+Z_THRESHOLD = 3.5
+MIN_HISTORY = 6  # Mínimo de gastos previos en el grupo para opinar
+MAD_SCALE = 1.4826  # MAD -> desviación típica en una normal
+BASELINE_DAYS = 365
+HISTORY_MONTHS = 19  # Mes actual + 12 de referencia + contexto del año anterior
+RECENT_DAYS = 7  # Las transacciones nuevas más antiguas que esto no generan alertas
+
+
+def group_median(groups, values):
+    """Mediana por grupo: devuelve (grupos, medianas, tamaños) ordenados por grupo"""
+    if len(groups) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=float), np.array([], dtype=np.int64)
+    order = np.lexsort((values, groups))
+    sorted_groups = groups[order]
+    sorted_values = values[order]
+    unique, starts, counts = np.unique(sorted_groups, return_index=True, return_counts=True)
+    medians = (sorted_values[starts + (counts - 1) // 2] + sorted_values[starts + counts // 2]) / 2
+    return unique, medians, counts
+
+
+def group_median_mad(groups, values):
+    """Mediana y MAD (desviación absoluta mediana) por grupo"""
+    unique, medians, counts = group_median(groups, values)
+    if len(unique) == 0:
+        return unique, medians, medians.copy(), counts
+    deviations = np.abs(values - medians[np.searchsorted(unique, groups)])
+    _, mads, _ = group_median(groups, deviations)
+    return unique, medians, mads, counts
+
+
+def robust_scale(medians, mads):
+    """MAD con un mínimo (5 % de la mediana, 1 céntimo) para grupos de gasto constante"""
+    return np.maximum(mads, np.maximum(np.abs(medians) * 0.05, 1))
+
+
+def transaction_scores(baseline_groups, baseline_cents, target_groups, target_cents):
+    """
+    Puntuación z robusta de cada transacción objetivo frente a su grupo;
+    NaN si el grupo no tiene suficiente histórico.
+    """
+    unique, medians, mads, counts = group_median_mad(baseline_groups, baseline_cents)
+    scores = np.full(len(target_groups), np.nan)
+    if len(unique) == 0:
+        return scores, np.full(len(target_groups), np.nan)
+
+    index = np.clip(np.searchsorted(unique, target_groups), 0, len(unique) - 1)
+    known = (unique[index] == target_groups) & (counts[index] >= MIN_HISTORY)
+    scale = robust_scale(medians[index], mads[index])
+    scores[known] = 0.6745 * (target_cents[known] - medians[index][known]) / scale[known]
+    expected = np.where(known, medians[index], np.nan)
+    return scores, expected
+
+
+def monthly_expectations(totals):
+    """
+    ``totals`` es una matriz grupo x meses atrás (columna 0 = mes en curso).
+    Devuelve (esperado, umbral) del mes en curso por grupo.
+    """
+    reference = totals[:, 1:13]
+    median = np.median(reference, axis=1)
+    mad = np.median(np.abs(reference - median[:, None]), axis=1)
+
+    # Estacionalidad: el mismo mes del año pasado frente a su entorno
+    last_year = totals[:, 12]
+    last_year_context = np.median(totals[:, 7:19], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = np.where((last_year > 0) & (last_year_context > 0), last_year / last_year_context, 1.0)
+    factor = np.clip(factor, 0.5, 2.0)
+
+    expected = median * factor
+    threshold = expected + Z_THRESHOLD * MAD_SCALE * robust_scale(median, mad)
+    enough = np.count_nonzero(reference, axis=1) >= MIN_HISTORY
+    return expected, np.where(enough, np.maximum(threshold, expected * 1.5), np.inf)
+
+
+def _load(user_ids, since, tz):
+    rows = list(
+        Transaction.objects.filter(user_id__in=user_ids, is_expense=True, date__gte=since)
+        .order_by()
+        .values_list('pk', 'user_id', 'category_id', 'currency', TruncDate('date', tzinfo=tz), 'amount')
+    )
+    if not rows:
+        return None
+    pks, users, categories, currencies, days, amounts = zip(*rows)
+    currency_names, currency_index = np.unique(currencies, return_inverse=True)
+    keys = np.stack([
+        np.array(users, dtype=np.int64),
+        np.array([-1 if c is None else c for c in categories], dtype=np.int64),
+        currency_index.reshape(-1),
+    ])
+    # Cada columna de ``keys`` es un grupo (usuario, categoría, divisa)
+    keys, groups = np.unique(keys, axis=1, return_inverse=True)
+    return {
+        'pk': np.array(pks, dtype=np.int64),
+        'group': groups.reshape(-1),
+        'keys': keys,
+        'currencies': currency_names,
+        'day': np.array(days, dtype='datetime64[D]'),
+        'cents': np.round(np.array(amounts, dtype=float) * 100),
+    }
+
+
+def _describe(data, group):
+    """(usuario, nombre de categoría, divisa) de un grupo"""
+    user_id, category_id, currency = data['keys'][:, group]
+    category = category_registry.get(int(category_id)) if category_id >= 0 else None
+    return int(user_id), category.name if category else "Sin categoría", data['currencies'][currency]
+
+
+def detect(user_ids, watermark, now=None):
+    """
+    Alertas (sin guardar) de las transacciones y meses anómalos de los usuarios
+    indicados, considerando nuevas las transacciones con pk > ``watermark``.
+    """
+    now = now or timezone.now()
+    tz = timezone.get_current_timezone()
+    today = np.datetime64(timezone.localdate(now, tz), 'D')
+    current_month = today.astype('datetime64[M]')
+    since = month_period(now, tz, offset=-(HISTORY_MONTHS - 1)).start
+
+    data = _load(user_ids, since, tz)
+    if data is None:
+        return []
+
+    new = data['pk'] > watermark
+    target = new & (data['day'] >= today - RECENT_DAYS)
+    baseline = ~new & (data['day'] >= today - BASELINE_DAYS)
+    alerts = []
+
+    # Transacciones anómalas
+    scores, expected = transaction_scores(
+        data['group'][baseline], data['cents'][baseline], data['group'][target], data['cents'][target]
+    )
+    flagged = scores > Z_THRESHOLD
+    for pk, group, cents, usual in zip(
+        data['pk'][target][flagged], data['group'][target][flagged],
+        data['cents'][target][flagged], expected[flagged]
+    ):
+        user_id, category, currency = _describe(data, group)
+        alerts.append(Alert(
+            user_id=user_id,
+            dedup_key=Alert.build_dedup_key('anomaly', int(pk)),
+            alert_type='system',
+            title=f"Gasto inusual en {category}",
+            message=(
+                f"Un gasto de {cents / 100:.2f} {currency} es muy superior a lo habitual "
+                f"en esta categoría (mediana {usual / 100:.2f} {currency})."
+            ),
+        ))
+
+    # Meses anómalos: solo los grupos con transacciones nuevas
+    touched = np.unique(data['group'][new])
+    months_back = (current_month - data['day'].astype('datetime64[M]')).astype(np.int64)
+    in_window = np.isin(data['group'], touched) & (months_back >= 0) & (months_back < HISTORY_MONTHS)
+    row = np.searchsorted(touched, data['group'][in_window])
+    totals = np.bincount(
+        row * HISTORY_MONTHS + months_back[in_window],
+        weights=data['cents'][in_window],
+        minlength=len(touched) * HISTORY_MONTHS
+    ).reshape(len(touched), HISTORY_MONTHS)
+
+    expected, threshold = monthly_expectations(totals)
+    flagged = totals[:, 0] > threshold
+    for group, total, usual in zip(touched[flagged], totals[flagged, 0], expected[flagged]):
+        user_id, category, currency = _describe(data, group)
+        alerts.append(Alert(
+            user_id=user_id,
+            # Los grupos son por divisa: la clave la incluye para no descartar la alerta de otra divisa
+            dedup_key=Alert.build_dedup_key(
+                'anomaly_month', int(data['keys'][1, group]), f"{current_month}:{currency}"
+            ),
+            alert_type='system',
+            title=f"Gasto mensual inusual en {category}",
+            message=(
+                f"Este mes llevas {total / 100:.2f} {currency} en {category}, "
+                f"cuando lo normal son unos {usual / 100:.2f} {currency}."
+            ),
+        ))
+
+    return alerts
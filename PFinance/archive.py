@@ -0,0 +1,124 @@
+"""
+Archivo en frío de las transacciones antiguas.
+
+El comando ``archive_transactions`` mueve las transacciones de años cerrados
+a ``ArchivedTransaction`` y mantiene ``TransactionSummary`` con los totales
+anuales por (usuario, año, categoría, tipo, divisa). La tabla principal solo
+conserva los últimos años, que son los que leen el dashboard y las señales.
+
+Las consultas que pueden necesitar datos archivados pasan por aquí:
+
+- Los totales históricos (balance, lista de transacciones, top de
+  categorías, gasto total de un presupuesto) suman los resúmenes anuales, que
+  son unas pocas filas por usuario y año. Se convierten a la divisa del
+  perfil con el tipo del último día de cada año.
+- Los rangos de fechas solo consultan ``ArchivedTransaction`` si empiezan
+  antes del corte; en ese caso la conversión es por fila, como en la tabla
+  principal.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+
+from .cache import KEY_PREFIX, UserCache
+from .currency import convert, converted_sum, rate_table
+from .models import ArchivedTransaction, TransactionSummary
+
+CUTOFF_KEY = f"{KEY_PREFIX}:archive:cutoff"
+
+archive_cache = UserCache('archive', timeout=86400)
+
+
+def archive_cutoff():
+    """Inicio del primer año sin archivar (medianoche local), o None si no hay archivo"""
+    year = cache.get(CUTOFF_KEY)
+    if year is None:
+        # 0 = sin archivo; se guarda igualmente para no repetir la consulta
+        year = TransactionSummary.objects.aggregate(year=Max('year'))['year'] or 0
+        cache.set(CUTOFF_KEY, year, timeout=None)
+    if not year:
+        return None
+    return timezone.make_aware(datetime(year + 1, 1, 1), timezone.get_default_timezone())
+
+
+def needs_archive(start=None):
+    """Si un rango que empieza en ``start`` (None = sin límite) incluye datos archivados"""
+    cutoff = archive_cutoff()
+    return cutoff is not None and (start is None or start < cutoff)
+
+
+def rebuild_summaries(pairs):
+    """Recalcula los resúmenes de los pares (usuario, año) a partir del archivo"""
+    for user_id, year in pairs:
+        TransactionSummary.objects.filter(user_id=user_id, year=year).delete()
+        rows = (
+            ArchivedTransaction.objects.filter(user_id=user_id)
+            .annotate(year=ExtractYear('date', tzinfo=timezone.get_default_timezone()))
+            .filter(year=year)
+            .values('category_id', 'is_expense', 'currency')
+            .annotate(total=Sum('amount'), count=Count('pk'))
+            .order_by()
+        )
+        TransactionSummary.objects.bulk_create([
+            TransactionSummary(user_id=user_id, year=year, **values) for values in rows
+        ])
+    cache.delete(CUTOFF_KEY)
+
+
+def _summary_totals(user_id, currency):
+    """{(is_expense, categoría): Decimal} de todos los años archivados en ``currency``"""
+    totals = {}
+    for year, category_id, is_expense, source, total in TransactionSummary.objects.filter(
+        user_id=user_id
+    ).values_list('year', 'category_id', 'is_expense', 'currency', 'total'):
+        key = (is_expense, category_id)
+        totals[key] = totals.get(key, Decimal('0')) + convert(total, source, currency, date(year, 12, 31))
+    return totals
+
+
+def archived_totals(user_id, currency):
+    """Totales históricos del archivo por (tipo, categoría), cacheados hasta el siguiente archivado"""
+    if archive_cutoff() is None:
+        return {}
+    return archive_cache.get_or_set(
+        user_id, lambda: _summary_totals(user_id, currency), currency, rate_table.version()
+    )
+
+
+def archived_total(user_id, currency, is_expense=None, category_id=None):
+    """Suma de los totales históricos archivados con los filtros indicados"""
+    return sum(
+        (total for (expense, category), total in archived_totals(user_id, currency).items()
+         if (is_expense is None or expense == is_expense)
+         and (category_id is None or category == category_id)),
+        Decimal('0')
+    )
+
+
+def archived_category_cents(user_id, currency, is_expense=True):
+    """Totales archivados por categoría en céntimos, con el formato de ``TransactionSnapshot`` (-1 sin categoría)"""
+    cents = {}
+    for (expense, category_id), total in archived_totals(user_id, currency).items():
+        if expense == is_expense:
+            key = -1 if category_id is None else category_id
+            cents[key] = cents.get(key, 0) + int(round(total * 100))
+    return cents
+
+
+def archived_range_total(user_id, currency, start, end, **filters):
+    """
+    Suma del archivo en ``[start, end)`` convertida a ``currency``. Devuelve 0
+    sin consultar si el rango empieza después del corte.
+    """
+    if not needs_archive(start):
+        return Decimal('0')
+    query = Q(user_id=user_id, date__lt=end, **filters)
+    if start is not None:
+        query &= Q(date__gte=start)
+    return ArchivedTransaction.objects.filter(query).aggregate(
+        total=converted_sum(currency, stored=False)
+    )['total'] or Decimal('0')
@@ -0,0 +1,162 @@
+"""
+Índice de presupuestos activos por usuario para las señales de transacciones.
+
+Cada gasto guardado o borrado necesita saber si su categoría tiene un
+presupuesto activo y si el usuario quiere notificaciones. En lugar de
+consultarlo cada vez, se cachea por usuario un diccionario
+``{category_id: presupuesto}`` junto con los datos del perfil que usan las
+señales. Se invalida al guardar o borrar un ``Budget`` o el ``UserProfile``.
+
+``apply_spend`` y ``sync_budget_alert`` aplican un cambio de gasto a un
+período y a su alerta; los usan las señales (una transacción) y las
+operaciones en bloque (una vez por presupuesto y período).
+"""
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.utils import timezone
+
+from .cache import UserCache, alerts_cache
+from .categories import category_registry
+from .currency import convert
+from .models import Alert, Budget, BudgetPeriod, ChangeLog, UserProfile
+from .periods import budget_period
+
+budgets_cache = UserCache('budgets', timeout=3600)
+
+
+def _build_index(user_id):
+    profile = UserProfile.objects.filter(user_id=user_id).values(
+        'notification_app', 'currency', 'timezone'
+    ).first() or {}
+    # Sin perfil: sin notificaciones y transacciones sin divisa, como antes
+    return {
+        'notifications': profile.get('notification_app', False),
+        'currency': profile.get('currency', ''),
+        'timezone': profile.get('timezone', settings.TIME_ZONE),
+        'budgets': {
+            budget['category_id']: budget
+            for budget in Budget.objects.filter(user_id=user_id, is_active=True).values(
+                'pk', 'user_id', 'category_id', 'amount', 'frequency', 'rollover', 'state'
+            )
+        },
+    }
+
+
+def budget_index(user_id):
+    """Presupuestos activos del usuario por categoría y preferencias del perfil"""
+    return budgets_cache.get_or_set(user_id, lambda: _build_index(user_id))
+
+
+def active_budget(index, category_id):
+    """``Budget`` (sin consultar la base de datos) activo para la categoría, o None"""
+    values = index['budgets'].get(category_id)
+    return Budget(**values) if values else None
+
+
+# Orden de gravedad de los estados: la alerta vuelve a no leída solo si empeora
+STATE_RANK = {'ok': 0, 'limit': 1, 'overlimit': 2}
+
+
+def apply_spend(index, budget, period, delta):
+    """
+    Suma ``delta`` (en la divisa del perfil) al período del presupuesto y, si
+    es el vigente, refleja el estado en el presupuesto. Devuelve la fila y el
+    estado que tenía antes del cambio.
+    """
+    row = BudgetPeriod.add_spent(budget, period, index['currency'], delta)
+
+    if timezone.now() in period and budget.state != row.state:
+        Budget.objects.filter(pk=budget.pk).update(state=row.state)
+        ChangeLog.record(Budget, [(budget.pk, budget.user_id)])
+        budgets_cache.invalidate(budget.user_id)
+
+    return row, BudgetPeriod.state_for(row.amount, row.spent - delta)
+
+
+def budget_alert_text(index, budget, period, row):
+    category = category_registry.get(budget.category_id)
+    if row.state == 'overlimit':
+        title = f"Presupuesto traspasa el límite: {category.name}"
+    else:
+        title = f"Presupuesto al límite: {category.name}"
+    message = (
+        f"Has gastado {row.spent:.2f}{index['currency']} "
+        f"({(row.spent / row.amount) * 100:.1f}%) "
+        f"del presupuesto {period.description}"
+    )
+    return title, message
+
+
+def sync_budget_alert(index, budget, period, row, previous_state):
+    """
+    Una sola alerta por presupuesto y período: se crea o actualiza a partir
+    del 90 % y se borra al volver por debajo. En un período ya cerrado solo
+    se corrige o borra la existente, sin crearla ni marcarla como no leída.
+    """
+    dedup_key = Alert.build_dedup_key('budget', budget.pk, period.key)
+    if row.state == 'ok':
+        if previous_state != 'ok':
+            for alert in Alert.objects.filter(user_id=budget.user_id, dedup_key=dedup_key):
+                alert.delete()
+        return
+
+    title, message = budget_alert_text(index, budget, period, row)
+    if timezone.now() not in period:
+        existing = Alert.objects.filter(user_id=budget.user_id, dedup_key=dedup_key)
+        pks = list(existing.values_list('pk', flat=True))
+        if pks:
+            existing.update(title=title, message=message)
+            ChangeLog.record(Alert, [(pk, budget.user_id) for pk in pks])
+            alerts_cache.invalidate(budget.user_id)
+        return
+    if not index['notifications']:
+        return
+
+    Alert.upsert(
+        user=budget.user,
+        dedup_key=dedup_key,
+        alert_type='budget',
+        title=title,
+        message=message,
+        mark_unread=STATE_RANK[row.state] > STATE_RANK[previous_state],
+        # La alerta referencia el presupuesto y el período; sus transacciones
+        # se resuelven con una consulta de rango al mostrarla
+        budget_id=budget.pk,
+        period=period
+    )
+
+
+def spend_amount(row, currency):
+    """Importe de la fila en ``currency``: el fijado al guardarla si está en esa divisa"""
+    if row['profile_amount'] is not None and row['profile_currency'] == currency:
+        return row['profile_amount']
+    return convert(row['amount'], row['currency'], currency, row['date'])
+
+
+def collect_spend(index, rows, sign, deltas):
+    """
+    Acumula en ``deltas`` el gasto de ``rows`` (diccionarios con
+    ``Transaction.SPEND_FIELDS``) por (presupuesto, inicio del período).
+    """
+    tz = ZoneInfo(index['timezone'])
+    for row in rows:
+        if not row['is_expense']:
+            continue
+        budget = index['budgets'].get(row['category_id'])
+        if budget is None:
+            continue
+        period = budget_period(budget['frequency'], row['date'], tz)
+        entry = deltas.setdefault((budget['pk'], period.start), [row['category_id'], period, Decimal('0')])
+        entry[2] += sign * spend_amount(row, index['currency'])
+
+
+def apply_spend_deltas(index, deltas):
+    """Ajusta cada período de ``deltas`` una sola vez y sincroniza su alerta"""
+    for category_id, period, delta in deltas.values():
+        if not delta:
+            continue
+        budget = active_budget(index, category_id)
+        row, previous_state = apply_spend(index, budget, period, delta)
+        sync_budget_alert(index, budget, period, row, previous_state)
@@ -0,0 +1,107 @@
+"""
+Operaciones en bloque sobre transacciones: borrar, recategorizar y editar.
+
+Cada operación es una sola transacción de base de datos con un ``update()``
+o ``delete()`` sobre la selección. Las señales de transacciones se
+desactivan durante el borrado (``coalesced_signals``): en lugar de ajustar el
+presupuesto fila a fila, los importes se agrupan por (presupuesto, período)
+y cada período se ajusta una sola vez, con su alerta. El registro de cambios
+y la caché de analítica también se actualizan una sola vez.
+"""
+from django.db import transaction as db_transaction
+
+from .analytics import analytics_cache
+from .budgets import apply_spend_deltas, budget_index, collect_spend
+from .categories import category_registry
+from .models import ChangeLog, Transaction
+from .signals import coalesced_signals
+
+# Campos que admite la edición en bloque
+EDITABLE_FIELDS = ('category', 'description', 'date', 'is_expense')
+# Los que cambian el gasto de algún presupuesto
+BUDGET_FIELDS = {'category', 'date', 'is_expense'}
+# Los que deben seguir concordando: un gasto no puede quedar en una categoría de ingresos
+KIND_FIELDS = {'category', 'is_expense'}
+
+
+def _locked_rows(user, pks):
+    """Transacciones del usuario entre ``pks``, bloqueadas hasta el final de la transacción"""
+    return list(
+        Transaction.objects.filter(user=user, pk__in=pks).select_for_update().values('pk', *Transaction.SPEND_FIELDS)
+    )
+
+
+def _check_kinds(rows):
+    """``ValueError`` si alguna fila queda con un tipo distinto al de su categoría"""
+    for row in rows:
+        category = category_registry.get(row['category_id']) if row['category_id'] else None
+        if category is not None and category.is_expense != row['is_expense']:
+            kind = "gastos" if category.is_expense else "ingresos"
+            raise ValueError(f"La categoría '{category.name}' solo admite {kind}")
+
+
+def bulk_delete(user, pks):
+    """Borra las transacciones seleccionadas del usuario. Devuelve cuántas se borraron"""
+    with db_transaction.atomic():
+        rows = _locked_rows(user, pks)
+        if not rows:
+            return 0
+        selected = [row['pk'] for row in rows]
+
+        with coalesced_signals():
+            Transaction.objects.filter(pk__in=selected).delete()
+        ChangeLog.record(Transaction, [(pk, user.pk) for pk in selected], deleted=True)
+
+        index = budget_index(user.pk)
+        deltas = {}
+        collect_spend(index, rows, -1, deltas)
+        apply_spend_deltas(index, deltas)
+
+    analytics_cache.invalidate(user.pk)
+    return len(rows)
+
+
+def bulk_update(user, pks, **changes):
+    """
+    Aplica ``changes`` (campos de ``EDITABLE_FIELDS``) a las transacciones
+    seleccionadas del usuario. Devuelve cuántas se actualizaron. Lanza
+    ``ValueError`` si alguna fila quedaría con un tipo distinto al de su categoría.
+    """
+    unknown = set(changes) - set(EDITABLE_FIELDS)
+    if unknown or not changes:
+        raise ValueError(f"Campos no editables en bloque: {', '.join(sorted(unknown)) or '-'}")
+
+    with db_transaction.atomic():
+        rows = _locked_rows(user, pks)
+        if not rows:
+            return 0
+        selected = [row['pk'] for row in rows]
+
+        new_values = {
+            ('category_id' if field == 'category' else field): value
+            for field, value in changes.items() if field in BUDGET_FIELDS
+        }
+        if 'category_id' in new_values:
+            category = new_values['category_id']
+            new_values['category_id'] = category.pk if category is not None else None
+        if KIND_FIELDS & set(changes):
+            _check_kinds([{**row, **new_values} for row in rows])
+
+        Transaction.objects.filter(pk__in=selected).update(**changes)
+        ChangeLog.record(Transaction, [(pk, user.pk) for pk in selected])
+
+        if new_values:
+            # Se resta lo que sumaba cada fila y se suma lo que suma ahora
+            index = budget_index(user.pk)
+            deltas = {}
+            collect_spend(index, rows, -1, deltas)
+            collect_spend(index, [{**row, **new_values} for row in rows], 1, deltas)
+            apply_spend_deltas(index, deltas)
+
+    analytics_cache.invalidate(user.pk)
+    return len(rows)
+
+
+def bulk_recategorize(user, pks, category):
+    """Cambia la categoría de las transacciones seleccionadas"""
+    return bulk_update(user, pks, category=category)
@@ -0,0 +1,189 @@
+"""
+Subsistema de caché de PFinance.
+
+Todas las entradas por usuario se guardan bajo claves versionadas
+(``pfinance:<espacio>:<usuario>:v<versión>:...``). Invalidar un espacio de
+nombres consiste en incrementar su versión: las claves antiguas dejan de
+leerse y caducan solas, sin tener que borrarlas una a una.
+
+Las lecturas usan expiración probabilística anticipada (XFetch) para evitar
+estampidas: cuando una entrada está a punto de caducar, algún proceso la
+recalcula antes de tiempo en lugar de hacerlo todos a la vez.
+
+Los contadores de aciertos y fallos se acumulan en memoria de proceso y se
+vuelcan a la caché como mucho cada ``STATS_FLUSH_SECONDS`` (y al
+consultarlos), para no añadir escrituras a cada lectura.
+"""
+import math
+import random
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+
+KEY_PREFIX = 'pfinance'
+STATS_KEYS = ('hits', 'misses')
+STATS_FLUSH_SECONDS = 10
+
+
+def _incr(key, delta=1):
+    """Incrementa un contador en la caché creándolo si no existe"""
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout=None):
+            return delta
+        return cache.incr(key, delta)
+
+
+class PendingStats:
+    """Contadores del proceso pendientes de volcar a la caché compartida"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._flushed_at = time.monotonic()
+
+    def record(self, stat, namespace):
+        with self._lock:
+            self._counts[f"{KEY_PREFIX}:stats:{stat}"] += 1
+            self._counts[f"{KEY_PREFIX}:stats:{namespace}:{stat}"] += 1
+            due = time.monotonic() - self._flushed_at >= STATS_FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Un incremento por contador con todo lo acumulado desde el último volcado"""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._flushed_at = time.monotonic()
+        for key, delta in counts.items():
+            _incr(key, delta)
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+            self._flushed_at = time.monotonic()
+
+
+pending_stats = PendingStats()
+
+
+def _record(stat, namespace):
+    pending_stats.record(stat, namespace)
+
+
+def cache_stats(namespaces=None):
+    """Devuelve los contadores de aciertos/fallos (globales y por espacio)"""
+    # Lo pendiente de este proceso; el resto de procesos vuelca en su próximo intervalo
+    pending_stats.flush()
+    namespaces = namespaces if namespaces is not None else sorted(UserCache.registry)
+    keys = [f"{KEY_PREFIX}:stats:{stat}" for stat in STATS_KEYS]
+    keys += [f"{KEY_PREFIX}:stats:{ns}:{stat}" for ns in namespaces for stat in STATS_KEYS]
+    values = cache.get_many(keys)
+
+    def block(prefix):
+        hits = values.get(f"{prefix}:hits", 0)
+        misses = values.get(f"{prefix}:misses", 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+
+    stats = block(f"{KEY_PREFIX}:stats")
+    stats['namespaces'] = {ns: block(f"{KEY_PREFIX}:stats:{ns}") for ns in namespaces}
+    return stats
+
+
+def reset_cache_stats():
+    pending_stats.clear()
+    namespaces = sorted(UserCache.registry)
+    keys = [f"{KEY_PREFIX}:stats:{stat}" for stat in STATS_KEYS]
+    keys += [f"{KEY_PREFIX}:stats:{ns}:{stat}" for ns in namespaces for stat in STATS_KEYS]
+    cache.delete_many(keys)
+
+
+class UserCache:
+    """
+    Caché versionada por usuario para un espacio de nombres concreto.
+
+    Uso::
+
+        budgets_cache = UserCache('budgets', timeout=600)
+        data = budgets_cache.get_or_set(user.pk, lambda: build(user))
+        budgets_cache.invalidate(user.pk)
+    """
+
+    registry: dict[str, 'UserCache'] = {}
+
+    def __init__(self, namespace: str, timeout: int = 300, beta: float = 1.0):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.beta = beta
+        UserCache.registry[namespace] = self
+
+    def _version_key(self, user_id: int) -> str:
+        return f"{KEY_PREFIX}:{self.namespace}:{user_id}:version"
+
+    def version(self, user_id: int) -> int:
+        """Versión actual del espacio para el usuario"""
+        key = self._version_key(user_id)
+        version = cache.get(key)
+        if version is None:
+            # Una versión basada en el reloj nunca reutiliza claves antiguas
+            # aunque la entrada de versión haya sido expulsada de la caché.
+            cache.add(key, time.time_ns() // 1000, timeout=None)
+            version = cache.get(key)
+        return version
+
+    def key(self, user_id: int, *parts) -> str:
+        suffix = ':'.join(str(part) for part in parts)
+        key = f"{KEY_PREFIX}:{self.namespace}:{user_id}:v{self.version(user_id)}"
+        return f"{key}:{suffix}" if suffix else key
+
+    def invalidate(self, user_id: int) -> None:
+        """Invalida todas las entradas del usuario en este espacio"""
+        key = self._version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns() // 1000, timeout=None)
+
+    @classmethod
+    def invalidate_user(cls, user_id: int) -> None:
+        """Invalida todos los espacios de nombres de un usuario"""
+        for user_cache in cls.registry.values():
+            user_cache.invalidate(user_id)
+
+    def get_or_set(self, user_id: int, builder, *parts, timeout: int | None = None):
+        """
+        Devuelve el valor cacheado o lo calcula con ``builder()``.
+
+        Se guarda junto al valor el tiempo que costó calcularlo (delta) y su
+        caducidad; con ello se decide si recalcular antes de que expire.
+        """
+        key = self.key(user_id, *parts)
+        timeout = self.timeout if timeout is None else timeout
+
+        entry = cache.get(key)
+        if entry is not None:
+            value, delta, expires_at = entry
+            # 1 - random() está en (0, 1], así que el logaritmo es finito
+            if time.time() - delta * self.beta * math.log(1.0 - random.random()) < expires_at:
+                _record('hits', self.namespace)
+                return value
+
+        _record('misses', self.namespace)
+        start = time.time()
+        value = builder()
+        delta = time.time() - start
+        cache.set(key, (value, delta, time.time() + timeout), timeout)
+        return value
+
+
+# Espacios de nombres compartidos por vistas, context processors y señales
+alerts_cache = UserCache('alerts', timeout=300)
@@ -0,0 +1,92 @@
+"""
+Registro de categorías en memoria de proceso.
+
+``Category`` es una tabla global casi estática, así que cada proceso guarda
+una copia y la reutiliza en formularios y vistas. La invalidación entre
+workers se hace con una clave de versión en la caché compartida: las señales
+de ``Category`` la incrementan y cada proceso recarga la tabla cuando ve una
+versión distinta a la suya.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+from .cache import KEY_PREFIX
+from .models import Category
+
+
+VERSION_KEY = f"{KEY_PREFIX}:categories:version"
+
+
+class CategoryRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._all = ()
+        self._expense = ()
+        self._income = ()
+        self._by_id = {}
+
+    def _current_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def _ensure_loaded(self):
+        version = self._current_version()
+        if version == self._version:
+            return
+
+        with self._lock:
+            if version == self._version:
+                return
+            categories = tuple(Category.objects.order_by('name'))
+            self._all = categories
+            self._expense = tuple(c for c in categories if c.is_expense)
+            self._income = tuple(c for c in categories if not c.is_expense)
+            self._by_id = {c.pk: c for c in categories}
+            # La versión se leyó antes de la consulta: si cambia mientras
+            # tanto, el siguiente acceso volverá a recargar.
+            self._version = version
+
+    def all(self):
+        self._ensure_loaded()
+        return self._all
+
+    def expense(self):
+        self._ensure_loaded()
+        return self._expense
+
+    def income(self):
+        self._ensure_loaded()
+        return self._income
+
+    def get(self, pk):
+        self._ensure_loaded()
+        return self._by_id.get(pk)
+
+    def choices(self, is_expense=None, empty_label='---------'):
+        """Lista de opciones para un ``ModelChoiceField``"""
+        if is_expense is None:
+            categories = self.all()
+        elif is_expense:
+            categories = self.expense()
+        else:
+            categories = self.income()
+
+        choices = [('', empty_label)] if empty_label is not None else []
+        choices.extend((category.pk, str(category)) for category in categories)
+        return choices
+
+    def invalidate(self):
+        """Obliga a todos los procesos a recargar las categorías"""
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+
+
+category_registry = CategoryRegistry()
@@ -1,14 +1,12 @@
 from django.db.models import Count, Q, Prefetch
 from django.contrib.auth.models import User
 
+from PFinance.cache import alerts_cache
 from PFinance.models import Alert
 
 
-def alerts_context(request):
-    if not request.user.is_authenticated:
-        return {}
-
-    user_with_alerts = User.objects.filter(pk=request.user.pk).prefetch_related(
+def _load_alerts(user_id):
+    user_with_alerts = User.objects.filter(pk=user_id).prefetch_related(
         Prefetch(
             'alerts',
             queryset=Alert.objects.order_by('-created_at')[:5],
@@ -18,8 +16,21 @@ def alerts_context(request):
         unread_count=Count('alerts', filter=Q(alerts__read=False))
     ).first()
 
+    return user_with_alerts.unread_count, user_with_alerts.recent_alerts
+
+
+def alerts_context(request):
+    if not request.user.is_authenticated:
+        return {}
+
+    # Se invalida desde las señales de Alert (ver signals.py)
+    unread_count, recent_alerts = alerts_cache.get_or_set(
+        request.user.pk,
+        lambda: _load_alerts(request.user.pk)
+    )
+
     return {
-        'unread_count': user_with_alerts.unread_count,
-        'recent_alerts': user_with_alerts.recent_alerts,
-        'usuario': user_with_alerts.profile
-    }
\ No newline at end of file
+        'unread_count': unread_count,
+        'recent_alerts': recent_alerts,
+        'usuario': request.user.profile
+    }
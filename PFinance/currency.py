@@ -0,0 +1,152 @@
+"""
+Conversión de divisas con una tabla local de tipos de cambio.
+
+Los tipos se guardan en ``ExchangeRate`` como unidades de cada divisa por
+1 EUR (el formato de los ficheros del BCE) y se cargan con el comando
+``load_exchange_rates``; nunca se consultan servicios externos.
+
+- Cada transacción guarda su importe en la divisa del perfil al guardarse
+  (``profile_amount``). Los agregados en esa divisa lo suman sin consultar
+  tipos, y los presupuestos suman y restan ese mismo valor aunque después se
+  carguen tipos nuevos.
+- En SQL, ``converted_amount`` usa ese importe guardado cuando está en la
+  divisa pedida; las demás filas se convierten con el tipo vigente en su
+  fecha (subconsulta correlacionada sobre el índice único (divisa, fecha)),
+  que ``CASE`` solo evalúa para ellas.
+- En Python, ``convert`` usa una copia de la tabla en memoria de proceso con
+  un LRU por (divisa, día). Se invalida entre workers con una clave de versión
+  en la caché compartida, igual que el registro de categorías.
+"""
+import bisect
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.db.models import Case, DecimalField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import KEY_PREFIX
+from .models import ExchangeRate
+from .money import money_amount
+
+BASE_CURRENCY = 'EUR'
+VERSION_KEY = f"{KEY_PREFIX}:fx:version"
+
+RATE_FIELD = DecimalField(max_digits=20, decimal_places=6)
+ONE = Value(Decimal('1'), output_field=RATE_FIELD)
+
+
+def _rate(currency):
+    """Tipo vigente en la fecha de la fila: el último publicado hasta ese día"""
+    if currency == BASE_CURRENCY:
+        return ONE
+    return Subquery(
+        ExchangeRate.objects.filter(currency=currency, date__lte=OuterRef('date'))
+        .order_by('-date').values('rate')[:1],
+        output_field=RATE_FIELD
+    )
+
+
+def converted_amount(target, field='amount', stored=True):
+    """
+    Expresión con ``field`` convertido a ``target``. Las filas ya en esa divisa
+    (o sin divisa) no se tocan; si falta algún tipo de cambio se usa el importe
+    original, como antes de existir las divisas. Con ``stored`` (solo
+    ``Transaction``) se usa ``profile_amount`` si está en ``target``.
+    """
+    source_rate = Case(
+        When(currency=BASE_CURRENCY, then=ONE),
+        default=_rate(OuterRef('currency')),
+        output_field=RATE_FIELD
+    )
+    amount = money_amount(field)
+    stored_amount = [When(Q(profile_currency=target, profile_amount__isnull=False), then=money_amount('profile_amount'))]
+    return Case(
+        *(stored_amount if stored else []),
+        When(Q(currency=target) | Q(currency=''), then=amount),
+        default=Coalesce(amount * _rate(target) / source_rate, amount, output_field=RATE_FIELD),
+        output_field=RATE_FIELD
+    )
+
+
+def converted_sum(target, field='amount', filter=None, stored=True):
+    """``Sum`` de importes convertidos a ``target``"""
+    return Sum(converted_amount(target, field, stored), filter=filter)
+
+
+class RateTable:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._dates = {}
+        self._rates = {}
+        self._lookup = lru_cache(maxsize=4096)(self._find)
+
+    def version(self):
+        """Versión compartida de la tabla; cambia con cada carga de tipos"""
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def _ensure_loaded(self):
+        version = self.version()
+        if version == self._version:
+            return
+
+        with self._lock:
+            if version == self._version:
+                return
+            dates, rates = {}, {}
+            for currency, day, rate in ExchangeRate.objects.order_by('currency', 'date').values_list(
+                'currency', 'date', 'rate'
+            ):
+                dates.setdefault(currency, []).append(day)
+                rates.setdefault(currency, []).append(rate)
+            self._dates, self._rates = dates, rates
+            self._lookup.cache_clear()
+            self._version = version
+
+    def _find(self, currency, day):
+        dates = self._dates.get(currency)
+        if not dates:
+            return None
+        index = bisect.bisect_right(dates, day) - 1
+        if index < 0:
+            return None
+        return self._rates[currency][index]
+
+    def rate(self, currency, day=None):
+        """Unidades de ``currency`` por 1 EUR en ``day`` (None si no hay tipos)"""
+        if currency == BASE_CURRENCY:
+            return Decimal('1')
+        self._ensure_loaded()
+        return self._lookup(currency, day or timezone.localdate())
+
+    def invalidate(self):
+        """Obliga a todos los procesos a recargar los tipos"""
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+
+
+rate_table = RateTable()
+
+
+def convert(amount, source, target, day=None):
+    """Convierte un importe en Python; sin tipo de cambio lo devuelve igual"""
+    if not source or source == target:
+        return amount
+    if isinstance(day, datetime):
+        day = timezone.localdate(day)
+    source_rate = rate_table.rate(source, day)
+    target_rate = rate_table.rate(target, day)
+    if not source_rate or not target_rate:
+        return amount
+    return (amount * target_rate / source_rate).quantize(Decimal('0.01'))
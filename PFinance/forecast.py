@@ -0,0 +1,199 @@
+"""
+Previsión de flujo de caja a partir de ingresos y pagos recurrentes.
+
+Todas las ocurrencias de todos los elementos recurrentes se calculan a la vez
+con aritmética de fechas de NumPy (una matriz elementos x ocurrencias), en
+lugar de avanzar la fecha elemento a elemento. Los importes se manejan en
+céntimos (int64) para no acumular errores de redondeo.
+"""
+from datetime import date
+
+import numpy as np
+from django.db.models import Q
+from django.utils import timezone
+
+from .archive import archived_total
+from .currency import converted_sum
+from .models import RecurringIncome, RecurringPayment, Transaction
+from .money import money_cents
+from .recurrence import FREQUENCY_STEPS
+
+MAX_MONTHS = 24
+
+
+def _month_add(today, months):
+    """Primer día del mes ``months`` meses después del de ``today``"""
+    return (np.datetime64(today, 'M') + np.timedelta64(months, 'M')).astype('datetime64[D]')
+
+
+def _month_lengths(months):
+    return ((months + np.timedelta64(1, 'M')).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(np.int64)
+
+
+def expand_occurrences(next_dates, frequencies, end_dates, amounts, anchor_dates=None, *, start, end):
+    """
+    Expande elementos recurrentes en ocurrencias dentro de ``[start, end]``.
+
+    ``next_dates``, ``end_dates`` (NaT sin fin) y ``anchor_dates`` (fecha de
+    inicio de cada elemento; por defecto la próxima fecha) son arrays
+    ``datetime64[D]``, ``frequencies`` un array de cadenas y ``amounts``
+    céntimos en int64. Devuelve dos arrays planos: fechas de cada ocurrencia
+    y su importe.
+    """
+    next_dates = np.asarray(next_dates, dtype='datetime64[D]')
+    end_dates = np.asarray(end_dates, dtype='datetime64[D]')
+    anchor_dates = next_dates if anchor_dates is None else np.asarray(anchor_dates, dtype='datetime64[D]')
+    amounts = np.asarray(amounts, dtype=np.int64)
+    frequencies = np.asarray(frequencies)
+    start = np.datetime64(start, 'D')
+    end = np.datetime64(end, 'D')
+
+    if next_dates.size == 0:
+        return np.array([], dtype='datetime64[D]'), np.array([], dtype=np.int64)
+
+    end_dates = np.where(np.isnat(end_dates), end, np.minimum(end_dates, end))
+
+    dates_parts, amount_parts = [], []
+    for frequency, (step_months, step_days) in FREQUENCY_STEPS.items():
+        selected = frequencies == frequency
+        if not selected.any():
+            continue
+
+        anchors = next_dates[selected]
+        first = anchors.min()
+        span_days = int((end - min(first, start)).astype(int)) + 1
+
+        if step_months:
+            count = span_days // (28 * step_months) + 2
+            start_dates = anchor_dates[selected]
+            anchor_days = (start_dates - start_dates.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64)
+            month = anchors.astype('datetime64[M]')
+            day = (anchors - month.astype('datetime64[D]')).astype(np.int64)
+            months = np.empty((anchors.size, count), dtype='datetime64[M]')
+            days = np.empty((anchors.size, count), dtype=np.int64)
+            # Como next_occurrence: se conserva el día de la ocurrencia anterior, limitado al
+            # último del mes, y tras un día recortado se vuelve al de la fecha de inicio
+            for k in range(count):
+                if k:
+                    clamped = (anchor_days > day) & (day == _month_lengths(month) - 1)
+                    month = month + np.timedelta64(step_months, 'M')
+                    day = np.minimum(np.where(clamped, anchor_days, day), _month_lengths(month) - 1)
+                months[:, k] = month
+                days[:, k] = day
+            occurrences = months.astype('datetime64[D]') + days.astype('timedelta64[D]')
+        else:
+            count = span_days // step_days + 2
+            offsets = (np.arange(count) * step_days).astype('timedelta64[D]')
+            occurrences = anchors[:, None] + offsets[None, :]
+
+        # Una ocurrencia vencida y aún sin procesar se cobrará en el primer día
+        occurrences[:, 0] = np.maximum(occurrences[:, 0], start)
+
+        valid = (occurrences >= start) & (occurrences <= end_dates[selected][:, None])
+        dates_parts.append(occurrences[valid])
+        amount_parts.append(np.broadcast_to(amounts[selected][:, None], occurrences.shape)[valid])
+
+    if not dates_parts:
+        return np.array([], dtype='datetime64[D]'), np.array([], dtype=np.int64)
+    return np.concatenate(dates_parts), np.concatenate(amount_parts)
+
+
+def build_forecast(incomes, payments, balance_cents, start, months):
+    """
+    Serie diaria y mensual del balance previsto.
+
+    ``incomes`` y ``payments`` son tuplas ``(next_dates, frequencies,
+    end_dates, amounts_cents[, start_dates])``. Los pagos restan y los
+    ingresos suman.
+    """
+    start = np.datetime64(start, 'D')
+    end = _month_add(start, months) - np.timedelta64(1, 'D')
+    n_days = int((end - start).astype(int)) + 1
+
+    income_dates, income_amounts = expand_occurrences(*incomes, start=start, end=end)
+    payment_dates, payment_amounts = expand_occurrences(*payments, start=start, end=end)
+
+    # np.bincount agrupa por día sin bucles de Python
+    income_daily = np.bincount(
+        (income_dates - start).astype(np.int64), weights=income_amounts, minlength=n_days
+    ).round().astype(np.int64)
+    payment_daily = np.bincount(
+        (payment_dates - start).astype(np.int64), weights=payment_amounts, minlength=n_days
+    ).round().astype(np.int64)
+    balance = balance_cents + np.cumsum(income_daily - payment_daily)
+
+    days = start + np.arange(n_days).astype('timedelta64[D]')
+    month_index = (days.astype('datetime64[M]') - start.astype('datetime64[M]')).astype(np.int64)
+    monthly_income = np.bincount(month_index, weights=income_daily, minlength=months)
+    monthly_payments = np.bincount(month_index, weights=payment_daily, minlength=months)
+    # Balance al cierre de cada mes: último día de cada grupo
+    month_ends = np.flatnonzero(np.diff(month_index, append=months))
+
+    labels = np.datetime_as_string(days[month_ends].astype('datetime64[M]'))
+    return {
+        'start': str(start),
+        'end': str(end),
+        'balance': balance_cents / 100,
+        'daily': {
+            'dates': np.datetime_as_string(days).tolist(),
+            'balance': (balance / 100).tolist(),
+        },
+        'monthly': {
+            'labels': labels.tolist(),
+            'income': (monthly_income / 100).tolist(),
+            'expenses': (monthly_payments / 100).tolist(),
+            'balance': (balance[month_ends] / 100).tolist(),
+        },
+    }
+
+
+def _recurring_arrays(queryset, date_field):
+    rows = list(queryset.values_list(
+        date_field,
+        'frequency',
+        'end_date',
+        money_cents('amount'),
+        'start_date'
+    ))
+    if not rows:
+        return (np.array([], dtype='datetime64[D]'), np.array([], dtype=str),
+                np.array([], dtype='datetime64[D]'), np.array([], dtype=np.int64),
+                np.array([], dtype='datetime64[D]'))
+
+    next_dates, frequencies, end_dates, amounts, start_dates = zip(*rows)
+    return (
+        np.array(next_dates, dtype='datetime64[D]'),
+        np.array(frequencies),
+        np.array([d if d is not None else 'NaT' for d in end_dates], dtype='datetime64[D]'),
+        np.array(amounts, dtype=np.int64),
+        np.array(start_dates, dtype='datetime64[D]'),
+    )
+
+
+def current_balance(user):
+    """Ingresos - gastos - apartado en metas (como en la lista de transacciones), en la divisa del perfil"""
+    currency = user.profile.currency
+    totals = Transaction.objects.filter(user=user).aggregate(
+        income=converted_sum(currency, filter=Q(is_expense=False)),
+        expenses=converted_sum(currency, filter=Q(is_expense=True)),
+    )
+    income = (totals['income'] or 0) + archived_total(user.pk, currency, is_expense=False)
+    expenses = (totals['expenses'] or 0) + archived_total(user.pk, currency, is_expense=True)
+    return income - expenses - user.profile.goals_saved
+
+
+def forecast_cash_flow(user, months=6, today=None):
+    """Previsión del balance del usuario para los próximos ``months`` meses"""
+    months = max(1, min(int(months), MAX_MONTHS))
+    today = today or timezone.localdate()
+    if isinstance(today, date):
+        today = today.isoformat()
+
+    incomes = _recurring_arrays(
+        RecurringIncome.objects.filter(user=user, is_active=True), 'next_income_date'
+    )
+    payments = _recurring_arrays(
+        RecurringPayment.objects.filter(user=user, is_active=True), 'next_due_date'
+    )
+    balance_cents = int(round(current_balance(user) * 100))
+    return build_forecast(incomes, payments, balance_cents, today, months)
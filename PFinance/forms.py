@@ -9,10 +9,34 @@ from django.core.files import File
 from django.db import transaction
 from django.utils import timezone
 
+from .categories import category_registry
 from .models import UserProfile, CURRENCY_CHOICES, Category, Budget, Transaction, RecurringPayment, RecurringIncome, \
     Goal
 
 
+def set_category_choices(field, is_expense=None):
+    """
+    Rellena el desplegable de categorías desde el registro en memoria.
+    El queryset del campo se mantiene para validar el valor enviado.
+    """
+    field.choices = category_registry.choices(is_expense, empty_label=field.empty_label)
+
+
+# Ids marcados en una lista (casillas); la vista solo toca los del usuario
+class IdListField(forms.TypedMultipleChoiceField):
+    def __init__(self, **kwargs):
+        super().__init__(coerce=int, **kwargs)
+
+    def valid_value(self, value):
+        return True
+
+
+# Formulario para marcar alertas como leídas en bloque
+class AlertBulkReadForm(forms.Form):
+    scope = forms.CharField(required=False)  # 'selected' o todas las no leídas
+    alert_ids = IdListField(required=False)
+
+
 # Formulario para el registro
 class SignUpForm(UserCreationForm):
     currency = forms.ChoiceField(
@@ -112,16 +136,18 @@ class ProfileEditForm(forms.ModelForm):
 
     class Meta:
         model = UserProfile
-        fields = ['email', 'currency', 'notification_app', 'foto_perfil']
+        fields = ['email', 'currency', 'timezone', 'notification_app', 'foto_perfil']
         labels = {
             'email': 'Correo electrónico',
             'monthly_income': 'Ingreso mensual',
             'currency': 'Moneda',
+            'timezone': 'Zona horaria',
             'notification_app': 'Recibir notificaciones en la app',
             'foto_perfil': 'Foto de perfil'
         }
         widgets = {
             'currency': forms.Select(attrs={'class': 'form-select'}),
+            'timezone': forms.Select(attrs={'class': 'form-select'}),
             'notification_app': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
 
@@ -129,6 +155,9 @@ class ProfileEditForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields['email'].label = "Correo electrónico"
         self.fields['currency'].label = 'Moneda'
+        self.fields['timezone'].label = 'Zona horaria'
+        # Si no se envía, se conserva la zona actual
+        self.fields['timezone'].required = False
         self.fields['notification_app'].label = 'Recibir notificaciones en la app'
         self.fields['foto_perfil'].label = 'Foto de perfil'
         if self.instance and hasattr(self.instance, 'user'):
@@ -155,6 +184,9 @@ class ProfileEditForm(forms.ModelForm):
             raise forms.ValidationError("Ya existe un usuario con ese email")
         return email
 
+    def clean_timezone(self):
+        return self.cleaned_data.get('timezone') or self.instance.timezone
+
 
 # Formulario para presupuestos
 class BudgetForm(forms.ModelForm):
@@ -162,7 +194,8 @@ class BudgetForm(forms.ModelForm):
         self.user = user
         super().__init__(*args, **kwargs)
         if user:
-            self.fields['category'].queryset = Category.objects.all().filter(is_expense=True)
+            self.fields['category'].queryset = Category.objects.filter(is_expense=True)
+            set_category_choices(self.fields['category'], is_expense=True)
 
         # Aplicar clases consistentes
         self.fields['category'].widget.attrs.update({'class': 'form-select mt-1'})
@@ -171,39 +204,39 @@ class BudgetForm(forms.ModelForm):
 
     class Meta:
         model = Budget
-        fields = ['category', 'amount', 'frequency']
+        fields = ['category', 'amount', 'frequency', 'rollover']
         widgets = {
             'amount': forms.NumberInput(attrs={
                 'step': '1.00',
                 'min': '1.00'
-            })
+            }),
+            'rollover': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
         labels = {
             'category': 'Categoría',
             'amount': 'Monto presupuestado',
             'frequency': 'Frecuencia',
+            'rollover': 'Acumular lo no gastado en el siguiente período',
         }
 
     def clean(self):
         cleaned_data = super().clean()
         category = cleaned_data.get('category')
-        frequency = cleaned_data.get('frequency')
 
         user = getattr(self.instance, 'user', None) or self.user
 
-        if category and frequency and user:
+        # Solo puede haber un presupuesto activo por categoría (restricción unique_active_budget)
+        if category and user:
             queryset = Budget.objects.filter(
                 user=user,
                 category=category,
-                frequency=frequency
+                is_active=True
             )
             if self.instance:
                 queryset = queryset.exclude(pk=self.instance.pk)
 
             if queryset.exists():
-                raise forms.ValidationError(
-                    f"Ya existe un presupuesto {frequency.lower()} para esta categoría"
-                )
+                raise forms.ValidationError("Ya existe un presupuesto activo para esta categoría")
 
         return cleaned_data
 
@@ -214,6 +247,10 @@ class TransactionForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         if user:
             self.fields['category'].queryset = Category.objects.all()
+            set_category_choices(self.fields['category'])
+
+        # Sin divisa se usa la del perfil (Transaction.save)
+        self.fields['currency'].required = False
 
         # Configurar clases consistentes
         self.fields['amount'].widget.attrs.update({
@@ -221,6 +258,9 @@ class TransactionForm(forms.ModelForm):
             'step': '0.01',
             'min': '0.01'
         })
+        self.fields['currency'].widget.attrs.update({
+            'class': 'form-select mt-1 flex-grow-0 w-auto'
+        })
         self.fields['description'].widget.attrs.update({
             'class': 'form-control mt-1',
             'rows': '3'
@@ -242,12 +282,13 @@ class TransactionForm(forms.ModelForm):
 
     class Meta:
         model = Transaction
-        fields = ['amount', 'category', 'date', 'description', 'is_expense']
+        fields = ['amount', 'currency', 'category', 'date', 'description', 'is_expense']
         widgets = {
             'is_expense': forms.RadioSelect(attrs={'class': 'd-none'})
         }
         labels = {
             'amount': 'Monto',
+            'currency': 'Divisa',
             'category': 'Categoría',
             'date': 'Fecha y hora',
             'description': 'Asunto',
@@ -261,6 +302,28 @@ class TransactionForm(forms.ModelForm):
         return amount
 
 
+# Formulario para las operaciones en bloque sobre transacciones seleccionadas
+class TransactionBulkForm(forms.Form):
+    transaction_ids = IdListField(required=True)  # La vista solo toca los del usuario
+    category = forms.ModelChoiceField(queryset=Category.objects.all(), required=False, label='Categoría')
+    description = forms.CharField(required=False, label='Asunto')
+    date = forms.DateTimeField(required=False, label='Fecha y hora')
+    is_expense = forms.NullBooleanField(required=False, label='Tipo de transacción')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        set_category_choices(self.fields['category'])
+        self.fields['category'].widget.attrs.update({'class': 'form-select form-select-sm w-auto'})
+        self.fields['description'].widget.attrs.update({'class': 'form-control form-control-sm w-auto'})
+
+    def changes(self):
+        """Campos informados para la edición en bloque"""
+        return {
+            field: value for field, value in self.cleaned_data.items()
+            if field != 'transaction_ids' and value not in (None, '')
+        }
+
+
 # Formulario para pagos recurrentes
 class RecurringPaymentForm(forms.ModelForm):
     class Meta:
@@ -287,6 +350,7 @@ class RecurringPaymentForm(forms.ModelForm):
             self.fields['category'].queryset = Category.objects.filter(
                 is_expense=True
             ).order_by('name')
+            set_category_choices(self.fields['category'], is_expense=True)
 
         # Aplicar clases consistentes a todos los campos
         for field_name, field in self.fields.items():
@@ -385,6 +449,7 @@ class RecurringIncomeForm(forms.ModelForm):
             self.fields['category'].queryset = Category.objects.filter(
                 is_expense=False
             ).order_by('name')
+            set_category_choices(self.fields['category'], is_expense=False)
 
     def clean(self):
         cleaned_data = super().clean()
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+
+from PFinance.analytics import analytics_cache
+from PFinance.archive import archive_cache, rebuild_summaries
+from PFinance.models import Alert, ArchivedTransaction, ChangeLog, Transaction
+
+
+class Command(BaseCommand):
+    help = 'Mueve por lotes las transacciones de hace más de N años al archivo y actualiza los resúmenes anuales'
+
+    FIELDS = ('id', 'user_id', 'amount', 'category_id', 'date', 'description', 'is_expense', 'currency')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=3, help='Años completos que se quedan en la tabla principal (por defecto 3)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Transacciones por lote (por defecto 5000)')
+
+    def handle(self, *args, **options):
+        tz = timezone.get_default_timezone()
+        # Solo años completos: así los resúmenes anuales nunca se mezclan con la tabla principal
+        cutoff = timezone.make_aware(datetime(timezone.localdate().year - options['years'], 1, 1), tz)
+        batch_size = options['batch_size']
+
+        self.stdout.write(f"\nArchivando transacciones anteriores a {cutoff:%d/%m/%Y}...")
+
+        queryset = Transaction.objects.filter(date__lt=cutoff).order_by('pk')
+
+        total = 0
+        users = set()
+        while True:
+            rows = list(queryset.annotate(year=ExtractYear('date', tzinfo=tz)).values(*self.FIELDS, 'year')[:batch_size])
+            if not rows:
+                break
+            batch = [row['id'] for row in rows]
+            pairs = {(row['user_id'], row.pop('year')) for row in rows}
+
+            with transaction.atomic():
+                # Reintentos tras un fallo a mitad: las filas ya copiadas se ignoran
+                ArchivedTransaction.objects.bulk_create(
+                    [ArchivedTransaction(**row) for row in rows], ignore_conflicts=True
+                )
+                Alert.transactions.through.objects.filter(transaction_id__in=batch).delete()
+                # Sin señales: los períodos de presupuesto y las alertas ya contabilizan estas filas
+                Transaction.objects.filter(pk__in=batch)._raw_delete(Transaction.objects.db)
+                # Para los clientes sincronizados la transacción archivada desaparece
+                ChangeLog.record(Transaction, [(row['id'], row['user_id']) for row in rows], deleted=True)
+                rebuild_summaries(pairs)
+
+            for user_id in {user_id for user_id, _ in pairs}:
+                analytics_cache.invalidate(user_id)
+                archive_cache.invalidate(user_id)
+                users.add(user_id)
+            total += len(batch)
+            self.stdout.write(f"Lote procesado: {len(batch)} transacciones")
+
+        self.stdout.write(self.style.SUCCESS(f"Transacciones archivadas: {total} ({len(users)} usuarios)"))
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from PFinance.models import ChangeLog, RecurringIncome, RecurringPayment
+
+
+class Command(BaseCommand):
+    help = (
+        'Rellena reminder_date en los pagos e ingresos recurrentes anteriores a la columna, '
+        'para que los recordatorios diarios los encuentren por índice'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Filas por lote (por defecto 1000)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.stdout.write("\nRellenando fechas de recordatorio...")
+
+        payments = self._backfill(
+            RecurringPayment, batch_size,
+            lambda payment: payment.next_due_date - timedelta(days=payment.reminder_days)
+        )
+        incomes = self._backfill(
+            RecurringIncome, batch_size,
+            lambda income: income.next_income_date - timedelta(days=RecurringIncome.REMINDER_DAYS)
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Pagos actualizados: {payments}, ingresos actualizados: {incomes}"))
+
+    def _backfill(self, model, batch_size, reminder_date):
+        updated = 0
+        while True:
+            # Los ya rellenados salen del filtro: cada lote empieza desde el principio
+            batch = list(model.objects.filter(reminder_date__isnull=True).order_by('pk')[:batch_size])
+            if not batch:
+                return updated
+            for item in batch:
+                item.reminder_date = reminder_date(item)
+            with transaction.atomic():
+                model.objects.bulk_update(batch, ['reminder_date'])
+                ChangeLog.record(model, [(item.pk, item.user_id) for item in batch])
+            updated += len(batch)
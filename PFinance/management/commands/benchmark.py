@@ -0,0 +1,218 @@
+import json
+import random
+import re
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.db.models import Sum
+from django.utils import timezone
+
+from PFinance.bulk import bulk_delete, bulk_recategorize, bulk_update
+from PFinance.models import Budget, Category, Transaction, UserProfile
+from PFinance.money import INTEGER_MONEY
+from PFinance.partitioning import existing_partitions, is_partitioned
+from PFinance.periods import last_months, month_period
+
+
+class Rollback(Exception):
+    """Deshace los datos sintéticos al terminar"""
+
+
+class Command(BaseCommand):
+    help = 'Mide consultas críticas sobre datos sintéticos que se deshacen al terminar'
+
+    SCENARIOS = {
+        'periods': '_bench_periods',
+        'partitions': '_bench_partitions',
+        'money': '_bench_money',
+        'bulk': '_bench_bulk',
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=sorted(self.SCENARIOS), default='periods')
+        parser.add_argument('--rows', type=int, default=20000, help='Transacciones sintéticas (por defecto 20000)')
+        parser.add_argument('--users', type=int, default=10, help='Usuarios entre los que se reparten')
+        parser.add_argument('--repeat', type=int, default=20, help='Repeticiones por consulta')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        try:
+            with transaction.atomic():
+                users, categories = self._seed(options['rows'], options['users'])
+                getattr(self, self.SCENARIOS[options['scenario']])(users[0], categories[0])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _seed(self, rows, user_count):
+        rng = random.Random(0)
+        now = timezone.now()
+        users = [User.objects.create(username=f"benchmark-{i}") for i in range(user_count)]
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+        categories = [Category.objects.create(name=f"Benchmark {i}") for i in range(5)]
+
+        if connection.vendor == 'postgresql':
+            # generate_series genera las filas en el servidor: escala a cientos de millones
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT setseed(0)")
+                cursor.execute(
+                    f'INSERT INTO "{Transaction._meta.db_table}" '
+                    '(user_id, category_id, amount, date, is_expense, currency) '
+                    'SELECT (%s::int[])[1 + floor(random() * %s)::int], (%s::int[])[1 + floor(random() * %s)::int], '
+                    f"{'(100 + floor(random() * 19900))::bigint' if INTEGER_MONEY else 'round((1 + random() * 199)::numeric, 2)'}, "
+                    "%s - random() * interval '3 years', "
+                    "random() < 0.8, 'EUR' FROM generate_series(1, %s)",
+                    [[u.pk for u in users], len(users), [c.pk for c in categories], len(categories), now, rows]
+                )
+                cursor.execute(f'ANALYZE "{Transaction._meta.db_table}"')
+        else:
+            Transaction.objects.bulk_create([
+                Transaction(
+                    user=rng.choice(users),
+                    category=rng.choice(categories),
+                    amount=rng.randint(100, 20000) / 100,
+                    date=now - timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60)),
+                    is_expense=rng.random() < 0.8
+                )
+                for _ in range(rows)
+            ], batch_size=5000)
+
+        self.stdout.write(f"Datos sintéticos: {rows} transacciones, {user_count} usuarios")
+        return users, categories
+
+    def _measure(self, label, queryset, **explain_options):
+        started = time.perf_counter()
+        for _ in range(self.repeat):
+            list(queryset.all())
+        elapsed = (time.perf_counter() - started) / self.repeat * 1000
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{label}: {elapsed:.2f} ms"))
+        plan = queryset.explain(**explain_options)
+        self.stdout.write(plan)
+        return elapsed, plan
+
+    def _bench_periods(self, user, category):
+        """date__year/date__month frente a rangos [inicio, fin)"""
+        now = timezone.localtime()
+        period = month_period()
+        base = Transaction.objects.filter(user=user, is_expense=True).order_by()
+
+        before, _ = self._measure(
+            "Gastos del mes por categoría (date__year/date__month)",
+            base.filter(date__year=now.year, date__month=now.month)
+            .values('category').annotate(total=Sum('amount'))
+        )
+        after, _ = self._measure(
+            "Gastos del mes por categoría (rango)",
+            base.filter(**period.filter()).values('category').annotate(total=Sum('amount'))
+        )
+        self._measure(
+            "Gasto del presupuesto (date__year/date__month)",
+            base.filter(category=category, date__year=now.year, date__month=now.month)
+            .values('user').annotate(total=Sum('amount'))
+        )
+        self._measure(
+            "Gasto del presupuesto (rango)",
+            base.filter(category=category, **period.filter()).values('user').annotate(total=Sum('amount'))
+        )
+        self.stdout.write(self.style.SUCCESS(f"\nMejora en gastos por categoría: x{before / max(after, 1e-6):.1f}"))
+
+    def _bench_partitions(self, user, category):
+        """Particiones que recorre cada consulta del dashboard y de la lista (ver partition_transactions)"""
+        with connection.cursor() as cursor:
+            if connection.vendor != 'postgresql' or not is_partitioned(cursor):
+                self.stdout.write(self.style.WARNING(
+                    "La tabla no está particionada: ejecuta antes partition_transactions --convert en PostgreSQL"
+                ))
+                return
+            total = len(existing_partitions(cursor))
+
+        base = Transaction.objects.filter(user=user).order_by()
+        month = month_period()
+        half_year = last_months(6)
+        queries = [
+            ("Gastos del mes por categoría", base.filter(is_expense=True, **month.filter())
+             .values('category').annotate(total=Sum('amount'))),
+            ("Resumen de 6 meses", base.filter(date__gte=half_year[0].start, date__lt=half_year[-1].end)
+             .values('is_expense').annotate(total=Sum('amount'))),
+            ("Primera página de la lista", Transaction.objects.filter(user=user).order_by('-date')[:20]),
+            ("Total histórico (sin rango de fechas)", base.values('is_expense').annotate(total=Sum('amount'))),
+        ]
+        for label, queryset in queries:
+            _, plan = self._measure(label, queryset, analyze=True)
+            # Con ANALYZE las particiones podadas en ejecución aparecen como "never executed"
+            scanned = {
+                name for line in plan.splitlines() if 'never executed' not in line
+                for name in re.findall(rf'{Transaction._meta.db_table}_(?:p\d+(?:_\d+)?|default)', line)
+            }
+            self.stdout.write(self.style.SUCCESS(f"Particiones recorridas: {len(scanned)} de {total}"))
+
+    def _bench_money(self, user, category):
+        """SUM y serialización a JSON con importes NUMERIC frente a céntimos en BIGINT (ver PFINANCE_INTEGER_MONEY)"""
+        table = connection.ops.quote_name(Transaction._meta.db_table)
+        units, cents = ('amount * 0.01', 'amount') if INTEGER_MONEY else ('amount', 'ROUND(amount * 100)')
+        with connection.cursor() as cursor:
+            # Copia temporal con las dos representaciones de los mismos importes
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE pfinance_money_bench AS SELECT user_id, category_id, "
+                f"CAST({units} AS NUMERIC(12, 2)) AS numeric_amount, CAST({cents} AS BIGINT) AS cents FROM {table}"
+            )
+
+            def run(column, serialize):
+                started = time.perf_counter()
+                for _ in range(self.repeat):
+                    cursor.execute(
+                        f"SELECT user_id, category_id, SUM({column}) FROM pfinance_money_bench GROUP BY user_id, category_id"
+                    )
+                    json.dumps([serialize(total) for _, _, total in cursor.fetchall()])
+                return (time.perf_counter() - started) / self.repeat * 1000
+
+            numeric = run('numeric_amount', float)
+            integer = run('cents', lambda total: int(total) / 100)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nSUM + JSON con NUMERIC: {numeric:.2f} ms"))
+        self.stdout.write(self.style.MIGRATE_HEADING(f"SUM + JSON con BIGINT (céntimos): {integer:.2f} ms"))
+        self.stdout.write(self.style.SUCCESS(f"\nMejora: x{numeric / max(integer, 1e-6):.1f}"))
+
+    def _bench_bulk(self, user, category):
+        """
+        Borrado, recategorización y edición en bloque de hasta 10.000
+        transacciones (usar ``--users 1 --rows 10200``) frente al camino fila
+        a fila con señales, extrapolado desde una muestra de 200.
+        """
+        categories = list(Category.objects.filter(transactions__user=user).distinct())
+        for budget_category in categories:
+            Budget.objects.create(user=user, category=budget_category, amount=1000, frequency='monthly')
+        target = Category.objects.create(name="Benchmark destino")
+        Budget.objects.create(user=user, category=target, amount=1000, frequency='monthly')
+
+        pks = list(Transaction.objects.filter(user=user).values_list('pk', flat=True)[:10200])
+        sample, pks = pks[:200], pks[200:]
+
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            for instance in Transaction.objects.filter(pk__in=sample):
+                instance.delete()
+        per_row = (time.perf_counter() - started) / len(sample)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\nBorrado fila a fila: {per_row * len(pks) * 1000:.0f} ms estimados para {len(pks)} filas "
+            f"({len(queries) / len(sample):.1f} consultas por fila)"
+        ))
+
+        operations = (
+            ("Recategorizar", lambda: bulk_recategorize(user, pks, target)),
+            ("Editar asunto", lambda: bulk_update(user, pks, description="Benchmark")),
+            ("Borrar", lambda: bulk_delete(user, pks)),
+        )
+        for label, operation in operations:
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                count = operation()
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{label} en bloque ({count} filas): {elapsed:.0f} ms, {len(queries)} consultas"
+            ))
@@ -0,0 +1,93 @@
+from collections import defaultdict
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from PFinance.models import Alert, Budget, ChangeLog, UserProfile
+from PFinance.periods import period_from_key
+
+
+class Command(BaseCommand):
+    help = (
+        'Convierte los enlaces alerta-transacción de las alertas de presupuesto en una '
+        'referencia al presupuesto y su período, y borra las filas intermedias'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Alertas por lote (por defecto 1000)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        through = Alert.transactions.through
+
+        self.stdout.write("\nAgrupando enlaces de alertas de presupuesto...")
+
+        queryset = Alert.objects.filter(
+            alert_type='budget', budget__isnull=True, transactions__isnull=False
+        ).distinct().order_by('pk')
+
+        collapsed = skipped = last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).values('pk', 'user_id', 'dedup_key')[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1]['pk']
+            users = {alert['user_id'] for alert in batch}
+            timezones = dict(UserProfile.objects.filter(user_id__in=users).values_list('user_id', 'timezone'))
+
+            # Rango y categorías de las transacciones enlazadas a cada alerta
+            links = defaultdict(dict)
+            for row in through.objects.filter(alert_id__in=[alert['pk'] for alert in batch]).values(
+                'alert_id', 'transaction__category_id'
+            ).annotate(first=Min('transaction__date'), last=Max('transaction__date')):
+                links[row['alert_id']][row['transaction__category_id']] = (row['first'], row['last'])
+
+            # Presupuestos de los usuarios del lote: el activo (o el más reciente) primero
+            budgets = defaultdict(list)
+            for budget in Budget.objects.filter(user_id__in=users).order_by('-is_active', '-pk').values('pk', 'user_id', 'category_id'):
+                budgets[budget['user_id'], budget['category_id']].append(budget['pk'])
+
+            updates = []
+            for alert in batch:
+                reference = self._reference(alert, links[alert['pk']], budgets, timezones)
+                if reference is None:
+                    skipped += 1
+                    continue
+                budget_id, start, end = reference
+                updates.append(Alert(pk=alert['pk'], budget_id=budget_id, period_start=start, period_end=end))
+
+            with transaction.atomic():
+                Alert.objects.bulk_update(updates, ['budget', 'period_start', 'period_end'])
+                through.objects.filter(alert_id__in=[alert.pk for alert in updates]).delete()
+                updated = {alert.pk for alert in updates}
+                ChangeLog.record(Alert, [(alert['pk'], alert['user_id']) for alert in batch if alert['pk'] in updated])
+
+            collapsed += len(updates)
+            self.stdout.write(f"Lote procesado: {len(updates)} alertas")
+
+        self.stdout.write(self.style.SUCCESS(f"Alertas convertidas: {collapsed} (sin presupuesto reconocible: {skipped})"))
+
+    def _reference(self, alert, categories, budgets, timezones):
+        """(presupuesto, inicio, fin) de una alerta antigua, o None si no se puede deducir"""
+        if len(categories) != 1:
+            return None
+        category_id, (first, last) = next(iter(categories.items()))
+        candidates = budgets.get((alert['user_id'], category_id))
+        if not candidates:
+            return None
+
+        # Clave estructurada "budget:<id>:<período>"
+        source, _, rest = (alert['dedup_key'] or '').partition(':')
+        budget_id, _, period_key = rest.partition(':')
+        if source == 'budget' and budget_id.isdigit() and int(budget_id) in candidates:
+            tz = ZoneInfo(timezones.get(alert['user_id'], settings.TIME_ZONE))
+            period = period_from_key(period_key, tz)
+            if period and first in period and last in period:
+                return int(budget_id), period.start, period.end
+
+        # Alertas sin clave: presupuesto de la categoría y rango de las transacciones enlazadas
+        return candidates[0], first, last + timedelta(microseconds=1)
@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from PFinance.models import ChangeLog, JobRun
+from PFinance.sync import COMPACT_JOB
+
+
+class Command(BaseCommand):
+    help = 'Compacta el registro de cambios de la sincronización: borra cambios superados y los de hace más de N días'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Antigüedad máxima del registro en días (por defecto 90)')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rango de ids por sentencia (por defecto 10000)')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        cutoff = now - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        self.stdout.write(f"\nCompactando el registro de cambios anterior a {cutoff:%d/%m/%Y}...")
+
+        run = JobRun.start(COMPACT_JOB, now.date())
+        try:
+            # Los clientes con un cursor más antiguo que lo borrado necesitan una copia completa
+            expired = ChangeLog.objects.filter(created_at__lt=cutoff)
+            run.watermark = expired.aggregate(last=Max('pk'))['last']
+            if run.watermark:
+                run.processed += ChangeLog.objects.filter(pk__lte=run.watermark).delete()[0]
+
+            # Un cambio seguido de otro del mismo objeto no aporta nada a ningún cursor
+            newer = ChangeLog.objects.filter(
+                model=OuterRef('model'), object_id=OuterRef('object_id'), pk__gt=OuterRef('pk')
+            )
+            last = ChangeLog.objects.aggregate(last=Max('pk'))['last'] or 0
+            start = run.watermark or 0
+            while start < last:
+                superseded = ChangeLog.objects.filter(pk__gt=start, pk__lte=start + batch_size).filter(Exists(newer))
+                run.skipped += superseded.delete()[0]
+                start += batch_size
+            run.save(update_fields=['watermark', 'processed', 'skipped'])
+        except Exception as e:
+            run.finish('failed', error=str(e))
+            raise
+        run.finish()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Cambios caducados: {run.processed}, superados: {run.skipped} (horizonte: {run.watermark or '-'})"
+        ))
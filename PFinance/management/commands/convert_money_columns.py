@@ -0,0 +1,93 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import DecimalField
+
+from PFinance.models import ArchivedTransaction, Budget, BudgetPeriod, Goal, RecurringIncome, RecurringPayment, Transaction
+from PFinance.money import INTEGER_MONEY, MoneyField
+
+# Columnas declaradas con money_field
+MONEY_FIELDS = {
+    Transaction: ('amount', 'profile_amount'),
+    ArchivedTransaction: ('amount',),
+    Budget: ('amount',),
+    BudgetPeriod: ('amount', 'rollover', 'spent'),
+    RecurringPayment: ('amount',),
+    RecurringIncome: ('amount',),
+    Goal: ('target_amount', 'current_amount'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Convierte las columnas de importes entre NUMERIC y céntimos en BIGINT (ver PFINANCE_INTEGER_MONEY)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--to', choices=('cents', 'decimal'), default='cents' if INTEGER_MONEY else 'decimal',
+            help='Representación de destino (por defecto la de PFINANCE_INTEGER_MONEY)'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError("La conversión solo está implementada para PostgreSQL y SQLite")
+        to_cents = options['to'] == 'cents'
+        target_type = 'BigIntegerField' if to_cents else 'DecimalField'
+
+        self.stdout.write(f"\nConvirtiendo importes a {'céntimos (BIGINT)' if to_cents else 'NUMERIC'}...")
+
+        converted = 0
+        with connection.schema_editor(atomic=True) as editor:
+            for model, names in MONEY_FIELDS.items():
+                pending = [name for name in names if self._column_type(model, name) != target_type]
+                if not pending:
+                    continue
+                self._convert(editor, model, pending, to_cents)
+                converted += len(pending)
+                self.stdout.write(f"{model._meta.db_table}: {', '.join(pending)}")
+
+        self.stdout.write(self.style.SUCCESS(f"Columnas convertidas: {converted}"))
+        if to_cents != INTEGER_MONEY:
+            self.stdout.write(self.style.WARNING(
+                f"Recuerda poner PFINANCE_INTEGER_MONEY={'True' if to_cents else 'False'} antes de reiniciar"
+            ))
+
+    def _column_type(self, model, name):
+        column = model._meta.get_field(name).column
+        with connection.cursor() as cursor:
+            description = connection.introspection.get_table_description(cursor, model._meta.db_table)
+        info = next(row for row in description if row.name == column)
+        return connection.introspection.get_field_type(info.type_code, info)
+
+    def _field(self, model, name, to_cents):
+        current = model._meta.get_field(name)
+        field_class = MoneyField if to_cents else DecimalField
+        field = field_class(max_digits=current.max_digits, decimal_places=2, null=current.null)
+        field.set_attributes_from_name(name)
+        field.model = model
+        return field
+
+    def _convert(self, editor, model, names, to_cents):
+        qn = editor.quote_name
+        table = qn(model._meta.db_table)
+        columns = [qn(model._meta.get_field(name).column) for name in names]
+
+        if connection.vendor == 'postgresql':
+            # Un único ALTER por tabla: se reescribe una sola vez, escalando en el USING
+            changes = [
+                f"ALTER COLUMN {column} TYPE bigint USING round({column} * 100)::bigint" if to_cents else
+                f"ALTER COLUMN {column} TYPE numeric({model._meta.get_field(name).max_digits}, 2) USING {column} / 100.0"
+                for name, column in zip(names, columns)
+            ]
+            editor.execute(f"ALTER TABLE {table} {', '.join(changes)}")
+            return
+
+        # SQLite no cambia tipos con ALTER: se rehace la tabla una sola vez con todas las columnas
+        # de importe en el tipo nuevo (las no listadas tomarían el tipo del modelo) y se escalan los valores.
+        # alter_field rehace la tabla por cada columna, de ahí _remake_table
+        editor._remake_table(model, alter_fields=[
+            (model._meta.get_field(name), self._field(model, name, to_cents)) for name in MONEY_FIELDS[model]
+        ])
+        scaled = [
+            f"{column} = CAST(ROUND({column} * 100) AS INTEGER)" if to_cents else f"{column} = {column} / 100.0"
+            for column in columns
+        ]
+        editor.execute(f"UPDATE {table} SET {', '.join(scaled)}")
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from PFinance.anomalies import detect
+from PFinance.models import Alert, JobRun, Transaction
+
+
+class Command(BaseCommand):
+    help = 'Detecta gastos y meses anómalos en las transacciones nuevas desde la última ejecución'
+
+    JOB = 'detect_anomalies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Usuarios por bloque')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+
+        # Transacciones (pk_desde, pk_hasta] pendientes de analizar
+        since = JobRun.last_watermark(self.JOB)
+        run = JobRun.start(self.JOB, now.date())
+        if run.watermark is None:
+            # Una ejecución reanudada conserva el límite con el que empezó
+            run.watermark = Transaction.objects.aggregate(high=Max('pk'))['high'] or since
+            run.save(update_fields=['watermark'])
+
+        self.stdout.write(f"\nBuscando anomalías en transacciones #{since + 1}-#{run.watermark}...")
+
+        # Solo usuarios con gastos nuevos y notificaciones activas; el checkpoint es el último usuario
+        users = (
+            Transaction.objects
+            .filter(pk__gt=since, pk__lte=run.watermark, is_expense=True, user__profile__notification_app=True)
+            .order_by('user_id').values_list('user_id', flat=True).distinct()
+        )
+
+        created = 0
+        try:
+            while True:
+                user_ids = list(users.filter(user_id__gt=run.checkpoint)[:options['chunk_size']])
+                if not user_ids:
+                    break
+                created += len(Alert.create_missing(detect(user_ids, since, now)))
+                run.processed += len(user_ids)
+                run.checkpoint = user_ids[-1]
+                run.save(update_fields=['checkpoint', 'processed'])
+        except Exception as e:
+            run.finish('failed', error=str(e))
+            raise
+        run.finish()
+
+        self.stdout.write(self.style.SUCCESS(f"Usuarios analizados: {run.processed}, alertas creadas: {created}"))
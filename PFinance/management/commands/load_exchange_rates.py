@@ -0,0 +1,78 @@
+import csv
+import io
+import zipfile
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from PFinance.currency import BASE_CURRENCY, rate_table
+from PFinance.models import CURRENCY_CHOICES, ExchangeRate
+
+
+class Command(BaseCommand):
+    help = (
+        'Carga tipos de cambio desde ficheros locales: el histórico del BCE '
+        '(eurofxref-hist.csv o .zip, columnas Date,USD,JPY,...) o un CSV date,currency,rate'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Ficheros CSV o ZIP')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        currencies = {code for code, _ in CURRENCY_CHOICES} - {BASE_CURRENCY}
+
+        rates = {}
+        for path in options['paths']:
+            for currency, day, rate in self._read(path):
+                if currency in currencies:
+                    rates[(currency, day)] = rate
+
+        if not rates:
+            raise CommandError("No se encontró ningún tipo de cambio de las divisas soportadas")
+
+        ExchangeRate.objects.bulk_create(
+            [ExchangeRate(currency=currency, date=day, rate=rate) for (currency, day), rate in rates.items()],
+            batch_size=options['batch_size'],
+            update_conflicts=True,
+            unique_fields=['currency', 'date'],
+            update_fields=['rate'],
+        )
+        # bulk_create no envía señales: los procesos recargan la tabla al ver la nueva versión
+        rate_table.invalidate()
+
+        self.stdout.write(self.style.SUCCESS(f"Tipos de cambio cargados: {len(rates)}"))
+
+    def _read(self, path):
+        if path.endswith('.zip'):
+            with zipfile.ZipFile(path) as archive:
+                for name in archive.namelist():
+                    if name.endswith('.csv'):
+                        with archive.open(name) as file:
+                            yield from self._parse(io.TextIOWrapper(file, encoding='utf-8'))
+        else:
+            with open(path, encoding='utf-8', newline='') as file:
+                yield from self._parse(file)
+
+    def _parse(self, file):
+        reader = csv.reader(file)
+        header = [column.strip() for column in next(reader, [])]
+        long_format = [column.lower() for column in header[:3]] == ['date', 'currency', 'rate']
+
+        for row in reader:
+            row = [value.strip() for value in row]
+            if not row or not row[0]:
+                continue
+            try:
+                day = date.fromisoformat(row[0])
+            except ValueError:
+                raise CommandError(f"Fecha no válida: {row[0]}")
+
+            pairs = [(row[1], row[2])] if long_format else zip(header[1:], row[1:])
+            for currency, value in pairs:
+                try:
+                    rate = Decimal(value)
+                except InvalidOperation:
+                    continue  # "N/A" en los días sin cotización
+                yield currency.upper(), day, rate
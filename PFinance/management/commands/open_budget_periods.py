@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from PFinance.budgets import budgets_cache
+from PFinance.models import Budget, BudgetPeriod, ChangeLog, JobRun
+from PFinance.periods import budget_period
+
+
+class Command(BaseCommand):
+    help = (
+        'Abre el período vigente de los presupuestos activos que aún no lo tienen '
+        '(con el remanente del anterior) y reinicia su estado'
+    )
+
+    JOB = 'open_budget_periods'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Presupuestos por bloque')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        self.stdout.write(f"\nAbriendo períodos de presupuestos ({now:%d/%m/%Y %H:%M})...")
+
+        # Solo los presupuestos sin fila para el período que contiene ``now``; hasta que se
+        # abre, las vistas muestran el período vigente como 'ok' (sin gastos todavía)
+        budgets = Budget.objects.filter(is_active=True, user__profile__isnull=False).filter(
+            ~Exists(BudgetPeriod.objects.current(now).filter(budget=OuterRef('pk')))
+        ).select_related('user__profile')
+
+        def open_period(budget):
+            profile = budget.user.profile
+            period = budget_period(budget.frequency, now, profile.tzinfo)
+            row, created = BudgetPeriod.open(budget, period, profile.currency)
+            if budget.state != row.state:
+                Budget.objects.filter(pk=budget.pk).update(state=row.state)
+                ChangeLog.record(Budget, [(budget.pk, budget.user_id)])
+                budgets_cache.invalidate(budget.user_id)
+            return created
+
+        run = JobRun.start(self.JOB, now.date())
+        try:
+            run.process(budgets, open_period, options['chunk_size'])
+        except Exception as e:
+            run.finish('failed', error=str(e))
+            raise
+        run.finish()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Períodos abiertos: {run.processed}, ya existentes: {run.skipped}, errores: {run.failed}"
+        ))
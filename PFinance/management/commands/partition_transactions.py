@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from PFinance.models import Transaction
+from PFinance.partitioning import (
+    INTERVALS, convert_table, create_partition, detect_interval, existing_partitions, is_partitioned,
+    partition_bounds
+)
+from PFinance.periods import month_period
+
+
+class Command(BaseCommand):
+    help = (
+        'Particiona por fecha la tabla de transacciones (solo PostgreSQL): con --convert '
+        'convierte la tabla existente; sin él crea las particiones futuras que falten'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help='Convierte la tabla actual en particionada')
+        parser.add_argument('--interval', choices=INTERVALS, default='month', help='Tamaño de cada partición al convertir')
+        parser.add_argument('--ahead', type=int, default=3, help='Particiones futuras a mantener creadas (por defecto 3)')
+        parser.add_argument('--keep-legacy', action='store_true', help='Conserva la tabla original como <tabla>_legacy')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("El particionado de transacciones solo está disponible en PostgreSQL")
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            partitioned = is_partitioned(cursor)
+            if options['convert']:
+                if partitioned:
+                    raise CommandError("La tabla de transacciones ya está particionada")
+                self._convert(cursor, options)
+            elif not partitioned:
+                self.stdout.write("La tabla de transacciones no está particionada; usa --convert para hacerlo")
+                return
+            self._create_future(cursor, options['ahead'])
+
+    def _horizon(self, interval, ahead):
+        """Inicio del mes (o año) ``ahead`` intervalos por delante del actual"""
+        months = ahead * 12 if interval == 'year' else ahead
+        return month_period(tz=timezone.get_default_timezone(), offset=months).start
+
+    def _convert(self, cursor, options):
+        interval = options['interval']
+        bounds = Transaction.objects.aggregate(first=Min('date'), last=Max('date'))
+        first = bounds['first'] or timezone.now()
+        last = max(bounds['last'] or first, self._horizon(interval, options['ahead']))
+
+        self.stdout.write(f"\nConvirtiendo la tabla de transacciones en particiones por {interval}...")
+        convert_table(cursor, interval, first, last, keep_legacy=options['keep_legacy'])
+        cursor.execute(f'ANALYZE "{Transaction._meta.db_table}"')
+        self.stdout.write(self.style.SUCCESS(f"Tabla particionada ({len(partition_bounds(first, last, interval))} particiones)"))
+
+    def _create_future(self, cursor, ahead):
+        names = existing_partitions(cursor)
+        interval = detect_interval(names)
+        missing = [
+            bound for bound in partition_bounds(timezone.now(), self._horizon(interval, ahead), interval)
+            if bound[0] not in names
+        ]
+        for name, start, end in missing:
+            create_partition(cursor, name, start, end)
+            self.stdout.write(f"Partición creada: {name} [{start:%Y-%m-%d}, {end:%Y-%m-%d})")
+        self.stdout.write(self.style.SUCCESS(f"Particiones nuevas: {len(missing)}"))
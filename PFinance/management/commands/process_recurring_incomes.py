@@ -1,64 +1,75 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from PFinance.models import RecurringIncome, Alert, UserProfile
-from datetime import timedelta
+from PFinance.models import RecurringIncome, Alert, JobRun
 
 
 class Command(BaseCommand):
     help = 'Procesa ingresos recurrentes vencidos y crea transacciones'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Ingresos por bloque entre checkpoints')
+
     def handle(self, *args, **options):
         today = timezone.now().date()
 
         self.stdout.write(f"\nProcesando ingresos recurrentes ({today})")
 
+        # Si una ejecución anterior de hoy no terminó, se continúa desde su checkpoint
+        run = JobRun.start('process_recurring_incomes', today)
+        try:
+            self._process(today, run, options['chunk_size'])
+        except Exception as e:
+            run.finish('failed', error=str(e))
+            raise
+        run.finish()
+
+    def _process(self, today, run, chunk_size):
         # Procesar ingresos vencidos
         incomes = RecurringIncome.objects.filter(
             next_income_date__lte=today,
             is_active=True
-        ).select_related('user', 'category')
+        ).select_related('user__profile', 'category')
 
-        success_count = 0
-        for income in incomes:
+        def process(income):
             try:
-                transaction = income.process_income()
-                if transaction:
-                    self.stdout.write(
-                        f"Ingreso creado: {income.name} "
-                        f"(Monto: {income.amount}{income.user.profile.currency}, "
-                        f"Próximo: {income.next_income_date})"
-                    )
-                    success_count += 1
-
-                    # Crear alerta
-                    Alert.objects.create(
-                        user=income.user,
-                        title=f"Ingreso registrado: {income.name}",
-                        message=f"Se ha ingresado {income.amount} {income.user.profile.currency} ({income.get_source_display()})",
-                        alert_type='income'
-                    )
+                transaction = income.process_income(run=run)
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f"Error con {income.name}: {str(e)}"))
+                raise
+            if transaction:
+                self.stdout.write(
+                    f"Ingreso creado: {income.name} "
+                    f"(Monto: {income.amount}{income.user.profile.currency}, "
+                    f"Próximo: {income.next_income_date})"
+                )
+            return transaction is not None
+
+        run.process(incomes, process, chunk_size)
+        success_count = run.processed
 
-        # Alertas anticipadas
+        # Alertas anticipadas; búsqueda por índice: solo los ingresos cuyo recordatorio es hoy
         upcoming_incomes = RecurringIncome.objects.filter(
+            reminder_date=today,
             next_income_date__gt=today,
             is_active=True
-        )
+        ).select_related('user')
 
-        reminder_count = 0
-        for income in upcoming_incomes:
-            reminder_date = income.next_income_date - timedelta(days=3)  # 3 días antes
-            if today == reminder_date:
-                Alert.objects.create(
-                    user=income.user,
-                    title=f"Recordatorio de ingreso: {income.name}",
-                    message=f"Esperado el {income.next_income_date}",
-                    alert_type='reminder'
-                )
-                reminder_count += 1
+        reminders = Alert.create_missing([
+            Alert(
+                user=income.user,
+                dedup_key=Alert.build_dedup_key('income_reminder', income.pk, income.next_income_date.isoformat()),
+                title=f"Recordatorio de ingreso: {income.name}",
+                message=f"Esperado el {income.next_income_date}",
+                alert_type='reminder'
+            )
+            for income in upcoming_incomes
+        ])
+        reminder_count = len(reminders)
 
         self.stdout.write("\n" + "=" * 50)
         self.stdout.write(f"Ingresos procesados: {success_count}")
         self.stdout.write(f"Recordatorios creados: {reminder_count}")
+        if run.skipped or run.failed:
+            self.stdout.write(f"Ya procesados: {run.skipped}, errores: {run.failed}")
         self.stdout.write("=" * 50)
\ No newline at end of file
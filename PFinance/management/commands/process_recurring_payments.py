@@ -1,84 +1,92 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from datetime import timedelta
-from PFinance.models import RecurringPayment, Alert
+from PFinance.models import RecurringPayment, Alert, JobRun
 
 
 class Command(BaseCommand):
     help = 'Procesa pagos recurrentes vencidos y crea alertas de recordatorio'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Pagos por bloque entre checkpoints')
+
     def handle(self, *args, **options):
         today = timezone.now().date()
 
         self.stdout.write(f"\nIniciando procesamiento de pagos recurrentes ({today})...")
 
-        # 1. Procesar pagos vencidos
-        self._process_due_payments(today)
+        # Si una ejecución anterior de hoy no terminó, se continúa desde su checkpoint
+        run = JobRun.start('process_recurring_payments', today)
+        if run.attempts > 1:
+            self.stdout.write(f"Reanudando ejecución #{run.pk} desde el pago #{run.checkpoint}")
+
+        try:
+            # 1. Procesar pagos vencidos
+            self._process_due_payments(today, run, options['chunk_size'])
 
-        # 2. Crear alertas de recordatorio (una sola vez)
-        self._create_one_time_reminders(today)
+            # 2. Crear alertas de recordatorio (una sola vez)
+            self._create_one_time_reminders(today)
+        except Exception as e:
+            run.finish('failed', error=str(e))
+            raise
+        run.finish()
 
-    def _process_due_payments(self, today):
+    def _process_due_payments(self, today, run, chunk_size):
         """Procesa pagos cuya fecha de pago ya llegó"""
         payments = RecurringPayment.objects.filter(
             next_due_date__lte=today,
             is_active=True
-        ).select_related('user', 'category')
-
-        if not payments.exists():
-            self.stdout.write(self.style.SUCCESS("No hay pagos pendientes para procesar"))
-            return
+        ).select_related('user__profile', 'category')
 
-        self.stdout.write(f"\nProcesando pagos vencidos ({payments.count()}):")
-
-        success_count = 0
-        for payment in payments:
+        def process(payment):
             try:
-                transaction = payment.process_payment()
-                if transaction:
-                    self.stdout.write(
-                        f"Transacción #{transaction.id} para {payment.name} "
-                        f"(Monto: {payment.amount} {payment.user.profile.currency}, Próximo pago: {payment.next_due_date})"
-                    )
-                    success_count += 1
+                transaction = payment.process_payment(run=run)
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f"Error con {payment.name}: {str(e)}"))
+                raise
+            if transaction:
+                self.stdout.write(
+                    f"Transacción #{transaction.id} para {payment.name} "
+                    f"(Monto: {payment.amount} {payment.user.profile.currency}, Próximo pago: {payment.next_due_date})"
+                )
+            return transaction is not None
+
+        self.stdout.write(f"\nProcesando pagos vencidos:")
+        run.process(payments, process, chunk_size)
 
-        self.stdout.write(self.style.SUCCESS(f"Transacciones creadas: {success_count}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Transacciones creadas: {run.processed} (ya procesadas: {run.skipped}, errores: {run.failed})"
+        ))
 
     def _create_one_time_reminders(self, today):
         """Crea alertas de recordatorio UNA SOLA VEZ cuando hoy = next_due_date - reminder_days"""
+        self.stdout.write(f"\nBuscando pagos para recordatorio (reminder_days):")
+
+        # Búsqueda por índice: solo los pagos cuyo recordatorio es hoy
         upcoming_payments = RecurringPayment.objects.filter(
+            reminder_date=today,
             next_due_date__gt=today,  # Solo pagos futuros
             is_active=True
-        ).select_related('user')
-
-        alert_count = 0
-        self.stdout.write(f"\nBuscando pagos para recordatorio (reminder_days):")
-
-        for payment in upcoming_payments:
-            reminder_date = payment.next_due_date - timedelta(days=payment.reminder_days)
-
-            if today == reminder_date:
-                try:
-                    Alert.objects.create(
-                        user=payment.user,
-                        title=f"Recordatorio de pago: {payment.name}",
-                        message=(
-                            f"Se cobrarán {payment.amount}{payment.user.profile.currency} el {payment.next_due_date}. "
-                        ),
-                        alert_type='payment'
-                    )
-                    self.stdout.write(
-                        f"Alerta creada para {payment.name} "
-                        f"(Vence: {payment.next_due_date}, "
-                        f"Recordatorio configurado: {payment.reminder_days} días antes)"
-                    )
-                    alert_count += 1
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f"Error al crear alerta para {payment.name}: {str(e)}"))
-
-        self.stdout.write(self.style.SUCCESS(f"Alertas creadas: {alert_count}"))
+        ).select_related('user__profile')
+
+        # La clave incluye la fecha de vencimiento: ejecutar el comando dos veces no duplica alertas
+        created = Alert.create_missing([
+            Alert(
+                user=payment.user,
+                dedup_key=Alert.build_dedup_key('payment_reminder', payment.pk, payment.next_due_date.isoformat()),
+                title=f"Recordatorio de pago: {payment.name}",
+                message=(
+                    f"Se cobrarán {payment.amount}{payment.user.profile.currency} el {payment.next_due_date}. "
+                ),
+                alert_type='payment'
+            )
+            for payment in upcoming_payments
+        ])
+
+        for alert in created:
+            self.stdout.write(f"Alerta creada: {alert.title}")
+
+        self.stdout.write(self.style.SUCCESS(f"Alertas creadas: {len(created)}"))
         self.stdout.write("\n" + "=" * 50)
         self.stdout.write("Proceso completado")
-        self.stdout.write("=" * 50)
\ No newline at end of file
+        self.stdout.write("=" * 50)
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from PFinance.models import Alert, Budget, JobRun
+from PFinance.projections import forecast_alerts
+
+
+class Command(BaseCommand):
+    help = 'Proyecta el gasto de todos los presupuestos activos al final de su período y avisa si superará el límite'
+
+    JOB = 'project_budgets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Presupuestos por bloque')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        self.stdout.write(f"\nProyectando presupuestos ({now:%d/%m/%Y %H:%M})...")
+
+        # Bloques de presupuestos de todos los usuarios; el checkpoint es el último presupuesto
+        budgets = Budget.objects.filter(is_active=True, user__profile__notification_app=True).order_by('pk')
+
+        run = JobRun.start(self.JOB, now.date())
+        created = 0
+        try:
+            while True:
+                chunk = list(budgets.filter(pk__gt=run.checkpoint).values_list('pk', flat=True)[:options['chunk_size']])
+                if not chunk:
+                    break
+                created += len(Alert.create_missing(forecast_alerts(Budget.objects.filter(pk__in=chunk), now)))
+                run.processed += len(chunk)
+                run.checkpoint = chunk[-1]
+                run.save(update_fields=['checkpoint', 'processed'])
+        except Exception as e:
+            run.finish('failed', error=str(e))
+            raise
+        run.finish()
+
+        self.stdout.write(self.style.SUCCESS(f"Presupuestos proyectados: {run.processed}, alertas creadas: {created}"))
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from PFinance.cache import alerts_cache
+from PFinance.models import Alert, ArchivedAlert, ChangeLog
+
+
+class Command(BaseCommand):
+    help = 'Elimina o archiva por lotes las alertas leídas más antiguas que N días'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Antigüedad mínima en días (por defecto 90)')
+        parser.add_argument('--archive', action='store_true', help='Copia las alertas a ArchivedAlert antes de borrarlas')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Alertas por lote (por defecto 1000)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        archive = options['archive']
+
+        self.stdout.write(f"\nPurgando alertas leídas anteriores a {cutoff:%d/%m/%Y}...")
+
+        queryset = Alert.objects.filter(read=True, created_at__lt=cutoff).order_by('pk')
+
+        total = 0
+        while True:
+            rows = list(queryset.values_list('pk', 'user_id')[:batch_size])
+            if not rows:
+                break
+            batch = [pk for pk, _ in rows]
+
+            with transaction.atomic():
+                if archive:
+                    ArchivedAlert.objects.bulk_create([
+                        ArchivedAlert(**values)
+                        for values in Alert.objects.filter(pk__in=batch).values(
+                            'user_id', 'title', 'message', 'alert_type', 'created_at'
+                        )
+                    ])
+                # Las filas intermedias del M2M son la mayor parte del volumen
+                Alert.transactions.through.objects.filter(alert_id__in=batch).delete()
+                # Sin señales: una sola entrada de registro por lote y una invalidación por usuario
+                Alert.objects.filter(pk__in=batch)._raw_delete(Alert.objects.db)
+                ChangeLog.record(Alert, rows, deleted=True)
+
+            for user_id in {user_id for _, user_id in rows}:
+                alerts_cache.invalidate(user_id)
+
+            total += len(batch)
+            self.stdout.write(f"Lote procesado: {len(batch)} alertas")
+
+        action = "archivadas" if archive else "eliminadas"
+        self.stdout.write(self.style.SUCCESS(f"Alertas {action}: {total}"))
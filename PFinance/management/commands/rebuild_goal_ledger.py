@@ -0,0 +1,35 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from PFinance.models import Goal, GoalContribution, UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Crea la aportación inicial de las metas sin histórico y recalcula el total apartado por usuario'
+
+    def handle(self, *args, **options):
+        self.stdout.write("\nReconstruyendo histórico de aportaciones...")
+
+        with transaction.atomic():
+            # Metas anteriores al histórico: una aportación con su monto actual
+            goals = Goal.objects.filter(contributions__isnull=True, current_amount__gt=0)
+            created = GoalContribution.objects.bulk_create([
+                GoalContribution(goal=goal, amount=goal.current_amount, date=goal.updated_at, note="Saldo inicial")
+                for goal in goals
+            ])
+
+            totals = dict(
+                Goal.objects.values('user_id')
+                .annotate(total=Sum('current_amount'))
+                .values_list('user_id', 'total')
+            )
+            profiles = list(UserProfile.objects.all())
+            for profile in profiles:
+                profile.goals_saved = totals.get(profile.user_id, Decimal('0'))
+            UserProfile.objects.bulk_update(profiles, ['goals_saved'], batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(f"Aportaciones iniciales creadas: {len(created)}"))
+        self.stdout.write(self.style.SUCCESS(f"Perfiles recalculados: {len(profiles)}"))
@@ -0,0 +1,27 @@
+from zoneinfo import ZoneInfoNotFoundError
+
+from django.utils import timezone
+
+from PFinance.models import UserProfile
+
+
+class UserTimezoneMiddleware:
+    """Activa la zona horaria del perfil del usuario durante la petición"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = getattr(request, 'user', None)
+        try:
+            if user is None or not user.is_authenticated:
+                raise UserProfile.DoesNotExist
+            # El perfil queda cacheado en request.user para el resto de la petición
+            timezone.activate(user.profile.tzinfo)
+        except (UserProfile.DoesNotExist, ZoneInfoNotFoundError):
+            timezone.deactivate()
+
+        try:
+            return self.get_response(request)
+        finally:
+            timezone.deactivate()
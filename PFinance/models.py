@@ -1,11 +1,19 @@
-from datetime import date
+from datetime import date, timedelta
 from decimal import Decimal
+from zoneinfo import ZoneInfo, available_timezones
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import IntegrityError, models, transaction as db_transaction
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Cast, Coalesce, Floor, Greatest, Least
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
+
+from .cache import alerts_cache
+from .money import money_cents, money_field, money_value
+from .recurrence import next_occurrence
 
 
 class Category(models.Model):
@@ -26,36 +34,104 @@ CURRENCY_CHOICES = [
         ('EUR', 'Euro (€)'),
         ('USD', 'Dólar (US$)'),
         ('GBP', 'Libra (£)'),
+        ('JPY', 'Yen (¥)'),
     ]
 
+TIMEZONE_CHOICES = [(name, name.replace('_', ' ')) for name in sorted(available_timezones())]
+
 
 class UserProfile(models.Model):
     """Perfil extendido del usuario con información financiera adicional"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default='EUR')
+    # Zona horaria en la que se cortan los meses y años del usuario
+    timezone = models.CharField(max_length=64, choices=TIMEZONE_CHOICES, default=settings.TIME_ZONE)
     # notification_email = models.BooleanField(default=True) (Próximamente)
     notification_app = models.BooleanField(default=True)
     foto_perfil = models.ImageField(upload_to="perfiles/", null=True, blank=True)
+    # Total apartado en metas, mantenido por GoalContribution (lectura O(1) del balance)
+    goals_saved = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
     def __str__(self):
         return f"Perfil de {self.user.username}"
 
+    @property
+    def tzinfo(self):
+        return ZoneInfo(self.timezone)
+
 
 class Transaction(models.Model):
     """Modelo para registrar todas las transacciones (gastos e ingresos)"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions')
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = money_field(max_digits=10)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='transactions')
     date = models.DateTimeField(default=timezone.now)
     description = models.TextField(blank=True, null=True)
     is_expense = models.BooleanField(default=True)  # True: gasto, False: ingreso
+    # Divisa del importe; vacía en filas antiguas, que se interpretan en la divisa del perfil
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, blank=True)
+    # Importe en la divisa del perfil (profile_currency) fijado al guardar: es lo que suma a los
+    # presupuestos y lo que agregan las consultas, así que sumar y restar usan siempre el mismo valor
+    profile_amount = money_field(max_digits=12, null=True, blank=True, editable=False)
+    profile_currency = models.CharField(max_length=3, blank=True, editable=False)
+    # Pago recurrente que la generó: la proyección de presupuestos no extrapola estos cargos
+    recurring_payment = models.ForeignKey(
+        'RecurringPayment', on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name='transactions'
+    )
+
+    # Campos que determinan a qué período de presupuesto suma y cuánto
+    SPEND_FIELDS = ('category_id', 'date', 'amount', 'currency', 'is_expense', 'profile_amount', 'profile_currency')
 
     def __str__(self):
         transaction_type = "Gasto" if self.is_expense else "Ingreso"
         return f"{transaction_type}: {self.amount} - {self.category}"
 
+    def save(self, *args, **kwargs):
+        from .budgets import budget_index
+        from .currency import convert
+
+        if not self.currency or not self.profile_currency:
+            # La divisa del perfil sale del índice cacheado que usan también las señales
+            profile_currency = budget_index(self.user_id)['currency']
+            self.currency = self.currency or profile_currency
+            self.profile_currency = self.profile_currency or profile_currency
+        # Sin tipo de cambio queda el importe original; al restarlo se resta ese mismo valor
+        self.profile_amount = convert(self.amount, self.currency, self.profile_currency, self.date)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores leídos: al editar, las señales aplican a los presupuestos solo la diferencia
+        if all(field in instance.__dict__ for field in cls.SPEND_FIELDS):
+            instance._loaded_spend = {field: instance.__dict__[field] for field in cls.SPEND_FIELDS}
+        return instance
+
     class Meta:
         ordering = ['-date']  # Ordenar por fecha descendente
+        # Los filtros por período son rangos sobre date: permiten recorrer el índice
+        indexes = [
+            models.Index(fields=['user', 'date'], name='transaction_user_date_idx'),
+            models.Index(fields=['user', 'category', 'date'], name='transaction_user_cat_date_idx'),
+        ]
+
+
+class BudgetQuerySet(models.QuerySet):
+    def with_current_period(self, moment=None):
+        """Anota el estado, el gasto y el límite del período vigente (una fila por presupuesto)"""
+        current = BudgetPeriod.objects.current(moment).filter(budget=models.OuterRef('pk'))
+        money = money_field(max_digits=12)
+        return self.annotate(
+            # Sin fila todavía no hay gastos en el período
+            current_state=Coalesce(models.Subquery(current.values('state')[:1]), models.Value('ok')),
+            current_spent=Coalesce(
+                models.Subquery(current.values('spent')[:1]), models.Value(Decimal('0')), output_field=money
+            ),
+            current_amount=Coalesce(
+                models.Subquery(current.values('amount')[:1]), models.F('amount'), output_field=money
+            ),
+        )
 
 
 class Budget(models.Model):
@@ -74,18 +150,28 @@ class Budget(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets')
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='budgets')
-    amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0.01)])
+    amount = money_field(max_digits=10, validators=[MinValueValidator(0.01)])
     frequency = models.CharField( max_length=10, choices=FREQUENCY_CHOICES, default='MENSUAL')
     is_active = models.BooleanField(default=True)
+    # Si está activo, lo no gastado de un período se suma al límite del siguiente
+    rollover = models.BooleanField(default=False)
 
     state = models.CharField( max_length=10, choices=STATE_CHOICES, default='ok')
 
+    objects = BudgetQuerySet.as_manager()
+
     def spent_amount(self):
-        return Transaction.objects.filter(
+        from .archive import archived_total
+        from .currency import converted_sum
+
+        currency = self.user.profile.currency
+        spent = Transaction.objects.filter(
             user=self.user,
             category=self.category,
             is_expense=True
-        ).aggregate(total=models.Sum('amount'))['total'] or 0
+        ).aggregate(total=converted_sum(currency))['total'] or 0
+        # Lo archivado sale de los resúmenes anuales
+        return spent + archived_total(self.user_id, currency, is_expense=True, category_id=self.category_id)
 
     def remaining_amount(self):
         return self.amount - self.spent_amount()
@@ -93,23 +179,181 @@ class Budget(models.Model):
     def __str__(self):
         return f"Presupuesto: {self.category.name} - {self.amount}"
 
+    class Meta:
+        # Las señales de transacciones buscan el presupuesto activo por (usuario, categoría)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'category'],
+                condition=models.Q(is_active=True),
+                name='unique_active_budget'
+            ),
+        ]
+
+
+class BudgetPeriodQuerySet(models.QuerySet):
+    def current(self, moment=None):
+        """Períodos que contienen ``moment`` (ahora por defecto)"""
+        moment = moment or timezone.now()
+        return self.filter(start__lte=moment, end__gt=moment)
+
+    def chart_data(self, limit=None):
+        """Series del histórico (los ``limit`` últimos períodos), del más antiguo al actual"""
+        rows = self.order_by('-start').values_list(
+            'start',
+            money_cents('amount'),
+            money_cents('spent'),
+            'state'
+        )
+        if limit:
+            rows = rows[:limit]
+
+        data = {'labels': [], 'amounts': [], 'spent': [], 'states': []}
+        for start, amount, spent, state in reversed(list(rows)):
+            data['labels'].append(timezone.localtime(start).strftime("%b %Y"))
+            data['amounts'].append(amount / 100)
+            data['spent'].append(spent / 100)
+            data['states'].append(state)
+        return data
+
+
+class BudgetPeriod(models.Model):
+    """
+    Gasto y estado de un presupuesto en un período concreto [start, end).
+
+    Se crea al primer gasto del período (o con el comando open_budget_periods)
+    y después se actualiza con incrementos en SQL, sin volver a agregar.
+    """
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='periods')
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    # Límite del período: el del presupuesto más el remanente del anterior
+    amount = money_field(max_digits=12)
+    rollover = money_field(max_digits=12, default=0)
+    spent = money_field(max_digits=12, default=0)
+    state = models.CharField(max_length=10, choices=Budget.STATE_CHOICES, default='ok')
+
+    objects = BudgetPeriodQuerySet.as_manager()
+
+    LIMIT_RATIO = Decimal('0.9')
+
+    @classmethod
+    def state_for(cls, amount, spent):
+        """ok por debajo del 90 %, limit hasta el 100 % y overlimit por encima"""
+        if spent > amount:
+            return 'overlimit'
+        if spent >= amount * cls.LIMIT_RATIO:
+            return 'limit'
+        return 'ok'
+
+    @classmethod
+    def _state_expression(cls, spent):
+        """``state_for`` en SQL, para calcular el estado en el mismo UPDATE"""
+        return models.Case(
+            models.When(GreaterThan(spent, models.F('amount')), then=models.Value('overlimit')),
+            models.When(GreaterThanOrEqual(spent, models.F('amount') * cls.LIMIT_RATIO), then=models.Value('limit')),
+            default=models.Value('ok'),
+            output_field=models.CharField()
+        )
+
+    @classmethod
+    def open(cls, budget, period, currency):
+        """
+        Devuelve (fila, creada) del período. Al crearla se agrega una sola vez
+        el gasto del período y se arrastra el remanente del período anterior.
+        """
+        from .archive import archived_range_total
+        from .currency import converted_sum
+
+        row = cls.objects.filter(budget_id=budget.pk, start=period.start).first()
+        if row:
+            return row, False
+
+        spent = Transaction.objects.filter(
+            user_id=budget.user_id,
+            category_id=budget.category_id,
+            is_expense=True,
+            **period.filter()
+        ).aggregate(total=converted_sum(currency))['total'] or Decimal('0')
+        # Solo consulta el archivo si el período es anterior al corte
+        spent += archived_range_total(
+            budget.user_id, currency, period.start, period.end,
+            category_id=budget.category_id, is_expense=True
+        )
+
+        rollover = Decimal('0')
+        if budget.rollover:
+            previous = cls.objects.filter(budget_id=budget.pk, end=period.start).values('amount', 'spent').first()
+            if previous:
+                rollover = max(previous['amount'] - previous['spent'], Decimal('0'))
+
+        amount = budget.amount + rollover
+        try:
+            with db_transaction.atomic():
+                return cls.objects.create(
+                    budget_id=budget.pk,
+                    start=period.start,
+                    end=period.end,
+                    amount=amount,
+                    rollover=rollover,
+                    spent=spent,
+                    state=cls.state_for(amount, spent)
+                ), True
+        except IntegrityError:
+            # Otro proceso la creó a la vez
+            return cls.objects.get(budget_id=budget.pk, start=period.start), False
+
+    @classmethod
+    def add_spent(cls, budget, period, currency, delta):
+        """
+        Suma ``delta`` (negativo al borrar) al gasto del período con un UPDATE
+        atómico que recalcula también el estado, y devuelve la fila actualizada.
+        """
+        spent = models.F('spent') + money_value(delta)
+        updated = cls.objects.filter(budget_id=budget.pk, start=period.start).update(
+            spent=spent, state=cls._state_expression(spent)
+        )
+        if not updated:
+            row, created = cls.open(budget, period, currency)
+            if created:
+                # La agregación inicial ya incluye el cambio
+                return row
+            cls.objects.filter(pk=row.pk).update(spent=spent, state=cls._state_expression(spent))
+        return cls.objects.get(budget_id=budget.pk, start=period.start)
+
+    @property
+    def remaining(self):
+        return self.amount - self.spent
+
+    def __str__(self):
+        return f"{self.budget_id}: {timezone.localtime(self.start):%Y-%m-%d} ({self.spent}/{self.amount})"
+
+    class Meta:
+        ordering = ['-start']
+        constraints = [
+            # También es el índice de la lectura del período vigente de un presupuesto
+            models.UniqueConstraint(fields=['budget', 'start'], name='unique_budget_period'),
+        ]
+
 
 class RecurringPayment(models.Model):
     """Pagos recurrentes programados (suscripciones, facturas, etc.)"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_payments')
     name = models.CharField(max_length=200)
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = money_field(max_digits=10)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     start_date = models.DateField()
     end_date = models.DateField(null=True, blank=True)
 
     FREQUENCY_CHOICES = [
+        ('weekly', 'Semanal'),
         ('monthly', 'Mensual'),
         ('yearly', 'Anual'),
     ]
     frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='monthly')
     next_due_date = models.DateField()
     reminder_days = models.PositiveSmallIntegerField(default=3)  # Días antes para recordatorio
+    # next_due_date - reminder_days, mantenido en save() para buscar recordatorios por índice
+    reminder_date = models.DateField(null=True, blank=True, editable=False)
 
     is_active = models.BooleanField(default=True, verbose_name="Activo")
 
@@ -117,10 +361,20 @@ class RecurringPayment(models.Model):
         verbose_name = "Pago recurrente"
         verbose_name_plural = "Pagos recurrentes"
         ordering = ['next_due_date']
+        indexes = [
+            models.Index(fields=['reminder_date'], name='payment_reminder_idx', condition=models.Q(is_active=True)),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.amount} - {self.get_frequency_display()})"
 
+    def save(self, *args, **kwargs):
+        self.reminder_date = self.next_due_date - timedelta(days=self.reminder_days)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'next_due_date', 'reminder_days'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'reminder_date'}
+        super().save(*args, **kwargs)
+
     def clean(self):
         """Validaciones de fechas"""
         errors = {}
@@ -134,35 +388,9 @@ class RecurringPayment(models.Model):
         if errors:
             raise ValidationError(errors)
 
-    def _days_in_month(self, year, month):
-        """Devuelve el número de días en un mes específico"""
-        if month == 12:
-            return 31
-        return (date(year, month + 1, 1) - date(year, month, 1)).days
-
-    def _add_months(self, source_date, months):
-        """Añade meses a una fecha manteniendo el día máximo válido"""
-        year = source_date.year + (months // 12)
-        month = source_date.month + (months % 12)
-
-        if month > 12:
-            month -= 12
-            year += 1
-
-        day = min(source_date.day, self._days_in_month(year, month))
-        return date(year, month, day)
-
     def update_next_due_date(self):
         """Calcula la nueva fecha de pago según la frecuencia"""
-        if self.frequency == 'monthly':
-            self.next_due_date = self._add_months(self.next_due_date, 1)
-        else:  # yearly
-            try:
-                # Intenta mantener el mismo día/mes
-                self.next_due_date = self.next_due_date.replace(year=self.next_due_date.year + 1)
-            except ValueError:
-                # Para años bisiestos (29 de febrero)
-                self.next_due_date = date(self.next_due_date.year + 1, 3, 1)
+        self.next_due_date = next_occurrence(self.next_due_date, self.frequency, anchor=self.start_date)
 
         # Desactiva si superó la fecha final
         if self.end_date and self.next_due_date > self.end_date:
@@ -178,22 +406,32 @@ class RecurringPayment(models.Model):
             category=self.category,
             date=timezone.now(),
             description=f"Pago recurrente: {self.name}",
-            is_expense=True
+            is_expense=True,
+            recurring_payment=self
         )
 
-    def process_payment(self):
-        """Ejecuta el pago si está vencido y activo"""
+    def process_payment(self, run=None):
+        """
+        Ejecuta el pago si está vencido y activo. Cada vencimiento se cobra una
+        sola vez aunque la tarea se reintente (clave de idempotencia).
+        """
         if date.today() >= self.next_due_date and self.is_active:
-            transaction = self.create_transaction()
-            self.update_next_due_date()
-
-            # Crear alerta
-            Alert.objects.create(
-                user=self.user,
-                title=f"Pago automático: {self.name}",
-                message=f"Se ha procesado el pago de {self.amount} {self.user.profile.currency}",
-                alert_type='payment'
-            )
+            with db_transaction.atomic():
+                if not JobItem.claim(Alert.build_dedup_key('payment', self.pk, self.next_due_date.isoformat()), run):
+                    # Ya cobrado en una ejecución anterior: solo se avanza la fecha
+                    self.update_next_due_date()
+                    return None
+
+                transaction = self.create_transaction()
+                self.update_next_due_date()
+
+                # Crear alerta
+                Alert.objects.create(
+                    user=self.user,
+                    title=f"Pago automático: {self.name}",
+                    message=f"Se ha procesado el pago de {self.amount} {self.user.profile.currency}",
+                    alert_type='payment'
+                )
 
             return transaction
         return None
@@ -201,14 +439,14 @@ class RecurringPayment(models.Model):
     @classmethod
     def process_due_payments(cls):
         """Procesa todos los pagos vencidos (para el comando)"""
-        return [
+        transactions = (
             payment.process_payment()
             for payment in cls.objects.filter(
                 next_due_date__lte=date.today(),
                 is_active=True
             ).select_related('user', 'category')
-            if payment.process_payment() is not None
-        ]
+        )
+        return [transaction for transaction in transactions if transaction is not None]
 
 
 class Alert(models.Model):
@@ -229,14 +467,103 @@ class Alert(models.Model):
     ]
     alert_type = models.CharField(max_length=10, choices=ALERT_TYPES)
 
+    # Legado: las alertas de presupuesto ya no enlazan transacciones una a una
+    # (ver collapse_alert_transactions); solo se leen en alertas antiguas
     transactions = models.ManyToManyField(Transaction, related_name='alerts', blank=True)
 
+    # Alertas de presupuesto: presupuesto y período [period_start, period_end) al que se refieren
+    budget = models.ForeignKey('Budget', on_delete=models.SET_NULL, null=True, blank=True, related_name='alerts')
+    period_start = models.DateTimeField(null=True, blank=True)
+    period_end = models.DateTimeField(null=True, blank=True)
+
+    # Identifica el origen de la alerta (p. ej. "budget:12:2025-03") para no duplicarla
+    dedup_key = models.CharField(max_length=100, null=True, blank=True)
+
+    @staticmethod
+    def build_dedup_key(source_type, source_id, period=None):
+        """Clave estructurada: tipo de origen + id del objeto + período"""
+        key = f"{source_type}:{source_id}"
+        return f"{key}:{period}" if period else key
+
+    @classmethod
+    def upsert(cls, user, dedup_key, alert_type, title, message, mark_unread=False, budget_id=None, period=None):
+        """
+        Crea la alerta o actualiza la existente con la misma clave en una sola
+        sentencia (INSERT ... ON CONFLICT), sin carreras entre escrituras.
+        Con ``budget_id`` y ``period`` la alerta referencia el presupuesto y su período.
+        """
+        update_fields = ['alert_type', 'title', 'message']
+        if mark_unread:
+            update_fields.append('read')
+        if budget_id is not None:
+            update_fields += ['budget', 'period_start', 'period_end']
+
+        alert = cls.objects.bulk_create(
+            [cls(
+                user=user,
+                dedup_key=dedup_key,
+                alert_type=alert_type,
+                title=title,
+                message=message,
+                read=False,
+                budget_id=budget_id,
+                period_start=period.start if period else None,
+                period_end=period.end if period else None
+            )],
+            update_conflicts=True,
+            unique_fields=['user', 'dedup_key'],
+            update_fields=update_fields
+        )[0]
+
+        # bulk_create no envía post_save
+        if alert.pk is None:
+            alert.pk = cls.objects.filter(user=user, dedup_key=dedup_key).values_list('pk', flat=True).get()
+        ChangeLog.record(cls, [(alert.pk, user.pk)])
+        alerts_cache.invalidate(user.pk)
+        return alert
+
+    @classmethod
+    def create_missing(cls, alerts):
+        """
+        Inserta en bloque las alertas cuya clave todavía no existe y devuelve
+        las nuevas. Si otro proceso se adelanta, ON CONFLICT DO NOTHING evita
+        el duplicado.
+        """
+        keys = {alert.dedup_key for alert in alerts}
+        existing = set(
+            cls.objects.filter(dedup_key__in=keys).values_list('user_id', 'dedup_key')
+        )
+        new_alerts = [alert for alert in alerts if (alert.user_id, alert.dedup_key) not in existing]
+        cls.objects.bulk_create(new_alerts, ignore_conflicts=True)
+
+        # Con ignore_conflicts no se devuelven los ids
+        users = {alert.user_id for alert in new_alerts}
+        if new_alerts:
+            ChangeLog.record(cls, cls.objects.filter(
+                user_id__in=users, dedup_key__in={alert.dedup_key for alert in new_alerts}
+            ).values_list('pk', 'user_id'))
+        for user_id in users:
+            alerts_cache.invalidate(user_id)
+        return new_alerts
+
     def get_related_transactions(self):
-        return self.transactions.all().order_by('-date')
+        """
+        Gastos de la categoría del presupuesto dentro del período de la alerta,
+        con una consulta de rango sobre el índice (usuario, categoría, fecha).
+        """
+        if self.budget_id is None or self.period_start is None:
+            return self.transactions.select_related('category').order_by('-date')
+        return Transaction.objects.filter(
+            user_id=self.user_id,
+            category_id=self.budget.category_id,
+            is_expense=True,
+            date__gte=self.period_start,
+            date__lt=self.period_end
+        ).select_related('category').order_by('-date')
 
     def delete_if_empty(self):
         """Elimina la alerta si no tiene transacciones"""
-        if self.transactions.count() == 0:
+        if not self.get_related_transactions().exists():
             self.delete()
 
 
@@ -245,10 +572,82 @@ class Alert(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'dedup_key'], name='unique_alert_dedup_key'),
+        ]
+        indexes = [
+            # Índice parcial: el contador del header solo recorre las no leídas
+            models.Index(
+                fields=['user', '-created_at'],
+                name='alert_unread_idx',
+                condition=models.Q(read=False)
+            ),
+        ]
+
+
+class ArchivedAlert(models.Model):
+    """Alertas leídas antiguas movidas fuera de la tabla principal (ver purge_alerts)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_alerts')
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    alert_type = models.CharField(max_length=10, choices=Alert.ALERT_TYPES)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.alert_type}: {self.title} (archivada)"
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class ArchivedTransaction(models.Model):
+    """Transacciones antiguas movidas fuera de la tabla principal (ver archive_transactions)"""
+    # Se conserva el id original de la transacción
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_transactions')
+    amount = money_field(max_digits=10)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='archived_transactions')
+    date = models.DateTimeField()
+    description = models.TextField(blank=True, null=True)
+    is_expense = models.BooleanField(default=True)
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        transaction_type = "Gasto" if self.is_expense else "Ingreso"
+        return f"{transaction_type}: {self.amount} - {self.category} (archivada)"
+
+    class Meta:
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['user', 'date'], name='archived_tx_user_date_idx'),
+        ]
+
+
+class TransactionSummary(models.Model):
+    """Totales anuales de las transacciones archivadas por categoría, tipo y divisa"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transaction_summaries')
+    year = models.PositiveSmallIntegerField()
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+')
+    is_expense = models.BooleanField()
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, blank=True)
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    count = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.user_id} {self.year}: {self.total} {self.currency}"
+
+    class Meta:
+        verbose_name_plural = "Transaction summaries"
+        indexes = [
+            models.Index(fields=['user', 'year'], name='tx_summary_user_year_idx'),
+        ]
 
 
 class RecurringIncome(models.Model):
     FREQUENCY_CHOICES = [
+        ('weekly', 'Semanal'),
         ('monthly', 'Mensual'),
         ('yearly', 'Anual'),
     ]
@@ -263,7 +662,7 @@ class RecurringIncome(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_incomes')
     name = models.CharField(max_length=200, verbose_name="Nombre del ingreso")
-    amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Monto")
+    amount = money_field(max_digits=12, verbose_name="Monto")
     source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default='salary', verbose_name="Fuente")
     category = models.ForeignKey(
         'Category',
@@ -282,17 +681,31 @@ class RecurringIncome(models.Model):
         verbose_name="Frecuencia"
     )
     next_income_date = models.DateField(verbose_name="Próximo ingreso")
+    # next_income_date - REMINDER_DAYS, mantenido en save() para buscar recordatorios por índice
+    reminder_date = models.DateField(null=True, blank=True, editable=False)
     is_active = models.BooleanField(default=True, verbose_name="Activo")
 
+    REMINDER_DAYS = 3
+
     class Meta:
         verbose_name = "Ingreso recurrente"
         verbose_name_plural = "Ingresos recurrentes"
         ordering = ['next_income_date']
         unique_together = ['user', 'name']  # Evita duplicados
+        indexes = [
+            models.Index(fields=['reminder_date'], name='income_reminder_idx', condition=models.Q(is_active=True)),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.amount} - {self.get_frequency_display()})"
 
+    def save(self, *args, **kwargs):
+        self.reminder_date = self.next_income_date - timedelta(days=self.REMINDER_DAYS)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'next_income_date' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'reminder_date'}
+        super().save(*args, **kwargs)
+
     def clean(self):
         if self.end_date and self.end_date < self.start_date:
             raise ValidationError("La fecha de fin debe ser posterior a la de inicio")
@@ -313,17 +726,7 @@ class RecurringIncome(models.Model):
 
     def update_next_income_date(self):
         """Calcula la nueva fecha según la frecuencia"""
-        if self.frequency == 'monthly':
-            # Manejo preciso de meses
-            year = self.next_income_date.year
-            month = self.next_income_date.month + 1
-            if month > 12:
-                month = 1
-                year += 1
-            day = min(self.next_income_date.day, self._days_in_month(month, year))
-            self.next_income_date = date(year, month, day)
-        else:  # yearly
-            self.next_income_date = self.next_income_date.replace(year=self.next_income_date.year + 1)
+        self.next_income_date = next_occurrence(self.next_income_date, self.frequency, anchor=self.start_date)
 
         # Desactiva si superó la fecha final
         if self.end_date and self.next_income_date > self.end_date:
@@ -331,21 +734,77 @@ class RecurringIncome(models.Model):
 
         self.save()
 
-    def _days_in_month(self, month, year):
-        """Helper para días en un mes"""
-        if month == 12:
-            return 31
-        return (date(year, month + 1, 1) - date(year, month, 1)).days
-
-    def process_income(self):
-        """Ejecuta el ingreso si está vencido y activo"""
+    def process_income(self, run=None):
+        """
+        Ejecuta el ingreso si está vencido y activo (una sola vez por fecha).
+        La alerta se crea en la misma transacción que el ingreso.
+        """
         if date.today() >= self.next_income_date and self.is_active:
-            transaction = self.create_transaction()
-            self.update_next_income_date()
+            day = self.next_income_date.isoformat()
+            with db_transaction.atomic():
+                if not JobItem.claim(Alert.build_dedup_key('income', self.pk, day), run):
+                    self.update_next_income_date()
+                    return None
+
+                transaction = self.create_transaction()
+                self.update_next_income_date()
+
+                Alert.create_missing([Alert(
+                    user=self.user,
+                    dedup_key=Alert.build_dedup_key('income_received', self.pk, day),
+                    title=f"Ingreso registrado: {self.name}",
+                    message=f"Se ha ingresado {self.amount} {self.user.profile.currency} ({self.get_source_display()})",
+                    alert_type='income'
+                )])
             return transaction
         return None
 
 
+class GoalQuerySet(models.QuerySet):
+    def with_progress(self):
+        """Anota progreso (%), cantidad restante y si se completó, calculados en SQL"""
+        return self.annotate(
+            progress_pct=models.Case(
+                models.When(
+                    target_amount__gt=0,
+                    then=Least(
+                        Cast(Floor(models.F('current_amount') * 100 / models.F('target_amount')),
+                             models.IntegerField()),
+                        models.Value(100)
+                    )
+                ),
+                default=models.Value(0),
+                output_field=models.IntegerField()
+            ),
+            remaining_amount=Greatest(
+                models.F('target_amount') - models.F('current_amount'),
+                models.Value(Decimal('0')),
+                output_field=money_field(max_digits=12)
+            ),
+            is_completed=models.ExpressionWrapper(
+                models.Q(current_amount__gte=models.F('target_amount')),
+                output_field=models.BooleanField()
+            ),
+        )
+
+    def chart_data(self):
+        """Series del gráfico de metas del dashboard en una sola pasada"""
+        rows = self.with_progress().values_list(
+            'subject',
+            money_cents('target_amount'),
+            money_cents('current_amount'),
+            'progress_pct'
+        )
+
+        data = {'labels': [], 'target': [], 'current': [], 'progress': []}
+        for subject, target, current, progress in rows:
+            data['labels'].append(subject)
+            data['target'].append(target / 100)
+            data['current'].append(current / 100)
+            data['progress'].append(progress)
+        return data
+
+
 class Goal(models.Model):
     STATUS_CHOICES = [
         ('in_progress', 'En progreso'),
@@ -354,15 +813,13 @@ class Goal(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='goals')
     subject = models.CharField(max_length=100, verbose_name="Asunto")
-    target_amount = models.DecimalField(
+    target_amount = money_field(
         max_digits=12,
-        decimal_places=2,
         validators=[MinValueValidator(0.01)],
         verbose_name="Objetivo"
     )
-    current_amount = models.DecimalField(
+    current_amount = money_field(
         max_digits=12,
-        decimal_places=2,
         default=0,
         validators=[MinValueValidator(0)],
         verbose_name="Monto actual"
@@ -377,6 +834,8 @@ class Goal(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     notes = models.TextField(blank=True, verbose_name="Notas")
 
+    objects = GoalQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Meta"
@@ -385,6 +844,72 @@ class Goal(models.Model):
     def __str__(self):
         return f"{self.subject} ({self.current_amount}/{self.target_amount})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guardamos el monto leído para registrar en el histórico los cambios hechos con save()
+        loaded = dict(zip(field_names, values))
+        if loaded.get('current_amount', models.DEFERRED) is not models.DEFERRED:
+            instance._loaded_current_amount = loaded['current_amount']
+        return instance
+
+    def add_contribution(self, amount, transaction=None, date=None, note=''):
+        """
+        Registra una aportación (o retirada si es negativa) y actualiza
+        current_amount de forma incremental con F(), sin releer la meta.
+        """
+        amount = Decimal(amount)
+        previous_status = self.status
+
+        with db_transaction.atomic():
+            goals = Goal.objects.filter(pk=self.pk)
+            if amount < 0:
+                # Una retirada nunca puede dejar la meta en negativo
+                goals = goals.filter(current_amount__gte=-amount)
+
+            new_amount = models.F('current_amount') + money_value(amount)
+            updated = goals.update(
+                current_amount=new_amount,
+                status=models.Case(
+                    models.When(GreaterThanOrEqual(new_amount, models.F('target_amount')), then=models.Value('completed')),
+                    default=models.Value('in_progress')
+                ),
+                updated_at=timezone.now()
+            )
+            if not updated:
+                raise ValidationError("La retirada supera el monto acumulado en la meta")
+            ChangeLog.record(Goal, [(self.pk, self.user_id)])
+
+            contribution = GoalContribution.objects.create(
+                goal=self,
+                amount=amount,
+                transaction=transaction,
+                date=date or timezone.now(),
+                note=note
+            )
+            UserProfile.objects.filter(user_id=self.user_id).update(
+                goals_saved=models.F('goals_saved') + amount
+            )
+
+        self.refresh_from_db(fields=['current_amount', 'status', 'updated_at'])
+        self._loaded_current_amount = self.current_amount
+
+        if previous_status != 'completed' and self.status == 'completed':
+            self.notify_completion()
+        return contribution
+
+    def notify_completion(self):
+        """Crea la alerta de meta alcanzada (una sola por meta)"""
+        if not self.user.profile.notification_app:
+            return
+        Alert.upsert(
+            user=self.user,
+            dedup_key=Alert.build_dedup_key('goal', self.pk),
+            alert_type='goal',
+            title=f"Meta alcanzada: {self.subject}",
+            message=f"¡Felicidades! Has alcanzado tu meta de {self.target_amount} {self.user.profile.currency} para '{self.subject}'."
+        )
+
     def progress_percentage(self):
         """Calcula el porcentaje de progreso correctamente"""
         try:
@@ -406,5 +931,245 @@ class Goal(models.Model):
             self.status = 'completed'
         elif self.status == 'completed' and self.current_amount < self.target_amount:
             self.status = 'in_progress'
-        super().save(*args, **kwargs)
 
+        # Los cambios directos de current_amount (alta, admin...) también quedan en el histórico
+        delta = self.current_amount - getattr(self, '_loaded_current_amount', 0)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'current_amount' not in update_fields:
+            delta = 0
+
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+            if delta:
+                GoalContribution.objects.create(goal=self, amount=delta, note="Ajuste del monto")
+                UserProfile.objects.filter(user_id=self.user_id).update(
+                    goals_saved=models.F('goals_saved') + delta
+                )
+        self._loaded_current_amount = self.current_amount
+
+
+class GoalContribution(models.Model):
+    """Histórico de aportaciones a una meta, opcionalmente ligadas a una transacción"""
+    goal = models.ForeignKey(Goal, on_delete=models.CASCADE, related_name='contributions')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Monto")
+    date = models.DateTimeField(default=timezone.now, verbose_name="Fecha")
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='goal_contributions'
+    )
+    note = models.CharField(max_length=200, blank=True, verbose_name="Nota")
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name = "Aportación"
+        verbose_name_plural = "Aportaciones"
+        indexes = [
+            models.Index(fields=['goal', '-date'], name='goalcontribution_goal_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.goal.subject}: {self.amount} ({self.date:%d/%m/%Y})"
+
+
+
+class JobRun(models.Model):
+    """Ejecución de una tarea programada, con checkpoint para reanudarla si falla"""
+    STATUS_CHOICES = [
+        ('running', 'En curso'),
+        ('completed', 'Completada'),
+        ('failed', 'Fallida'),
+    ]
+    job = models.CharField(max_length=50)
+    run_date = models.DateField()  # Día lógico que procesa la ejecución
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=1)
+
+    # Último pk procesado: la siguiente ejecución continúa a partir de aquí
+    checkpoint = models.PositiveBigIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    # Tareas incrementales: límite superior (p. ej. último pk de transacción) que cubre la ejecución
+    watermark = models.PositiveBigIntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        verbose_name = "Ejecución de tarea"
+        verbose_name_plural = "Ejecuciones de tareas"
+        indexes = [
+            models.Index(fields=['job', 'run_date'], name='jobrun_job_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job} {self.run_date} ({self.get_status_display()})"
+
+    @property
+    def duration(self):
+        if self.finished_at:
+            return self.finished_at - self.started_at
+        return None
+
+    @property
+    def rows_per_second(self):
+        """Filas por segundo, para el histórico de rendimiento"""
+        if not self.duration:
+            return None
+        total = self.processed + self.skipped + self.failed
+        return total / max(self.duration.total_seconds(), 0.001)
+
+    @classmethod
+    def last_watermark(cls, job):
+        """Marca de agua de la última ejecución completada: hasta aquí ya está procesado"""
+        return cls.objects.filter(job=job, status='completed').aggregate(
+            watermark=models.Max('watermark')
+        )['watermark'] or 0
+
+    @classmethod
+    def start(cls, job, run_date):
+        """Reanuda la última ejecución sin terminar del mismo día o crea una nueva"""
+        run = cls.objects.filter(job=job, run_date=run_date).exclude(status='completed').first()
+        if run is None:
+            return cls.objects.create(job=job, run_date=run_date)
+
+        run.status = 'running'
+        run.attempts += 1
+        run.error = ''
+        # Las filas fallidas quedan tras el checkpoint y se vuelven a intentar
+        run.failed = 0
+        run.save(update_fields=['status', 'attempts', 'error', 'failed'])
+        return run
+
+    def process(self, queryset, handler, chunk_size=500):
+        """
+        Recorre ``queryset`` por pk en bloques a partir del checkpoint y llama a
+        ``handler`` con cada fila: True si la procesó, False si ya estaba hecha.
+        Tras cada bloque se guardan el checkpoint y los contadores.
+
+        El checkpoint no pasa de la primera fila que falla: el resto se sigue
+        procesando, y un reintento vuelve a empezar en la fallida (las ya
+        hechas se omiten por su clave de idempotencia).
+        """
+        cursor = self.checkpoint
+        while True:
+            chunk = list(queryset.filter(pk__gt=cursor).order_by('pk')[:chunk_size])
+            if not chunk:
+                return
+
+            for obj in chunk:
+                try:
+                    if handler(obj):
+                        self.processed += 1
+                    else:
+                        self.skipped += 1
+                except Exception as e:
+                    self.failed += 1
+                    self.error = f"{obj.pk}: {e}"
+                if not self.failed:
+                    self.checkpoint = obj.pk
+
+            cursor = chunk[-1].pk
+            self.save(update_fields=['checkpoint', 'processed', 'skipped', 'failed', 'error'])
+
+    def finish(self, status='completed', error=None):
+        # Con filas fallidas la ejecución no está completa: el reintento del día las retoma
+        if status == 'completed' and self.failed:
+            status = 'failed'
+        self.status = status
+        self.finished_at = timezone.now()
+        if error is not None:
+            self.error = error
+        self.save(update_fields=['status', 'finished_at', 'error'])
+
+
+class JobItem(models.Model):
+    """Clave de idempotencia de una ocurrencia procesada (elemento recurrente + vencimiento)"""
+    key = models.CharField(max_length=100, unique=True)
+    run = models.ForeignKey(JobRun, on_delete=models.SET_NULL, null=True, blank=True, related_name='items')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Ocurrencia procesada"
+        verbose_name_plural = "Ocurrencias procesadas"
+
+    def __str__(self):
+        return self.key
+
+    @classmethod
+    def claim(cls, key, run=None):
+        """
+        Reserva la clave dentro de la transacción en curso. Devuelve False si
+        ya existía: esa ocurrencia se procesó en una ejecución anterior.
+        """
+        try:
+            with db_transaction.atomic():
+                cls.objects.create(key=key, run=run)
+        except IntegrityError:
+            return False
+        return True
+
+
+class ExchangeRate(models.Model):
+    """Tipo de cambio diario: unidades de ``currency`` por 1 EUR"""
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=18, decimal_places=6)
+
+    class Meta:
+        ordering = ['currency', '-date']
+        verbose_name = "Tipo de cambio"
+        verbose_name_plural = "Tipos de cambio"
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_exchange_rate'),
+        ]
+
+    def __str__(self):
+        return f"1 EUR = {self.rate} {self.currency} ({self.date})"
+
+
+class ChangeLog(models.Model):
+    """
+    Registro de cambios para la sincronización incremental de los clientes
+    (ver sync.py). El id es el número de secuencia: crece con cada cambio y
+    el cliente guarda el último que recibió.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='changes')
+    model = models.CharField(max_length=30)  # _meta.model_name del objeto
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)  # Lápida: el objeto ya no existe
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Modelos que ven los clientes
+    TRACKED = (Transaction, Budget, Goal, RecurringPayment, RecurringIncome, Alert)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Cambio"
+        verbose_name_plural = "Cambios"
+        indexes = [
+            # Cambios de un usuario desde un cursor
+            models.Index(fields=['user', 'id'], name='changelog_user_seq_idx'),
+            models.Index(fields=['model', 'object_id'], name='changelog_object_idx'),
+        ]
+
+    def __str__(self):
+        action = "borrado" if self.deleted else "cambio"
+        return f"#{self.pk} {self.model}:{self.object_id} ({action})"
+
+    @classmethod
+    def record(cls, model, changes, deleted=False):
+        """Registra en un solo INSERT los cambios de ``model``; ``changes`` son pares (id, usuario)"""
+        cls.objects.bulk_create([
+            cls(user_id=user_id, model=model._meta.model_name, object_id=pk, deleted=deleted)
+            for pk, user_id in changes
+        ])
+
+    @classmethod
+    def record_queryset(cls, queryset, deleted=False):
+        """Registra las filas de un queryset; llamar antes de ``delete()`` o tras ``update()`` por pk"""
+        cls.record(queryset.model, queryset.order_by().values_list('pk', 'user_id'), deleted=deleted)
@@ -0,0 +1,120 @@
+"""
+Representación de los importes: NUMERIC (por defecto) o céntimos en BIGINT.
+
+Con ``PFINANCE_INTEGER_MONEY = True`` los importes de ``Transaction``,
+``ArchivedTransaction``, ``Budget``, ``BudgetPeriod``, ``RecurringPayment``,
+``RecurringIncome`` y ``Goal`` se guardan como enteros en céntimos
+(``MoneyField``). Las sumas en SQL son sumas de enteros y la serialización a
+JSON se reduce a ``cents / 100``. En Python el valor sigue siendo un
+``Decimal`` con dos decimales, así que formularios, plantillas y el resto del
+código no cambian.
+
+Lo que sí depende de la representación es el SQL que opera con la columna:
+
+- ``money_value`` para sumar un importe de Python en un ``F()`` (UPDATE).
+- ``money_amount`` para la columna en unidades (conversión de divisas).
+- ``money_cents`` para la columna en céntimos (arrays de NumPy).
+
+Cambiar el ajuste en una base de datos existente requiere convertir antes
+las columnas con el comando ``convert_money_columns``.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django import forms
+from django.conf import settings
+from django.db import models
+from django.db.models import BigIntegerField, DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Cast
+
+INTEGER_MONEY = getattr(settings, 'PFINANCE_INTEGER_MONEY', False)
+
+CENT = Decimal('0.01')
+
+
+def to_cents(amount):
+    """Importe (Decimal, int, float o str) a céntimos enteros, redondeando al céntimo"""
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    return int(amount.quantize(CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+def from_cents(cents):
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+
+def format_cents(cents, currency=''):
+    """Importe exacto con dos decimales a partir de céntimos, sin pasar por float"""
+    sign = '-' if cents < 0 else ''
+    units, cents = divmod(abs(int(cents)), 100)
+    text = f"{sign}{units}.{cents:02d}"
+    return f"{text} {currency}" if currency else text
+
+
+def format_money(amount, currency=''):
+    return format_cents(to_cents(amount), currency)
+
+
+class MoneyField(models.BigIntegerField):
+    """Importe guardado en céntimos (BIGINT) y expuesto en Python como Decimal"""
+
+    description = "Importe en céntimos"
+
+    def __init__(self, *args, max_digits=None, decimal_places=2, **kwargs):
+        # Se aceptan los argumentos de DecimalField para poder intercambiarlos
+        self.max_digits = max_digits
+        self.decimal_places = decimal_places
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.max_digits is not None:
+            kwargs['max_digits'] = self.max_digits
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else from_cents(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        return from_cents(to_cents(value))
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        return None if value is None else to_cents(value)
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{
+            'form_class': forms.DecimalField,
+            'max_digits': self.max_digits,
+            'decimal_places': self.decimal_places,
+            **kwargs,
+        })
+
+
+def money_field(max_digits=12, **kwargs):
+    """``MoneyField`` o ``DecimalField(decimal_places=2)`` según ``PFINANCE_INTEGER_MONEY``"""
+    if INTEGER_MONEY:
+        return MoneyField(max_digits=max_digits, **kwargs)
+    return DecimalField(max_digits=max_digits, decimal_places=2, **kwargs)
+
+
+def money_value(amount):
+    """Importe de Python como expresión en la representación de las columnas"""
+    return Value(amount, output_field=money_field())
+
+
+def money_amount(field):
+    """Columna de importe en unidades"""
+    if INTEGER_MONEY:
+        # Multiplicar por 0.01 evita la división entera de SQLite
+        return F(field) * Value(CENT)
+    return F(field)
+
+
+def money_cents(field):
+    """Columna de importe en céntimos; en modo entero es la propia columna"""
+    if INTEGER_MONEY:
+        # Sin conversión a Decimal al leer: los céntimos llegan como int
+        return ExpressionWrapper(F(field), output_field=BigIntegerField())
+    return Cast(F(field) * 100, BigIntegerField())
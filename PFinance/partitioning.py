@@ -0,0 +1,192 @@
+"""
+Particionado opcional por rangos de fecha de la tabla de transacciones (PostgreSQL).
+
+La tabla ``PFinance_transaction`` pasa a ser una tabla particionada por
+``date`` con una partición por mes o por año (``PFinance_transaction_p2025_03``
+o ``PFinance_transaction_p2025``) y una partición ``_default`` para fechas
+fuera de rango. Los límites se calculan en ``TIME_ZONE``.
+
+Todas las consultas por período filtran ``date`` con un rango semiabierto
+(ver ``periods``), así que el planificador descarta las particiones que no
+se solapan con él. Las consultas sin límite de fecha recorren todas.
+
+Restricciones de PostgreSQL que condicionan la conversión:
+
+- La clave primaria de una tabla particionada debe incluir ``date``: pasa a
+  ser ``(id, date)``. ``id`` sigue saliendo de una secuencia, así que sigue
+  siendo único y Django no nota la diferencia.
+- No se puede referenciar ``id`` con una clave foránea desde otra tabla; la
+  única es la tabla intermedia (legado) de ``Alert.transactions``, cuya
+  restricción se elimina. Conviene ejecutar antes ``collapse_alert_transactions``.
+"""
+from datetime import datetime
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Transaction
+
+TABLE = Transaction._meta.db_table
+INTERVALS = ('month', 'year')
+
+
+def partition_name(start, interval):
+    if interval == 'year':
+        return f"{TABLE}_p{start.year}"
+    return f"{TABLE}_p{start.year}_{start.month:02d}"
+
+
+def _next_start(start, interval):
+    if interval == 'year':
+        return start.replace(year=start.year + 1)
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+
+
+def partition_bounds(first, last, interval='month', tz=None):
+    """
+    Particiones ``(nombre, desde, hasta)`` que cubren de ``first`` a ``last``
+    (ambos incluidos), con límites en la medianoche local de ``tz``.
+    """
+    tz = tz or timezone.get_default_timezone()
+    first, last = timezone.localtime(first, tz), timezone.localtime(last, tz)
+    start = datetime(first.year, 1 if interval == 'year' else first.month, 1)
+
+    bounds = []
+    while timezone.make_aware(start, tz) <= last:
+        end = _next_start(start, interval)
+        bounds.append((partition_name(start, interval), timezone.make_aware(start, tz), timezone.make_aware(end, tz)))
+        start = end
+    return bounds
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = %s AND pg_table_is_visible(c.oid))",
+        [TABLE]
+    )
+    return cursor.fetchone()[0]
+
+
+def existing_partitions(cursor):
+    """Nombres de las particiones actuales de la tabla"""
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)",
+        [TABLE]
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def detect_interval(names):
+    """Intervalo de las particiones existentes a partir de sus nombres"""
+    dated = [name for name in names if name != f"{TABLE}_default"]
+    if dated and all(len(name) == len(f"{TABLE}_p0000") for name in dated):
+        return 'year'
+    return 'month'
+
+
+def create_partition(cursor, name, start, end):
+    """
+    Crea una partición. Si la partición por defecto ya tiene filas del rango,
+    se mueven a la nueva (PostgreSQL no permite crearla con ellas dentro).
+    """
+    qn = connection.ops.quote_name
+    default = qn(f"{TABLE}_default")
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE pfinance_moved AS "
+        f"WITH moved AS (DELETE FROM {default} WHERE date >= %s AND date < %s RETURNING *) "
+        f"SELECT * FROM moved",
+        [start, end]
+    )
+    cursor.execute(
+        f"CREATE TABLE {qn(name)} PARTITION OF {qn(TABLE)} FOR VALUES FROM (%s) TO (%s)",
+        [start, end]
+    )
+    cursor.execute(f"INSERT INTO {qn(TABLE)} SELECT * FROM pfinance_moved")
+    cursor.execute("DROP TABLE pfinance_moved")
+
+
+def foreign_keys():
+    """Claves foráneas de ``Transaction`` que la conversión debe recrear"""
+    return [field for field in Transaction._meta.concrete_fields if field.is_relation]
+
+
+def convert_table(cursor, interval, first, last, keep_legacy=False):
+    """
+    Convierte la tabla normal en una particionada con el mismo nombre,
+    columnas, índices y claves foráneas, y copia las filas partición a
+    partición. Debe ejecutarse dentro de una transacción.
+    """
+    qn = connection.ops.quote_name
+    legacy = f"{TABLE}_legacy"
+    # El nombre habitual (<tabla>_id_seq) sigue siendo de la secuencia de la tabla antigua
+    sequence = f"{TABLE}_partitioned_id_seq"
+
+    # Restricciones de otras tablas que apuntan a la tabla actual
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE contype = 'f' AND confrelid = %s::regclass",
+        [qn(TABLE)]
+    )
+    for table, constraint in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {qn(constraint)}")
+
+    cursor.execute(f"ALTER TABLE {qn(TABLE)} RENAME TO {qn(legacy)}")
+    # Los índices conservan su nombre: se renombran para poder recrearlos en la tabla nueva
+    cursor.execute(
+        "SELECT indexname FROM pg_indexes WHERE tablename = %s AND schemaname = current_schema()",
+        [legacy]
+    )
+    for (index,) in cursor.fetchall():
+        cursor.execute(f"ALTER INDEX {qn(index)} RENAME TO {qn(index[:50] + '_legacy')}")
+
+    cursor.execute(
+        f"CREATE TABLE {qn(TABLE)} (LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE (date)"
+    )
+    # Identidad propia: las columnas IDENTITY no se heredan con LIKE en todas las versiones
+    cursor.execute(f"CREATE SEQUENCE {qn(sequence)} OWNED BY {qn(TABLE)}.id")
+    cursor.execute(f"ALTER TABLE {qn(TABLE)} ALTER COLUMN id SET DEFAULT nextval(%s)", [sequence])
+    cursor.execute(f"SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {qn(legacy)}), 0) + 1, false)", [sequence])
+
+    cursor.execute(f"ALTER TABLE {qn(TABLE)} ADD PRIMARY KEY (id, date)")
+    # LIKE no copia las claves foráneas: se recrean todas las del modelo
+    for field in foreign_keys():
+        cursor.execute(
+            f"ALTER TABLE {qn(TABLE)} ADD CONSTRAINT {qn(f'{TABLE}_{field.column}_fk')} "
+            f"FOREIGN KEY ({qn(field.column)}) REFERENCES {qn(field.related_model._meta.db_table)} "
+            f"({qn(field.target_field.column)}) DEFERRABLE INITIALLY DEFERRED"
+        )
+
+    # Índices del modelo (se propagan a cada partición) y los de las claves foráneas que no cubren
+    leading = set()
+    for index in Transaction._meta.indexes:
+        columns = [Transaction._meta.get_field(f.lstrip('-')).column for f in index.fields]
+        leading.add(columns[0])
+        cursor.execute(f"CREATE INDEX {qn(index.name)} ON {qn(TABLE)} ({', '.join(qn(c) for c in columns)})")
+    for field in foreign_keys():
+        if field.column not in leading:
+            cursor.execute(f"CREATE INDEX {qn(f'{TABLE}_{field.column}_idx')} ON {qn(TABLE)} ({qn(field.column)})")
+
+    cursor.execute(f"CREATE TABLE {qn(f'{TABLE}_default')} PARTITION OF {qn(TABLE)} DEFAULT")
+    bounds = partition_bounds(first, last, interval)
+    for name, start, end in bounds:
+        cursor.execute(
+            f"CREATE TABLE {qn(name)} PARTITION OF {qn(TABLE)} FOR VALUES FROM (%s) TO (%s)",
+            [start, end]
+        )
+        cursor.execute(
+            f"INSERT INTO {qn(TABLE)} SELECT * FROM {qn(legacy)} WHERE date >= %s AND date < %s",
+            [start, end]
+        )
+    # Lo que quede fuera de los rangos va a la partición por defecto
+    cursor.execute(
+        f"INSERT INTO {qn(TABLE)} SELECT * FROM {qn(legacy)} WHERE date < %s OR date >= %s",
+        [bounds[0][1], bounds[-1][2]]
+    )
+
+    if not keep_legacy:
+        cursor.execute(f"DROP TABLE {qn(legacy)}")
@@ -0,0 +1,104 @@
+"""
+Períodos de calendario (mes, año) como rangos semiabiertos ``[start, end)``
+de datetimes con zona horaria.
+
+Filtrar con ``date__gte=start, date__lt=end`` permite al motor recorrer el
+índice sobre ``date``. Con ``USE_TZ=True``, ``date__year``/``date__month``
+convierten la zona y extraen año y mes fila a fila, lo que obliga a leer
+todas las transacciones del usuario.
+
+Sin ``tz`` se usa la zona activa, que ``UserTimezoneMiddleware`` fija a la
+del perfil en cada petición. Los límites se cachean por (zona, mes).
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.utils import timezone
+
+
+class Period(NamedTuple):
+    start: datetime
+    end: datetime
+    frequency: str  # 'monthly' o 'yearly'
+
+    @property
+    def key(self):
+        """Identificador estable del período ("2025-03" o "2025")"""
+        if self.frequency == 'yearly':
+            return f"{self.start.year}"
+        return f"{self.start.year}-{self.start.month:02d}"
+
+    @property
+    def description(self):
+        if self.frequency == 'yearly':
+            return f"del año {self.start.year}"
+        return f"del mes {self.start.month}/{self.start.year}"
+
+    def filter(self, field='date'):
+        """Argumentos de filtro para un queryset: ``qs.filter(**period.filter())``"""
+        return {f'{field}__gte': self.start, f'{field}__lt': self.end}
+
+    def __contains__(self, moment):
+        return self.start <= moment < self.end
+
+
+def _local(moment, tz):
+    tz = tz or timezone.get_current_timezone()
+    moment = moment or timezone.now()
+    if timezone.is_aware(moment):
+        moment = timezone.localtime(moment, tz)
+    return moment, tz
+
+
+@lru_cache(maxsize=4096)
+def _month_period(tz, year, month):
+    """Límites de un mes en una zona, calculados una vez por (zona, mes)"""
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return Period(
+        timezone.make_aware(datetime(year, month, 1), tz),
+        timezone.make_aware(datetime(next_year, next_month, 1), tz),
+        'monthly'
+    )
+
+
+@lru_cache(maxsize=1024)
+def _year_period(tz, year):
+    return Period(_month_period(tz, year, 1).start, _month_period(tz, year + 1, 1).start, 'yearly')
+
+
+def month_period(moment=None, tz=None, offset=0):
+    """Mes que contiene ``moment`` (ahora por defecto), desplazado ``offset`` meses"""
+    moment, tz = _local(moment, tz)
+    return _month_period(tz, moment.year, moment.month + offset)
+
+
+def year_period(moment=None, tz=None):
+    """Año natural que contiene ``moment``"""
+    moment, tz = _local(moment, tz)
+    return _year_period(tz, moment.year)
+
+
+def budget_period(frequency, moment=None, tz=None):
+    """Período vigente de un presupuesto según su frecuencia"""
+    if frequency == 'yearly':
+        return year_period(moment, tz)
+    return month_period(moment, tz)
+
+
+def last_months(count, moment=None, tz=None):
+    """Los ``count`` últimos meses, del más antiguo al actual"""
+    return [month_period(moment, tz, offset=-i) for i in range(count - 1, -1, -1)]
+
+
+def period_from_key(key, tz=None):
+    """Período a partir de su clave ("2025-03" o "2025"); None si no es válida"""
+    tz = tz or timezone.get_current_timezone()
+    try:
+        if '-' in key:
+            year, month = (int(part) for part in key.split('-'))
+            return _month_period(tz, year, month) if 1 <= month <= 12 else None
+        return _year_period(tz, int(key))
+    except ValueError:
+        return None
@@ -0,0 +1,157 @@
+"""
+Proyección del gasto de cada presupuesto al final de su período.
+
+    proyección = gastado + ritmo diario * días restantes + pagos programados
+
+El ritmo diario no incluye los pagos recurrentes ya cobrados en el período:
+un recibo grande a principio de mes no es gasto que se repita cada día.
+Esos cargos cuentan una sola vez, como los programados.
+
+El gasto del período sale de ``BudgetPeriod`` (ya mantenido por las señales).
+Se procesan bloques de presupuestos de todos los usuarios a la vez: una
+consulta trae los presupuestos con su período vigente, otra los pagos
+recurrentes de esas categorías y otra los cargos recurrentes ya cobrados;
+las ocurrencias pendientes y la extrapolación se calculan con NumPy para
+todo el bloque.
+"""
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from django.utils import timezone
+
+from .budgets import spend_amount
+from .categories import category_registry
+from .forecast import expand_occurrences
+from .models import Alert, RecurringPayment, Transaction
+from .money import money_cents, to_cents
+from .periods import budget_period
+
+MIN_ELAPSED_DAYS = 3  # Antes no hay un ritmo fiable: solo cuentan los pagos programados
+SECONDS_PER_DAY = 86400
+
+
+def project(spent, elapsed_days, remaining_days, scheduled, posted=0):
+    """
+    Gasto previsto al cierre del período (arrays en céntimos y días).
+    ``posted`` es la parte de ``spent`` que vino de pagos recurrentes: no se extrapola.
+    """
+    variable = spent - posted
+    rate = np.where(elapsed_days >= MIN_ELAPSED_DAYS, variable / np.maximum(elapsed_days, 1), 0)
+    return spent + rate * remaining_days + scheduled
+
+
+def posted_payments(budget_keys, period_starts, charges):
+    """
+    Céntimos ya cobrados por pagos recurrentes en el período de cada
+    presupuesto. ``charges`` son filas (usuario, categoría, fecha, céntimos).
+    """
+    position = {key: i for i, key in enumerate(budget_keys)}
+    charges = [row for row in charges if (row[0], row[1]) in position]
+    if not charges:
+        return np.zeros(len(budget_keys), dtype=np.int64)
+
+    budget = np.array([position[row[0], row[1]] for row in charges], dtype=np.int64)
+    in_period = np.array([row[2] >= period_starts[i] for row, i in zip(charges, budget)])
+    cents = np.array([row[3] for row in charges], dtype=np.int64)
+    return np.bincount(budget[in_period], weights=cents[in_period], minlength=len(budget_keys)).astype(np.int64)
+
+
+def scheduled_payments(budget_keys, period_ends, payments, today):
+    """
+    Céntimos de pagos recurrentes pendientes hasta el fin del período de cada
+    presupuesto. ``budget_keys`` son pares (usuario, categoría) y ``payments``
+    filas (usuario, categoría, próxima fecha, frecuencia, fin, céntimos,
+    fecha de inicio).
+    """
+    position = {key: i for i, key in enumerate(budget_keys)}
+    payments = [row for row in payments if (row[0], row[1]) in position]
+    if not payments:
+        return np.zeros(len(budget_keys), dtype=np.int64)
+
+    budget = np.array([position[row[0], row[1]] for row in payments], dtype=np.int64)
+    last_days = np.asarray(period_ends, dtype='datetime64[D]')[budget]
+    end_dates = np.array([row[4] or 'NaT' for row in payments], dtype='datetime64[D]')
+    end_dates = np.where(np.isnat(end_dates), last_days, np.minimum(end_dates, last_days))
+    cents = np.array([row[5] for row in payments], dtype=np.int64)
+
+    # Las "cantidades" expandidas son el índice del pago: así se sabe a qué presupuesto va cada ocurrencia
+    _, items = expand_occurrences(
+        [row[2] for row in payments], [row[3] for row in payments], end_dates,
+        np.arange(len(payments)), [row[6] for row in payments], start=today, end=last_days.max()
+    )
+    return np.bincount(budget[items], weights=cents[items], minlength=len(budget_keys)).astype(np.int64)
+
+
+def forecast_alerts(budgets, now=None):
+    """
+    Alertas (sin guardar) de los presupuestos cuyo gasto previsto supera el
+    límite del período. ``budgets`` es un queryset de ``Budget``.
+    """
+    now = now or timezone.now()
+    rows = list(budgets.with_current_period(now).values_list(
+        'pk', 'user_id', 'category_id', 'frequency', 'user__profile__timezone', 'user__profile__currency',
+        money_cents('current_spent'),
+        money_cents('current_amount'),
+        'current_state'
+    ))
+    if not rows:
+        return []
+
+    periods = [budget_period(row[3], now, ZoneInfo(row[4])) for row in rows]
+    spent = np.array([row[6] for row in rows], dtype=float)
+    limits = np.array([row[7] for row in rows], dtype=float)
+    elapsed = np.array([(now - period.start).total_seconds() for period in periods]) / SECONDS_PER_DAY
+    remaining = np.array([(period.end - now).total_seconds() for period in periods]) / SECONDS_PER_DAY
+    # Último día de cada período en la zona del usuario (end es exclusivo)
+    last_days = [period.end.date() - timedelta(days=1) for period in periods]
+
+    budget_keys = [(row[1], row[2]) for row in rows]
+    payments = RecurringPayment.objects.filter(
+        is_active=True,
+        user_id__in={row[1] for row in rows},
+        category_id__in={row[2] for row in rows}
+    ).values_list('user_id', 'category_id', 'next_due_date', 'frequency', 'end_date',
+                  money_cents('amount'), 'start_date')
+    scheduled = scheduled_payments(budget_keys, last_days, list(payments), timezone.localdate(now))
+
+    # En la divisa del perfil, con el mismo importe que sumaron al período del presupuesto
+    currencies = {row[1]: row[5] for row in rows}
+    charges = [
+        (charge['user_id'], charge['category_id'], charge['date'],
+         to_cents(spend_amount(charge, currencies[charge['user_id']])))
+        for charge in Transaction.objects.filter(
+            recurring_payment__isnull=False,
+            is_expense=True,
+            user_id__in=currencies,
+            category_id__in={row[2] for row in rows},
+            date__gte=min(period.start for period in periods),
+            date__lte=now
+        ).values('user_id', 'category_id', 'date', 'amount', 'currency', 'profile_amount', 'profile_currency')
+    ]
+    posted = posted_payments(budget_keys, [period.start for period in periods], charges)
+
+    projected = project(spent, elapsed, remaining, scheduled, posted)
+    # Los presupuestos ya traspasados tienen su propia alerta
+    flagged = (projected > limits) & (spent <= limits) & (np.array([row[8] for row in rows]) != 'overlimit')
+
+    alerts = []
+    for i in np.flatnonzero(flagged):
+        budget_id, user_id, category_id, _, _, currency = rows[i][:6]
+        period = periods[i]
+        category = category_registry.get(category_id)
+        alerts.append(Alert(
+            user_id=user_id,
+            dedup_key=Alert.build_dedup_key('budget_forecast', budget_id, period.key),
+            alert_type='budget',
+            title=f"Previsión: superarás el presupuesto de {category.name}",
+            message=(
+                f"Al ritmo actual gastarás unos {projected[i] / 100:.2f}{currency} "
+                f"{period.description} (incluidos {scheduled[i] / 100:.2f}{currency} en pagos programados), "
+                f"por encima del límite de {limits[i] / 100:.2f}{currency}."
+            ),
+            budget_id=budget_id,
+            period_start=period.start,
+            period_end=period.end,
+        ))
+    return alerts
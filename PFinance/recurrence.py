@@ -0,0 +1,98 @@
+"""
+Motor de recurrencias compartido por pagos e ingresos recurrentes, los
+comandos de procesamiento y la previsión de flujo de caja.
+
+Las fechas mensuales y anuales conservan el día del mes y se recortan al
+último día cuando el mes es más corto (31/01 -> 29/02 -> 31/03; 29/02 de un
+año bisiesto -> 28/02 del siguiente).
+
+``next_occurrence`` y ``nth_occurrence`` se memorizan: muchos pagos e
+ingresos comparten fecha, frecuencia y anclaje, y los argumentos son
+inmutables.
+"""
+import calendar
+from datetime import timedelta
+from functools import lru_cache
+
+
+# Paso entre ocurrencias por frecuencia: (meses, días)
+FREQUENCY_STEPS = {
+    'daily': (0, 1),
+    'weekly': (0, 7),
+    'monthly': (1, 0),
+    'yearly': (12, 0),
+}
+
+
+def days_in_month(year, month):
+    """Número de días de un mes"""
+    return calendar.monthrange(year, month)[1]
+
+
+def add_months(source_date, months, day=None):
+    """
+    Suma meses a una fecha conservando el día (o ``day`` si se indica),
+    limitado al último día válido del mes de destino.
+    """
+    year, month = divmod(source_date.year * 12 + source_date.month - 1 + months, 12)
+    month += 1
+    day = day or source_date.day
+    return source_date.replace(year=year, month=month, day=min(day, days_in_month(year, month)))
+
+
+def step(frequency, interval=1):
+    """Paso (meses, días) para una frecuencia repetida ``interval`` veces"""
+    try:
+        months, days = FREQUENCY_STEPS[frequency]
+    except KeyError:
+        raise ValueError(f"Frecuencia no soportada: {frequency}")
+    if interval < 1:
+        raise ValueError("El intervalo debe ser un entero positivo")
+    return months * interval, days * interval
+
+
+@lru_cache(maxsize=8192)
+def nth_occurrence(anchor, frequency, n, interval=1):
+    """
+    Ocurrencia ``n`` contando desde ``anchor`` (n=0 es el propio anclaje).
+    Se calcula siempre desde el anclaje, por lo que el día no se degrada
+    tras pasar por meses cortos.
+    """
+    months, days = step(frequency, interval)
+    if months:
+        return add_months(anchor, months * n)
+    return anchor + timedelta(days=days * n)
+
+
+def preserved_day(anchor, current):
+    """
+    Día del mes a conservar al avanzar ``current``: el del anclaje si
+    ``current`` quedó recortado a fin de mes (p. ej. 28/02 con anclaje 31/01).
+    """
+    if anchor and anchor.day > current.day == days_in_month(current.year, current.month):
+        return anchor.day
+    return current.day
+
+
+@lru_cache(maxsize=8192)
+def next_occurrence(current, frequency, interval=1, anchor=None):
+    """Siguiente fecha tras ``current``; ``anchor`` recupera días recortados"""
+    months, days = step(frequency, interval)
+    if months:
+        return add_months(current, months, day=preserved_day(anchor, current))
+    return current + timedelta(days=days)
+
+
+def occurrences(anchor, frequency, interval=1, start=None, end=None):
+    """
+    Iterador perezoso de ocurrencias desde ``anchor``, opcionalmente
+    limitado a ``[start, end]``. Sin ``end`` es infinito.
+    """
+    n = 0
+    while True:
+        current = nth_occurrence(anchor, frequency, n, interval)
+        if end is not None and current > end:
+            return
+        if start is None or current >= start:
+            yield current
+        n += 1
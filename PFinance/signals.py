@@ -1,111 +1,125 @@
-from django.db.models import Sum
-from django.db.models.signals import post_save, post_delete
+import threading
+from contextlib import contextmanager
+from zoneinfo import ZoneInfo
+
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.contrib.auth.models import User
 from django.dispatch import receiver
 from django.utils import timezone
 
-from .models import Transaction, Budget, RecurringPayment, Alert, Goal, RecurringIncome
-from datetime import timedelta
-from decimal import Decimal
+from .analytics import analytics_cache
+from .budgets import (
+    active_budget, apply_spend, apply_spend_deltas, budget_index, budgets_cache, collect_spend, spend_amount,
+    sync_budget_alert,
+)
+from .cache import UserCache, alerts_cache
+from .categories import category_registry
+from .models import Transaction, Budget, RecurringPayment, Alert, Goal, RecurringIncome, Category, UserProfile, ChangeLog
+from .periods import budget_period
+
+_suppressed = threading.local()
 
 
+@contextmanager
+def coalesced_signals():
+    """
+    Desactiva en este hilo las señales de transacciones (presupuestos,
+    analítica y registro de cambios): quien borra o edita en bloque aplica
+    esos efectos una sola vez al terminar (ver bulk.py).
+    """
+    previous = getattr(_suppressed, 'active', False)
+    _suppressed.active = True
+    try:
+        yield
+    finally:
+        _suppressed.active = previous
+
+
+def signals_suppressed():
+    return getattr(_suppressed, 'active', False)
+
+
+def _record_budget_spend(instance, delta_sign):
+    """
+    Aplica el importe de la transacción (convertido a la divisa del perfil)
+    al período de su presupuesto. Devuelve None si la categoría no tiene
+    presupuesto activo, sin consultar la base de datos.
+    """
+    if not instance.is_expense:
+        return None
+
+    # Índice cacheado: un gasto sin presupuesto activo no consulta la base de datos
+    index = budget_index(instance.user_id)
+    budget = active_budget(index, instance.category_id)
+    if budget is None:
+        return None
+
+    # Período del presupuesto (mensual/anual) que contiene la transacción, en la zona
+    # horaria del usuario: la señal también se dispara desde tareas sin petición
+    period = budget_period(budget.frequency, instance.date, ZoneInfo(index['timezone']))
+    values = {field: getattr(instance, field) for field in Transaction.SPEND_FIELDS}
+    delta = delta_sign * spend_amount(values, index['currency'])
+    row, previous_state = apply_spend(index, budget, period, delta)
+    return index, budget, period, row, previous_state
+
 
 # Alertas para presupuestos cuando se guarda una transaccion
 @receiver(post_save, sender=Transaction)
 def create_budget_alert(sender, instance, created, **kwargs):
     """
-    Crea alertas considerando el período del presupuesto (mensual/anual)
-    y vincula las transacciones correspondientes.
+    Suma el gasto al período del presupuesto y crea la alerta al pasar del 90 %;
+    la alerta guarda el presupuesto y el período, no cada transacción.
     """
-    notifications = instance.user.profile.notification_app
-
-    if not created or not instance.is_expense:
+    if not created or signals_suppressed():
         return
 
-    try:
-        budget = Budget.objects.select_related('user__profile').get(
-            user=instance.user,
-            category=instance.category,
-            is_active=True
-        )
-    except Budget.DoesNotExist:
-        return
+    result = _record_budget_spend(instance, 1)
+    if result is not None:
+        sync_budget_alert(*result)
 
-    # Determinamos el rango de fechas según la frecuencia del presupuesto
-    now = timezone.now()
-    if budget.frequency == 'yearly':
-        # Presupuesto anual: consideramos el año completo
-        date_filter = {
-            'date__year': now.year
-        }
-        period_description = f"del año {now.year}"
-    else:
-        # Presupuesto mensual (default)
-        date_filter = {
-            'date__year': now.year,
-            'date__month': now.month
-        }
-        period_description = f"del mes {now.month}/{now.year}"
-
-    # Calculamos el total gastado en el período correspondiente
-    transactions = Transaction.objects.filter(
-        user=instance.user,
-        category=instance.category,
-        is_expense=True,
-        **date_filter
-    )
 
-    spent = transactions.aggregate(total=Sum('amount'))['total'] or Decimal('0')
-    threshold = budget.amount * Decimal('0.9')
+# Valores previos de una transacción editada, para aplicar solo la diferencia
+@receiver(pre_save, sender=Transaction)
+def snapshot_transaction_spend(sender, instance, raw=False, **kwargs):
+    if instance._state.adding or raw or signals_suppressed():
+        return
+    # Leídos con la instancia (from_db); si no, una consulta por clave primaria
+    instance._spend_snapshot = instance.__dict__.get('_loaded_spend') or Transaction.objects.filter(
+        pk=instance.pk
+    ).values(*Transaction.SPEND_FIELDS).first()
+
 
-    # Verificamos si supera el 90% del presupuesto
-    if spent < threshold:
+# Presupuestos y alertas al editar una transacción
+@receiver(post_save, sender=Transaction)
+def update_budget_on_transaction_edit(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Resta lo que sumaba la transacción y suma lo que suma ahora: un solo
+    ajuste si sigue en el mismo período, o uno en cada período si cambió de
+    categoría o de fecha. No se vuelve a agregar ningún período.
+    """
+    previous = instance.__dict__.pop('_spend_snapshot', None)
+    if created or previous is None:
         return
 
-    # Verificamos si supera el 100% del presupuesto
-    if spent > budget.amount:
-        if notifications:
-            alert, created = Alert.objects.get_or_create(
-                user=instance.user,
-                alert_type='budget',
-                title=f"Presupuesto traspasa el límite: {budget.category.name}",
-                defaults={
-                    'message': (
-                        f"Has gastado {spent:.2f}{budget.user.profile.currency} "
-                        f"({(spent / budget.amount) * 100:.1f}%) "
-                        f"del presupuesto {period_description}"
-                    )
-                }
-            )
-        budget.state = 'overlimit'
-        budget.save()
-    else:
-        # Buscamos o creamos la alerta
-        if notifications:
-            alert, created = Alert.objects.get_or_create(
-                user=instance.user,
-                alert_type='budget',
-                title=f"Presupuesto al límite: {budget.category.name}",
-                defaults={
-                    'message': (
-                        f"Has gastado {spent:.2f}{budget.user.profile.currency} "
-                        f"({(spent / budget.amount) * 100:.1f}%) "
-                        f"del presupuesto {period_description}"
-                    )
-                }
-            )
-        budget.state = 'limit'
-        budget.save()
+    # Con update_fields, los campos no guardados conservan el valor de la base de datos
+    saved = {
+        field.attname for field in sender._meta.concrete_fields
+        if update_fields is None or {field.name, field.attname} & set(update_fields)
+    }
+    current = {
+        field: getattr(instance, field) if field in saved else previous[field]
+        for field in Transaction.SPEND_FIELDS
+    }
+    instance._loaded_spend = current
+    if current == previous:
+        return
 
-    # Vinculamos TODAS las transacciones del período
-    if notifications:
-        if created:
-            alert.transactions.set(transactions)
-        else:
-            # Actualizamos transacciones si la alerta ya existía
-            current_transactions = set(alert.transactions.all())
-            new_transactions = set(transactions) - current_transactions
-            if new_transactions:
-                alert.transactions.add(*new_transactions)
+    index = budget_index(instance.user_id)
+    deltas = {}
+    collect_spend(index, [previous], -1, deltas)
+    collect_spend(index, [current], 1, deltas)
+    apply_spend_deltas(index, deltas)
 
 
 # Alertas para pagos recurrentes
@@ -113,13 +127,13 @@ def create_budget_alert(sender, instance, created, **kwargs):
 def check_recurring_payment_alerts(sender, instance, **kwargs):
     notifications = instance.user.profile.notification_app
     if notifications:
-        if instance.next_due_date <= timezone.now().date() + timedelta(days=instance.reminder_days):
-            Alert.objects.get_or_create(
+        if instance.reminder_date <= timezone.now().date():
+            Alert.upsert(
                 user=instance.user,
-                title=f"Pago próximo: {instance.name}",
-                message=f"Se cobrarán {instance.amount:.2f} {instance.user.profile.currency} el {instance.next_due_date.strftime('%d/%m/%Y')}",
+                dedup_key=Alert.build_dedup_key('payment', instance.pk, instance.next_due_date.isoformat()),
                 alert_type='payment',
-                defaults={'read': False}
+                title=f"Pago próximo: {instance.name}",
+                message=f"Se cobrarán {instance.amount:.2f} {instance.user.profile.currency} el {instance.next_due_date.strftime('%d/%m/%Y')}"
             )
 
 
@@ -129,97 +143,37 @@ def check_goal_completion(sender, instance, created, **kwargs):
     """
     Signal que verifica si se alcanzó el objetivo y crea una alerta.
     """
-    notifications = instance.user.profile.notification_app
+    if not created:  # Solo para actualizaciones (no creación inicial)
+        if instance.current_amount >= instance.target_amount and instance.status == 'completed':
+            # La clave de la alerta evita duplicados aunque la meta se guarde varias veces
+            instance.notify_completion()
 
-    if notifications:
-        if not created:  # Solo para actualizaciones (no creación inicial)
-            if instance.current_amount >= instance.target_amount and instance.status == 'completed':
-                # Verificar si ya existe una alerta para evitar duplicados
-                existing_alert = Alert.objects.filter(
-                    user=instance.user,
-                    alert_type='goal',
-                    title=f"Meta alcanzada: {instance.subject}"
-                ).exists()
-
-                if not existing_alert:
-                    Alert.objects.create(
-                        user=instance.user,
-                        title=f"Meta alcanzada: {instance.subject}",
-                        message=f"¡Felicidades! Has alcanzado tu meta de {instance.target_amount} {instance.user.profile.currency} para '{instance.subject}'.",
-                        alert_type='goal'
-                    )
+
+# El total apartado en metas del perfil deja de contar la meta borrada
+@receiver(post_delete, sender=Goal)
+def release_goal_savings(sender, instance, **kwargs):
+    UserProfile.objects.filter(user_id=instance.user_id).update(
+        goals_saved=F('goals_saved') - instance.current_amount
+    )
 
 
 # Modificación de estado de presupuesto y borrado de alerta al borrar una transacción
 @receiver(post_delete, sender=Transaction)
 def update_budget_on_transaction_delete(sender, instance, **kwargs):
     """
-    Actualiza el estado del presupuesto cuando se borra una transacción,
-    revirtiendo los cambios si ya no se cumplen las condiciones.
+    Resta el gasto del período del presupuesto y actualiza o elimina su
+    alerta si ya no se cumplen las condiciones.
     """
-    if not instance.is_expense:
+    # Borrado en cascada (p. ej. del usuario): sus presupuestos también desaparecen
+    origin = kwargs.get('origin')
+    if not isinstance(origin, Transaction) and getattr(origin, 'model', None) is not Transaction:
         return
-
-    try:
-        budget = Budget.objects.select_related('user__profile').get(
-            user=instance.user,
-            category=instance.category,
-            is_active=True
-        )
-    except Budget.DoesNotExist:
+    if signals_suppressed():
         return
 
-    # Determinamos el rango de fechas según la frecuencia del presupuesto
-    now = timezone.now()
-    if budget.frequency == 'yearly':
-        date_filter = {
-            'date__year': now.year
-        }
-    else:
-        date_filter = {
-            'date__year': now.year,
-            'date__month': now.month
-        }
-
-    # Obtenemos transacciones actuales del período
-    transactions = Transaction.objects.filter(
-        user=instance.user,
-        category=instance.category,
-        is_expense=True,
-        **date_filter
-    )
-
-    # Calculamos el nuevo total gastado
-    spent = transactions.aggregate(total=Sum('amount'))['total'] or Decimal('0')
-    threshold = budget.amount * Decimal('0.9')
-
-    # Buscamos alertas existentes para este presupuesto
-    alert = Alert.objects.filter(
-        user=instance.user,
-        alert_type='budget',
-        title__contains=budget.category.name
-    ).first()
-
-    # Lógica para actualizar el estado del presupuesto
-    if spent > budget.amount:
-        # Mantenemos estado overlimit si aún se supera el 100%
-        budget.state = 'overlimit'
-        if alert and 'traspasa' not in alert.title:
-            alert.title = f"Presupuesto traspasa el límite: {budget.category.name}"
-            alert.save()
-    elif spent > threshold:
-        # Si está entre 90-100%, cambiamos a limit (si estaba en overlimit)
-        budget.state = 'limit'
-        if alert and 'traspasa' in alert.title:
-            alert.delete()
-    else:
-        # Si está por debajo del 90%, volvemos a ok
-        budget.state = 'ok'
-        # Eliminamos la alerta si ya no es necesaria
-        if alert:
-            alert.delete()
-
-    budget.save()
+    result = _record_budget_spend(instance, -1)
+    if result is not None:
+        sync_budget_alert(*result)
 
 
 # Alertas para ingresos recurrentes
@@ -227,12 +181,71 @@ def update_budget_on_transaction_delete(sender, instance, **kwargs):
 def check_recurring_income_alerts(sender, instance, **kwargs):
     notifications = instance.user.profile.notification_app
     if notifications:
-        if instance.next_income_date <= timezone.now().date() + timedelta(days=3):
-            Alert.objects.get_or_create(
+        if instance.reminder_date <= timezone.now().date():
+            Alert.upsert(
                 user=instance.user,
-                title=f"Ingreso próximo: {instance.name}",
-                message=f"Se cobrarán {instance.amount:.2f} {instance.user.profile.currency} el {instance.next_income_date.strftime('%d/%m/%Y')}",
+                dedup_key=Alert.build_dedup_key('income', instance.pk, instance.next_income_date.isoformat()),
                 alert_type='payment',
-                defaults={'read': False}
+                title=f"Ingreso próximo: {instance.name}",
+                message=f"Se cobrarán {instance.amount:.2f} {instance.user.profile.currency} el {instance.next_income_date.strftime('%d/%m/%Y')}"
             )
 
+
+# Invalidación de la caché de alertas (contador y últimas alertas del header)
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=Alert)
+def invalidate_alerts_cache(sender, instance, **kwargs):
+    alerts_cache.invalidate(instance.user_id)
+
+
+# La instantánea de analítica del dashboard se reconstruye con el siguiente acceso
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def invalidate_analytics_cache(sender, instance, **kwargs):
+    if signals_suppressed():
+        return
+    analytics_cache.invalidate(instance.user_id)
+
+
+# El índice de presupuestos de las señales depende de los presupuestos y del perfil
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+@receiver(post_save, sender=UserProfile)
+def invalidate_budget_index(sender, instance, **kwargs):
+    budgets_cache.invalidate(instance.user_id)
+
+
+# Un usuario nuevo nunca debe leer entradas de otro que tuviera su mismo id
+@receiver(post_save, sender=User)
+def invalidate_new_user_cache(sender, instance, created, **kwargs):
+    if created:
+        UserCache.invalidate_user(instance.pk)
+
+
+# Invalidación del registro de categorías en todos los procesos
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_registry(sender, **kwargs):
+    category_registry.invalidate()
+
+
+# Registro de cambios para la sincronización de los clientes (ver sync.py)
+def record_change(sender, instance, **kwargs):
+    if signals_suppressed() and sender is Transaction:
+        return
+    ChangeLog.record(sender, [(instance.pk, instance.user_id)])
+
+
+def record_deletion(sender, instance, **kwargs):
+    # Al borrar la cuenta no hay nada que sincronizar (y el registro se borra con ella)
+    origin = kwargs.get('origin')
+    if isinstance(origin, User) or getattr(origin, 'model', None) is User:
+        return
+    if signals_suppressed() and sender is Transaction:
+        return
+    ChangeLog.record(sender, [(instance.pk, instance.user_id)], deleted=True)
+
+
+for tracked in ChangeLog.TRACKED:
+    post_save.connect(record_change, sender=tracked, dispatch_uid=f'changelog_save_{tracked._meta.model_name}')
+    post_delete.connect(record_deletion, sender=tracked, dispatch_uid=f'changelog_delete_{tracked._meta.model_name}')
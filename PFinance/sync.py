@@ -0,0 +1,118 @@
+"""
+Sincronización incremental para clientes móviles u offline.
+
+Cada cambio de los modelos de ``ChangeLog.TRACKED`` deja una fila en
+``ChangeLog``: las señales cubren ``save()`` y ``delete()``, y los caminos
+en bloque (``update()``, ``bulk_create()``, ``bulk_update()``, borrados sin
+señales) lo registran explícitamente. El id de la fila es el número de
+secuencia que usa el cliente como cursor.
+
+``GET /sync/?since=<cursor>`` devuelve los cambios posteriores al cursor en
+lotes de como mucho ``BATCH_SIZE`` entradas, agrupados por modelo::
+
+    {"cursor": 1234, "more": false, "reset": false, "changes": {
+        "transaction": {"fields": ["id", "amount", ...], "upserts": [[7, "12.50", ...]], "deletes": [3]}
+    }}
+
+Varios cambios del mismo objeto dentro del lote se envían una sola vez, con
+su estado actual. El coste depende de los cambios desde el cursor (índice
+(usuario, id) del registro), no del tamaño del histórico.
+
+Sin cursor, o con uno anterior al horizonte de ``compact_changelog``, se
+devuelve una copia completa con ``reset: true``.
+
+El id de una entrada se asigna al insertarla, no al confirmar la transacción:
+una entrada con id menor puede hacerse visible después que otra con id mayor,
+y un cliente que ya avanzó el cursor se la saltaría. Por eso solo se sirven
+entradas con más de ``COMMIT_LAG`` de antigüedad y el cursor se detiene en la
+primera más reciente. Las transacciones que escriben en el registro deben
+durar menos que ese margen.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import ChangeLog, JobRun
+
+BATCH_SIZE = 500
+COMPACT_JOB = 'compact_changelog'
+# Margen para que confirmen las transacciones que siguen abiertas
+COMMIT_LAG = timedelta(seconds=30)
+
+MODELS = {model._meta.model_name: model for model in ChangeLog.TRACKED}
+
+
+def sync_fields(model):
+    """Columnas que recibe el cliente: todas salvo el usuario"""
+    return [field.attname for field in model._meta.concrete_fields if field.name not in ('id', 'user')]
+
+
+def sync_horizon():
+    """Cursor mínimo válido: los cambios anteriores ya se compactaron"""
+    return JobRun.last_watermark(COMPACT_JOB)
+
+
+def settled_before():
+    """Las entradas creadas antes de este instante ya están todas confirmadas"""
+    return timezone.now() - COMMIT_LAG
+
+
+def _rows(model, user_id, pks=None):
+    queryset = model.objects.filter(user_id=user_id)
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    return [list(row) for row in queryset.order_by('pk').values_list('pk', *sync_fields(model))]
+
+
+def snapshot(user_id):
+    """Copia completa de los datos del usuario y el cursor desde el que seguir"""
+    # El cursor se toma antes de leer y sin pasar de las entradas recientes:
+    # lo que cambie mientras tanto o siga sin confirmar se reenvía después
+    cursor = ChangeLog.objects.filter(created_at__lt=settled_before()).order_by('-pk').values_list('pk', flat=True).first() or 0
+    changes = {
+        name: {'fields': ['id', *sync_fields(model)], 'upserts': _rows(model, user_id), 'deletes': []}
+        for name, model in MODELS.items()
+    }
+    return {'cursor': cursor, 'more': False, 'reset': True, 'changes': changes}
+
+
+def changes_since(user_id, since=0, batch_size=BATCH_SIZE):
+    """Cambios del usuario posteriores a ``since``, como mucho ``batch_size`` entradas"""
+    if since <= 0 or since < sync_horizon():
+        return snapshot(user_id)
+
+    settled = settled_before()
+    entries = list(
+        ChangeLog.objects.filter(user_id=user_id, pk__gt=since).order_by('pk')
+        .values_list('pk', 'model', 'object_id', 'deleted', 'created_at')[:batch_size]
+    )
+    more = len(entries) == batch_size
+    # El lote acaba en la primera entrada reciente: por debajo de ella puede faltar alguna sin confirmar
+    for i, entry in enumerate(entries):
+        if entry[4] >= settled:
+            entries, more = entries[:i], False
+            break
+
+    # Solo cuenta el último cambio de cada objeto
+    latest = {}
+    for _, name, object_id, deleted, _ in entries:
+        latest[name, object_id] = deleted
+
+    changes = {}
+    for name, model in MODELS.items():
+        upserts = [object_id for (model_name, object_id), deleted in latest.items() if model_name == name and not deleted]
+        deletes = [object_id for (model_name, object_id), deleted in latest.items() if model_name == name and deleted]
+        if not upserts and not deletes:
+            continue
+        rows = _rows(model, user_id, upserts) if upserts else []
+        # Los que ya no existen se borraron después del lote: su lápida llegará, pero se adelanta
+        found = {row[0] for row in rows}
+        deletes += [object_id for object_id in upserts if object_id not in found]
+        changes[name] = {'fields': ['id', *sync_fields(model)], 'upserts': rows, 'deletes': sorted(deletes)}
+
+    return {
+        'cursor': entries[-1][0] if entries else since,
+        'more': more,
+        'reset': False,
+        'changes': changes,
+    }
@@ -11,4 +11,36 @@ def process_recurring_incomes():
     call_command('process_recurring_incomes')
 
 
+@shared_task
+def purge_old_alerts():
+    call_command('purge_alerts', archive=True)
+
+
+@shared_task
+def detect_anomalies():
+    call_command('detect_anomalies')
+
+
+@shared_task
+def open_budget_periods():
+    call_command('open_budget_periods')
+
+
+@shared_task
+def project_budgets():
+    call_command('project_budgets')
+
+
+@shared_task
+def create_transaction_partitions():
+    call_command('partition_transactions')
+
 
+@shared_task
+def archive_transactions():
+    call_command('archive_transactions')
+
+
+@shared_task
+def compact_changelog():
+    call_command('compact_changelog')
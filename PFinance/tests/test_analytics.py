@@ -0,0 +1,78 @@
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from ..analytics import TransactionSnapshot, day_number, load_snapshot, month_bounds
+from ..models import Category, Transaction, UserProfile
+from ..periods import last_months
+
+
+def snapshot(*rows):
+    """(día, céntimos, categoría, gasto) -> instantánea"""
+    days, cents, categories, is_expense = zip(*rows)
+    return TransactionSnapshot(
+        np.array(days, dtype=np.int64), np.array(cents, dtype=np.int64),
+        np.array(categories, dtype=np.int32), np.array(is_expense, dtype=bool)
+    )
+
+
+class TransactionSnapshotTest(SimpleTestCase):
+    def setUp(self):
+        self.snapshot = snapshot(
+            (100, 1000, 1, True),
+            (100, 500, 2, True),
+            (110, 250, 1, True),
+            (120, 9999, 1, False),
+            (130, 300, -1, True),
+        )
+
+    def test_bytes_roundtrip(self):
+        blob = self.snapshot.to_bytes()
+        self.assertEqual(len(blob), 8 + 21 * 5)
+        restored = TransactionSnapshot.from_bytes(blob)
+        self.assertEqual(restored.cents.tolist(), self.snapshot.cents.tolist())
+        self.assertEqual(restored.categories.tolist(), self.snapshot.categories.tolist())
+
+    def test_totals_by_category(self):
+        self.assertEqual(self.snapshot.totals_by_category(), {-1: 300, 1: 1250, 2: 500})
+        self.assertEqual(self.snapshot.totals_by_category(100, 110), {1: 1000, 2: 500})
+        self.assertEqual(self.snapshot.top_categories(2), [1, 2])
+
+    def test_totals_by_bucket(self):
+        bounds = [100, 110, 125, 140]
+        self.assertEqual(self.snapshot.totals_by_bucket(bounds, is_expense=True).tolist(), [1500, 250, 300])
+        self.assertEqual(self.snapshot.totals_by_bucket(bounds, is_expense=False).tolist(), [0, 9999, 0])
+        self.assertEqual(
+            self.snapshot.totals_by_bucket(bounds, is_expense=True, categories=[2, 1]).tolist(),
+            [[500, 0, 0], [1000, 250, 0]]
+        )
+
+
+class LoadSnapshotTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        UserProfile.objects.create(user=self.user, currency='EUR')
+        self.category = Category.objects.create(name="Comida", is_expense=True)
+        self.now = timezone.now()
+        Transaction.objects.create(user=self.user, amount=Decimal('12.34'), category=self.category, date=self.now)
+        Transaction.objects.create(user=self.user, amount=Decimal('100.00'), is_expense=False, date=self.now)
+
+    def test_build_matches_database(self):
+        data = load_snapshot(self.user)
+        self.assertEqual(sorted(data.cents.tolist()), [1234, 10000])
+        self.assertEqual(set(data.days.tolist()), {day_number(timezone.localdate(self.now))})
+        self.assertEqual(data.nbytes, 21 * 2)
+
+    def test_new_transaction_invalidates_snapshot(self):
+        load_snapshot(self.user)
+        Transaction.objects.create(user=self.user, amount=Decimal('1.00'), category=self.category, date=self.now)
+        self.assertEqual(len(load_snapshot(self.user)), 3)
+
+    def test_month_bounds(self):
+        periods = last_months(2, datetime(2024, 3, 15, tzinfo=timezone.get_current_timezone()))
+        bounds = month_bounds(periods)
+        self.assertEqual(np.diff(bounds).tolist(), [29, 31])
@@ -0,0 +1,99 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from ..anomalies import group_median_mad, monthly_expectations, transaction_scores
+from ..models import Alert, Category, JobRun, Transaction, UserProfile
+from ..periods import month_period
+
+
+class RobustStatisticsTest(SimpleTestCase):
+    def test_group_median_mad(self):
+        groups = np.array([1, 0, 1, 0, 1, 0])
+        values = np.array([10., 1., 30., 3., 20., 2.])
+        unique, medians, mads, counts = group_median_mad(groups, values)
+        self.assertEqual(unique.tolist(), [0, 1])
+        self.assertEqual(medians.tolist(), [2., 20.])
+        self.assertEqual(mads.tolist(), [1., 10.])
+        self.assertEqual(counts.tolist(), [3, 3])
+
+    def test_transaction_scores(self):
+        baseline = np.zeros(8, dtype=np.int64)
+        cents = np.array([1000, 1100, 900, 1000, 1050, 950, 1000, 1000], dtype=float)
+        scores, expected = transaction_scores(
+            baseline, cents, np.array([0, 0, 1]), np.array([1020., 9000., 5000.])
+        )
+        self.assertLess(scores[0], 3.5)
+        self.assertGreater(scores[1], 3.5)
+        self.assertTrue(np.isnan(scores[2]))  # Grupo sin histórico
+        self.assertEqual(expected[1], 1000)
+
+    def test_monthly_seasonality(self):
+        totals = np.full((2, 19), 10000.)
+        totals[:, 0] = 25000
+        # El segundo grupo gasta el triple cada año en este mes
+        totals[1, 12] = 30000
+        expected, threshold = monthly_expectations(totals)
+        self.assertGreater(totals[0, 0], threshold[0])
+        self.assertEqual(expected[1], 20000)  # Factor estacional limitado a x2
+        self.assertLess(totals[1, 0], threshold[1])
+
+
+class DetectAnomaliesCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        UserProfile.objects.create(user=self.user, currency='EUR')
+        self.category = Category.objects.create(name="Supermercado", is_expense=True)
+        now = timezone.now()
+        for days in range(10, 100, 10):
+            Transaction.objects.create(
+                user=self.user, amount=Decimal('40.00'), category=self.category, date=now - timedelta(days=days)
+            )
+        # Las transacciones anteriores ya se analizaron
+        JobRun.objects.create(
+            job='detect_anomalies', run_date=now.date() - timedelta(days=1), status='completed',
+            watermark=Transaction.objects.order_by('-pk').first().pk
+        )
+
+    def test_flags_unusual_transaction_once(self):
+        Transaction.objects.create(user=self.user, amount=Decimal('400.00'), category=self.category)
+        Transaction.objects.create(user=self.user, amount=Decimal('41.00'), category=self.category)
+
+        call_command('detect_anomalies', stdout=StringIO())
+        alerts = Alert.objects.filter(user=self.user, alert_type='system', title__startswith="Gasto inusual")
+        self.assertEqual(alerts.count(), 1)
+        self.assertIn("400.00 EUR", alerts.get().message)
+
+        # La siguiente ejecución parte de la nueva marca de agua y no repite alertas
+        call_command('detect_anomalies', stdout=StringIO())
+        self.assertEqual(alerts.count(), 1)
+        last = JobRun.objects.filter(job='detect_anomalies').first()
+        self.assertEqual(last.status, 'completed')
+        self.assertEqual(last.processed, 0)
+
+    def test_normal_spending_raises_nothing(self):
+        Transaction.objects.create(user=self.user, amount=Decimal('38.00'), category=self.category)
+        call_command('detect_anomalies', stdout=StringIO())
+        self.assertFalse(Alert.objects.filter(alert_type='system').exists())
+
+    def test_monthly_anomaly_per_currency(self):
+        Transaction.objects.all().delete()
+        for months in range(1, 9):
+            day = month_period(offset=-months).start + timedelta(days=14)
+            for currency in ('EUR', 'USD'):
+                Transaction.objects.create(
+                    user=self.user, amount=Decimal('40.00'), currency=currency, category=self.category, date=day
+                )
+        JobRun.objects.update(watermark=Transaction.objects.order_by('-pk').first().pk)
+        for currency in ('EUR', 'USD'):
+            Transaction.objects.create(user=self.user, amount=Decimal('400.00'), currency=currency, category=self.category)
+
+        call_command('detect_anomalies', stdout=StringIO())
+        monthly = Alert.objects.filter(user=self.user, title__startswith="Gasto mensual inusual")
+        self.assertEqual(monthly.count(), 2)
@@ -0,0 +1,85 @@
+from datetime import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..archive import CUTOFF_KEY, archive_cutoff, archived_range_total, needs_archive
+from ..forecast import current_balance
+from ..models import ArchivedTransaction, Budget, Category, Transaction, TransactionSummary, UserProfile
+
+
+class ArchiveTransactionsTest(TestCase):
+    def setUp(self):
+        cache.delete(CUTOFF_KEY)
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        UserProfile.objects.create(user=self.user, currency='EUR')
+        self.category = Category.objects.create(name="Supermercado", is_expense=True)
+        self.salary = Category.objects.create(name="Nómina", is_expense=False)
+        self.budget = Budget.objects.create(
+            user=self.user, category=self.category, amount=Decimal('500.00'), frequency='monthly'
+        )
+
+        self.old_year = timezone.localdate().year - 5
+        for month, amount in ((3, '40.00'), (9, '60.00')):
+            Transaction.objects.create(
+                user=self.user, amount=Decimal(amount), category=self.category,
+                date=self.moment(self.old_year, month)
+            )
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('1000.00'), category=self.salary, is_expense=False,
+            date=self.moment(self.old_year, 6)
+        )
+        Transaction.objects.create(user=self.user, amount=Decimal('25.00'), category=self.category)
+
+    def tearDown(self):
+        # El corte se cachea sin caducidad y la base de datos vuelve atrás tras cada test
+        cache.delete(CUTOFF_KEY)
+
+    def moment(self, year, month, day=15):
+        return timezone.make_aware(datetime(year, month, day, 12), timezone.get_default_timezone())
+
+    def test_moves_old_transactions_and_keeps_totals(self):
+        balance = current_balance(self.user)
+        spent = self.budget.spent_amount()
+        self.assertFalse(needs_archive())
+
+        call_command('archive_transactions', years=3, stdout=StringIO())
+
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(ArchivedTransaction.objects.filter(user=self.user).count(), 3)
+        summary = TransactionSummary.objects.get(user=self.user, year=self.old_year, category=self.category)
+        self.assertEqual((summary.total, summary.count), (Decimal('100.00'), 2))
+
+        self.assertEqual(archive_cutoff().year, self.old_year + 1)
+        self.assertTrue(needs_archive())
+        self.assertFalse(needs_archive(timezone.now()))
+        self.assertEqual(current_balance(self.user), balance)
+        self.assertEqual(self.budget.spent_amount(), spent)
+
+    def test_range_reads_archive_only_before_cutoff(self):
+        call_command('archive_transactions', years=3, stdout=StringIO())
+
+        total = archived_range_total(
+            self.user.pk, 'EUR', self.moment(self.old_year, 1, 1), self.moment(self.old_year, 6, 1),
+            category_id=self.category.pk
+        )
+        self.assertEqual(total, Decimal('40.00'))
+        with self.assertNumQueries(0):
+            archived_range_total(self.user.pk, 'EUR', timezone.now(), timezone.now())
+
+    def test_transaction_list_totals_include_archive(self):
+        call_command('archive_transactions', years=3, stdout=StringIO())
+        # Repetir no duplica filas ni resúmenes
+        call_command('archive_transactions', years=3, stdout=StringIO())
+
+        self.client.login(username='testuser', password='12345')
+        response = self.client.get(reverse('pfinance:transactions_list'))
+        self.assertEqual(response.context['total_expenses'], Decimal('125.00'))
+        self.assertEqual(response.context['total_income'], Decimal('1000.00'))
+        self.assertEqual(len(response.context['transactions']), 1)
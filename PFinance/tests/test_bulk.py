@@ -0,0 +1,183 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..bulk import bulk_delete, bulk_recategorize, bulk_update
+from ..models import Alert, Budget, BudgetPeriod, Category, ChangeLog, Transaction, UserProfile
+from ..periods import month_period
+
+
+class BulkOperationsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR', notification_app=True)
+        self.food = Category.objects.create(name="Comida", is_expense=True)
+        self.leisure = Category.objects.create(name="Ocio", is_expense=True)
+        self.food_budget = Budget.objects.create(
+            user=self.user, category=self.food, amount=Decimal('100.00'), frequency='monthly'
+        )
+        self.leisure_budget = Budget.objects.create(
+            user=self.user, category=self.leisure, amount=Decimal('100.00'), frequency='monthly'
+        )
+        self.current = month_period(tz=self.profile.tzinfo)
+        self.previous = month_period(tz=self.profile.tzinfo, offset=-1)
+
+    def add_expenses(self, count, amount='10.00', category=None):
+        return [
+            Transaction.objects.create(user=self.user, category=category or self.food, amount=Decimal(amount))
+            for _ in range(count)
+        ]
+
+    def spent(self, budget, period=None):
+        start = (period or self.current).start
+        return BudgetPeriod.objects.filter(budget=budget, start=start).values_list('spent', flat=True).first()
+
+    def test_delete_updates_period_alert_and_log(self):
+        expenses = self.add_expenses(3, '40.00')
+        self.assertTrue(Alert.objects.filter(user=self.user, alert_type='budget').exists())
+        other = User.objects.create_user(username='other', password='12345')
+        foreign = Transaction.objects.create(user=other, category=self.food, amount=Decimal('5.00'))
+
+        deleted = bulk_delete(self.user, [expenses[0].pk, expenses[1].pk, foreign.pk])
+
+        self.assertEqual(deleted, 2)
+        self.assertTrue(Transaction.objects.filter(pk=foreign.pk).exists())
+        self.assertEqual(self.spent(self.food_budget), Decimal('40.00'))
+        self.food_budget.refresh_from_db()
+        self.assertEqual(self.food_budget.state, 'ok')
+        self.assertFalse(Alert.objects.filter(user=self.user, alert_type='budget').exists())
+        self.assertEqual(
+            set(ChangeLog.objects.filter(model='transaction', deleted=True).values_list('object_id', flat=True)),
+            {expenses[0].pk, expenses[1].pk}
+        )
+
+    def test_recategorize_moves_spend_between_budgets(self):
+        expenses = self.add_expenses(4, '25.00')
+
+        bulk_recategorize(self.user, [expense.pk for expense in expenses[:3]], self.leisure)
+
+        self.assertEqual(self.spent(self.food_budget), Decimal('25.00'))
+        self.assertEqual(self.spent(self.leisure_budget), Decimal('75.00'))
+        self.assertEqual(Transaction.objects.filter(category=self.leisure).count(), 3)
+
+    def test_queries_do_not_grow_with_selection(self):
+        def count_queries(size):
+            pks = [expense.pk for expense in self.add_expenses(size, '1.00')]
+            with CaptureQueriesContext(connection) as queries:
+                bulk_recategorize(self.user, pks, self.leisure)
+            bulk_delete(self.user, pks)
+            return len(queries)
+
+        # Con los períodos ya abiertos, cada uno se ajusta una vez sea cual sea la selección
+        self.add_expenses(1, category=self.leisure)
+        count_queries(1)
+        self.assertEqual(count_queries(3), count_queries(30))
+
+    def test_edit_date_moves_spend_to_other_period(self):
+        expenses = self.add_expenses(2, '30.00')
+
+        bulk_update(self.user, [expenses[0].pk], date=self.previous.start, description="Movido")
+
+        self.assertEqual(self.spent(self.food_budget), Decimal('30.00'))
+        self.assertEqual(self.spent(self.food_budget, self.previous), Decimal('30.00'))
+        self.assertEqual(Transaction.objects.get(pk=expenses[0].pk).description, "Movido")
+
+    def test_edit_rejects_category_of_other_kind(self):
+        expenses = self.add_expenses(2, '30.00')
+        salary = Category.objects.create(name="Nómina", is_expense=False)
+        pks = [expense.pk for expense in expenses]
+
+        with self.assertRaises(ValueError):
+            bulk_update(self.user, pks, category=salary)
+        with self.assertRaises(ValueError):
+            bulk_update(self.user, pks, is_expense=False)
+        self.assertEqual(Transaction.objects.filter(category=self.food, is_expense=True).count(), 2)
+        self.assertEqual(self.spent(self.food_budget), Decimal('60.00'))
+
+        # Categoría y tipo a la vez: las filas salen del presupuesto de gastos
+        bulk_update(self.user, pks, category=salary, is_expense=False)
+        self.assertEqual(self.spent(self.food_budget), Decimal('0.00'))
+
+    def test_past_period_alert_is_not_resurfaced(self):
+        expense = Transaction.objects.create(
+            user=self.user, category=self.food, amount=Decimal('95.00'), date=self.previous.start
+        )
+        # Período cerrado: no se crea alerta nueva
+        self.assertFalse(Alert.objects.filter(alert_type='budget').exists())
+
+        key = Alert.build_dedup_key('budget', self.food_budget.pk, self.previous.key)
+        Alert.objects.create(user=self.user, dedup_key=key, alert_type='budget', title="Antigua", message="...", read=True)
+        extra = Transaction.objects.create(
+            user=self.user, category=self.food, amount=Decimal('10.00'), date=self.previous.start
+        )
+        alert = Alert.objects.get(dedup_key=key)
+        self.assertTrue(alert.read)
+        self.assertIn("traspasa", alert.title)
+
+        bulk_recategorize(self.user, [expense.pk, extra.pk], self.leisure)
+        self.assertFalse(Alert.objects.filter(alert_type='budget').exists())
+
+    def test_edit_rejects_unknown_fields(self):
+        with self.assertRaises(ValueError):
+            bulk_update(self.user, [1], amount=Decimal('1.00'))
+
+
+class TransactionBulkViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        UserProfile.objects.create(user=self.user, currency='EUR')
+        self.category = Category.objects.create(name="Comida", is_expense=True)
+        self.transactions = [
+            Transaction.objects.create(user=self.user, category=self.category, amount=Decimal('5.00'), date=timezone.now())
+            for _ in range(2)
+        ]
+        self.client.login(username='testuser', password='12345')
+
+    def test_bulk_delete_selected(self):
+        response = self.client.post(
+            reverse('pfinance:transactions_bulk_delete'), {'transaction_ids': [self.transactions[0].pk]}
+        )
+        self.assertRedirects(response, reverse('pfinance:transactions_list'))
+        self.assertEqual(list(Transaction.objects.values_list('pk', flat=True)), [self.transactions[1].pk])
+
+    def test_bulk_edit_requires_selection_and_changes(self):
+        self.client.post(reverse('pfinance:transactions_bulk_delete'), {})
+        self.client.post(reverse('pfinance:transactions_bulk_edit'), {'transaction_ids': [self.transactions[0].pk]})
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertFalse(Transaction.objects.exclude(description=None).exists())
+
+        self.client.post(
+            reverse('pfinance:transactions_bulk_edit'),
+            {'transaction_ids': [t.pk for t in self.transactions], 'description': "Mercado"}
+        )
+        self.assertEqual(Transaction.objects.filter(description="Mercado").count(), 2)
+
+    def test_bulk_recategorize_requires_matching_category(self):
+        url = reverse('pfinance:transactions_bulk_recategorize')
+        pks = [t.pk for t in self.transactions]
+        salary = Category.objects.create(name="Nómina", is_expense=False)
+        leisure = Category.objects.create(name="Ocio", is_expense=True)
+
+        self.client.post(url, {'transaction_ids': pks, 'category': ''})
+        self.client.post(url, {'transaction_ids': pks, 'category': salary.pk})
+        self.assertEqual(Transaction.objects.filter(category=self.category).count(), 2)
+
+        self.client.post(url, {'transaction_ids': pks, 'category': leisure.pk})
+        self.assertEqual(Transaction.objects.filter(category=leisure).count(), 2)
+
+    def test_bulk_edit_rejects_kind_mismatch(self):
+        url = reverse('pfinance:transactions_bulk_edit')
+        pks = [t.pk for t in self.transactions]
+        salary = Category.objects.create(name="Nómina", is_expense=False)
+
+        self.client.post(url, {'transaction_ids': pks, 'category': salary.pk})
+        self.client.post(url, {'transaction_ids': pks, 'is_expense': 'false'})
+        self.assertEqual(Transaction.objects.filter(category=self.category, is_expense=True).count(), 2)
+
+        self.client.post(url, {'transaction_ids': pks, 'category': salary.pk, 'is_expense': 'false'})
+        self.assertEqual(Transaction.objects.filter(category=salary, is_expense=False).count(), 2)
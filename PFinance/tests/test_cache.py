@@ -0,0 +1,105 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..cache import KEY_PREFIX, UserCache, alerts_cache, cache_stats, reset_cache_stats
+from ..categories import category_registry
+from ..forms import TransactionForm, BudgetForm
+from ..models import UserProfile, Alert, Category
+
+
+class UserCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_cache = UserCache('test', timeout=60)
+        self.calls = 0
+
+    def build(self):
+        self.calls += 1
+        return self.calls
+
+    def test_get_or_set_caches_value(self):
+        self.assertEqual(self.user_cache.get_or_set(1, self.build), 1)
+        self.assertEqual(self.user_cache.get_or_set(1, self.build), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_invalidate_changes_version(self):
+        self.user_cache.get_or_set(1, self.build)
+        old_key = self.user_cache.key(1)
+        self.user_cache.invalidate(1)
+        self.assertNotEqual(old_key, self.user_cache.key(1))
+        self.assertEqual(self.user_cache.get_or_set(1, self.build), 2)
+
+    def test_keys_are_per_user(self):
+        self.user_cache.get_or_set(1, self.build)
+        self.user_cache.get_or_set(2, self.build)
+        self.assertEqual(self.calls, 2)
+
+    def test_stats_count_hits_and_misses(self):
+        reset_cache_stats()
+        self.user_cache.get_or_set(1, self.build)
+        self.user_cache.get_or_set(1, self.build)
+        stats = cache_stats(['test'])
+        self.assertEqual(stats['namespaces']['test']['hits'], 1)
+        self.assertEqual(stats['namespaces']['test']['misses'], 1)
+
+    def test_stats_are_flushed_in_batches(self):
+        reset_cache_stats()
+        for _ in range(3):
+            self.user_cache.get_or_set(1, self.build)
+        # Los aciertos no escriben en la caché hasta el volcado
+        self.assertIsNone(cache.get(f"{KEY_PREFIX}:stats:test:hits"))
+
+        self.assertEqual(cache_stats(['test'])['namespaces']['test']['hits'], 2)
+        self.assertEqual(cache.get(f"{KEY_PREFIX}:stats:test:hits"), 2)
+
+
+class AlertsContextCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR')
+        self.client.login(username='testuser', password='12345')
+
+    def test_new_alert_invalidates_unread_count(self):
+        response = self.client.get(reverse('pfinance:alerts'))
+        self.assertEqual(response.context['unread_count'], 0)
+
+        Alert.objects.create(user=self.user, title='Aviso', message='Mensaje', alert_type='system')
+        response = self.client.get(reverse('pfinance:alerts'))
+        self.assertEqual(response.context['unread_count'], 1)
+
+    def test_cache_stats_requires_staff(self):
+        response = self.client.get(reverse('pfinance:cache_stats'))
+        self.assertEqual(response.status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('pfinance:cache_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(alerts_cache.namespace, response.json()['namespaces'])
+
+
+class CategoryRegistryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.expense = Category.objects.create(name='Comida', is_expense=True)
+        self.income = Category.objects.create(name='Salario', is_expense=False)
+
+    def test_partitions(self):
+        self.assertEqual(category_registry.expense(), (self.expense,))
+        self.assertEqual(category_registry.income(), (self.income,))
+        self.assertEqual(category_registry.get(self.income.pk), self.income)
+
+    def test_forms_render_without_queries(self):
+        category_registry.all()
+        with self.assertNumQueries(0):
+            TransactionForm(user=self.user).as_p()
+            BudgetForm(user=self.user).as_p()
+
+    def test_category_save_invalidates_registry(self):
+        category_registry.all()
+        Category.objects.create(name='Ocio', is_expense=True)
+        self.assertEqual(len(category_registry.expense()), 2)
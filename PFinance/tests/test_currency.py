@@ -0,0 +1,118 @@
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..currency import convert, converted_sum, rate_table
+from ..models import Budget, BudgetPeriod, Category, ExchangeRate, Transaction, UserProfile
+
+ECB_CSV = """Date,USD,JPY,BGN,GBP,
+2024-03-04,1.0850,162.50,1.9558,0.8560,
+2024-03-01,1.0800,162.00,1.9558,0.8550,
+2024-02-29,N/A,N/A,1.9558,N/A,
+"""
+
+
+class LoadExchangeRatesTest(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as file:
+            file.write(ECB_CSV)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_loads_supported_currencies(self):
+        call_command('load_exchange_rates', self.path, stdout=StringIO())
+        self.assertEqual(ExchangeRate.objects.count(), 6)  # BGN y N/A se ignoran
+        self.assertEqual(ExchangeRate.objects.get(currency='JPY', date=date(2024, 3, 4)).rate, Decimal('162.50'))
+
+        # Volver a cargar actualiza en lugar de duplicar
+        call_command('load_exchange_rates', self.path, stdout=StringIO())
+        self.assertEqual(ExchangeRate.objects.count(), 6)
+
+
+class ConversionTest(TestCase):
+    def setUp(self):
+        ExchangeRate.objects.bulk_create([
+            ExchangeRate(currency='USD', date=date(2024, 3, 1), rate=Decimal('1.10')),
+            ExchangeRate(currency='USD', date=date(2024, 3, 4), rate=Decimal('1.25')),
+            ExchangeRate(currency='GBP', date=date(2024, 3, 1), rate=Decimal('0.80')),
+        ])
+        rate_table.invalidate()
+
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR')
+        self.category = Category.objects.create(name="Viajes", is_expense=True)
+
+    def _transaction(self, amount, currency, day):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), category=self.category, currency=currency,
+            date=timezone.make_aware(datetime(*day, 12))
+        )
+
+    def test_python_conversion_uses_rate_of_the_day(self):
+        self.assertEqual(convert(Decimal('110'), 'USD', 'EUR', date(2024, 3, 2)), Decimal('100.00'))
+        self.assertEqual(convert(Decimal('125'), 'USD', 'EUR', date(2024, 3, 4)), Decimal('100.00'))
+        self.assertEqual(convert(Decimal('110'), 'USD', 'GBP', date(2024, 3, 1)), Decimal('80.00'))
+        # Sin tipo publicado se devuelve el importe original
+        self.assertEqual(convert(Decimal('10'), 'USD', 'EUR', date(2024, 1, 1)), Decimal('10'))
+
+    def test_sql_conversion(self):
+        self._transaction('100.00', 'EUR', (2024, 3, 2))
+        self._transaction('110.00', 'USD', (2024, 3, 2))
+        self._transaction('125.00', 'USD', (2024, 3, 5))
+        self._transaction('80.00', 'GBP', (2024, 3, 2))
+
+        totals = Transaction.objects.aggregate(
+            eur=converted_sum('EUR'), usd=converted_sum('USD'), raw=Sum('amount')
+        )
+        self.assertEqual(round(totals['eur'], 2), Decimal('400.00'))
+        self.assertEqual(round(totals['usd'], 2), Decimal('455.00'))
+        self.assertEqual(totals['raw'], Decimal('415.00'))
+
+    def test_currency_defaults_to_profile(self):
+        transaction = Transaction.objects.create(user=self.user, amount=Decimal('5.00'), category=self.category)
+        self.assertEqual(transaction.currency, 'EUR')
+
+    def test_budget_spent_is_converted(self):
+        budget = Budget.objects.create(user=self.user, category=self.category, amount=Decimal('1000.00'))
+        self._transaction('50.00', 'EUR', (2024, 3, 2))
+        self._transaction('110.00', 'USD', (2024, 3, 2))
+        self.assertEqual(round(budget.spent_amount(), 2), Decimal('150.00'))
+
+    def test_transaction_list_shows_converted_amount(self):
+        self._transaction('110.00', 'USD', (2024, 3, 2))
+        self.client.login(username='testuser', password='12345')
+        response = self.client.get(reverse('pfinance:transactions_list'))
+        self.assertContains(response, "≈ 100.00 EUR")
+        self.assertEqual(round(response.context['total_expenses'], 2), Decimal('100.00'))
+
+    def test_budget_spend_does_not_drift_when_rates_arrive_later(self):
+        budget = Budget.objects.create(user=self.user, category=self.category, amount=Decimal('1000.00'))
+        # Sin tipo publicado ese día: cuenta el importe original, y queda fijado en la fila
+        expense = self._transaction('10.00', 'JPY', (2024, 3, 2))
+        self.assertEqual((expense.profile_amount, expense.profile_currency), (Decimal('10.00'), 'EUR'))
+        period = BudgetPeriod.objects.get(budget=budget)
+        self.assertEqual(period.spent, Decimal('10.00'))
+
+        ExchangeRate.objects.create(currency='JPY', date=date(2024, 3, 1), rate=Decimal('160'))
+        rate_table.invalidate()
+        Transaction.objects.get(pk=expense.pk).delete()
+
+        period.refresh_from_db()
+        self.assertEqual(period.spent, Decimal('0.00'))
+
+    def test_aggregates_use_stored_profile_amount(self):
+        self._transaction('110.00', 'USD', (2024, 3, 2))
+        # Un tipo corregido después no cambia lo que ya se fijó
+        ExchangeRate.objects.filter(currency='USD', date=date(2024, 3, 1)).update(rate=Decimal('2.20'))
+        self.assertEqual(round(Transaction.objects.aggregate(total=converted_sum('EUR'))['total'], 2), Decimal('100.00'))
@@ -0,0 +1,122 @@
+import time
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from ..forecast import build_forecast, expand_occurrences, forecast_cash_flow
+from ..models import UserProfile, RecurringIncome, RecurringPayment
+from ..recurrence import next_occurrence
+
+
+def arrays(*items):
+    """(next_date, frequency, end_date, cents) -> tupla de arrays"""
+    next_dates, frequencies, end_dates, amounts = zip(*items)
+    return (
+        np.array(next_dates, dtype='datetime64[D]'),
+        np.array(frequencies),
+        np.array([d or 'NaT' for d in end_dates], dtype='datetime64[D]'),
+        np.array(amounts, dtype=np.int64),
+    )
+
+
+class ExpandOccurrencesTest(TestCase):
+    def test_monthly_clamps_to_month_end(self):
+        dates, amounts = expand_occurrences(
+            *arrays(('2024-01-31', 'monthly', None, 1000)), start='2024-01-01', end='2024-04-30'
+        )
+        self.assertEqual(
+            [str(d) for d in dates],
+            ['2024-01-31', '2024-02-29', '2024-03-31', '2024-04-30']
+        )
+        self.assertEqual(amounts.tolist(), [1000] * 4)
+
+    def test_yearly_and_end_date(self):
+        dates, _ = expand_occurrences(
+            *arrays(('2024-02-29', 'yearly', '2026-12-31', 500)), start='2024-01-01', end='2030-01-01'
+        )
+        self.assertEqual([str(d) for d in dates], ['2024-02-29', '2025-02-28', '2026-02-28'])
+
+    def test_monthly_recovers_start_day_like_the_engine(self):
+        # Empezó el 31/01: tras el 29/02 se cobra el 31/03, no el 29/03
+        dates, _ = expand_occurrences(
+            *arrays(('2024-02-29', 'monthly', None, 100)), np.array(['2024-01-31'], dtype='datetime64[D]'),
+            start='2024-02-01', end='2024-06-30'
+        )
+        self.assertEqual([str(d) for d in dates], ['2024-02-29', '2024-03-31', '2024-04-30', '2024-05-31', '2024-06-30'])
+
+        for next_date, start_date in ((date(2024, 2, 29), date(2024, 1, 30)), (date(2024, 4, 15), date(2024, 1, 31))):
+            expected, current = [], next_date
+            while current <= date(2025, 3, 31):
+                expected.append(str(current))
+                current = next_occurrence(current, 'monthly', anchor=start_date)
+            dates, _ = expand_occurrences(
+                *arrays((next_date, 'monthly', None, 100)), np.array([start_date], dtype='datetime64[D]'),
+                start=next_date, end='2025-03-31'
+            )
+            self.assertEqual([str(d) for d in dates], expected)
+
+    def test_overdue_occurrence_counts_today(self):
+        dates, _ = expand_occurrences(
+            *arrays(('2024-03-10', 'monthly', None, 100)), start='2024-03-15', end='2024-04-30'
+        )
+        self.assertEqual([str(d) for d in dates], ['2024-03-15', '2024-04-10'])
+
+
+class BuildForecastTest(TestCase):
+    def test_balance_curve(self):
+        incomes = arrays(('2024-01-05', 'monthly', None, 200000))
+        payments = arrays(('2024-01-10', 'monthly', None, 50000))
+        forecast = build_forecast(incomes, payments, 10000, '2024-01-01', 3)
+
+        self.assertEqual(forecast['monthly']['labels'], ['2024-01', '2024-02', '2024-03'])
+        self.assertEqual(forecast['monthly']['income'], [2000.0] * 3)
+        self.assertEqual(forecast['monthly']['balance'], [1600.0, 3100.0, 4600.0])
+        self.assertEqual(len(forecast['daily']['dates']), 31 + 29 + 31)
+
+    def test_thousands_of_items(self):
+        rng = np.random.default_rng(0)
+        n = 5000
+        next_dates = np.datetime64('2024-01-01') + rng.integers(0, 365, n).astype('timedelta64[D]')
+        frequencies = rng.choice(['monthly', 'yearly'], n)
+        end_dates = np.full(n, np.datetime64('NaT'), dtype='datetime64[D]')
+        amounts = rng.integers(100, 100000, n)
+
+        started = time.perf_counter()
+        forecast = build_forecast(
+            (next_dates, frequencies, end_dates, amounts), arrays(('2024-01-01', 'monthly', None, 0)),
+            0, '2024-01-01', 12
+        )
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(len(forecast['monthly']['labels']), 12)
+
+
+class ForecastViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR')
+        today = date.today()
+        RecurringIncome.objects.create(
+            user=self.user, name="Salario", amount=Decimal('1500.00'),
+            start_date=today, next_income_date=today, frequency='monthly'
+        )
+        RecurringPayment.objects.create(
+            user=self.user, name="Alquiler", amount=Decimal('600.00'),
+            start_date=today, next_due_date=today, frequency='monthly'
+        )
+
+    def test_forecast_cash_flow(self):
+        forecast = forecast_cash_flow(self.user, months=2)
+        self.assertEqual(forecast['monthly']['balance'][-1], 1800.0)
+
+    def test_forecast_endpoint(self):
+        self.client.login(username='testuser', password='12345')
+        response = self.client.get(reverse('pfinance:forecast') + '?months=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['monthly']['labels']), 3)
+
+        response = self.client.get(reverse('pfinance:forecast') + '?months=abc')
+        self.assertEqual(response.status_code, 400)
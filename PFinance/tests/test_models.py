@@ -1,9 +1,16 @@
 from django.test import TestCase
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
 from datetime import date, timedelta
 from decimal import Decimal
-from ..models import Category, UserProfile, Transaction, Budget, RecurringPayment, Alert, RecurringIncome, Goal
+from io import StringIO
+from ..models import Category, UserProfile, Transaction, Budget, RecurringPayment, Alert, RecurringIncome, Goal, \
+    ArchivedAlert, JobRun, BudgetPeriod, ChangeLog
+from ..budgets import budget_index
+from ..periods import month_period
 
 
 class CategoryModelTest(TestCase):
@@ -222,4 +229,420 @@ class GoalModelTest(TestCase):
     def test_complete_goal(self):
         self.goal.current_amount = Decimal('2000.00')
         self.goal.save()
-        self.assertEqual(self.goal.status, 'completed')
\ No newline at end of file
+        self.assertEqual(self.goal.status, 'completed')
+
+class BudgetAlertSignalTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR')
+        self.category = Category.objects.create(name="Comida", is_expense=True)
+        self.budget = Budget.objects.create(
+            user=self.user,
+            category=self.category,
+            amount=Decimal('100.00'),
+            frequency='monthly'
+        )
+
+    def add_expense(self, amount):
+        return Transaction.objects.create(
+            user=self.user,
+            category=self.category,
+            amount=Decimal(amount),
+            is_expense=True
+        )
+
+    def test_single_alert_per_budget_period(self):
+        self.add_expense('95.00')
+        self.add_expense('10.00')
+
+        alerts = Alert.objects.filter(user=self.user, alert_type='budget')
+        self.assertEqual(alerts.count(), 1)
+        self.assertIn("traspasa", alerts.get().title)
+        self.assertTrue(alerts.get().dedup_key.startswith(f"budget:{self.budget.pk}:"))
+
+    def test_delete_downgrades_and_removes_alert(self):
+        self.add_expense('92.00')
+        extra = self.add_expense('10.00')
+
+        extra.delete()
+        alert = Alert.objects.get(user=self.user, alert_type='budget')
+        self.assertIn("al límite", alert.title)
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.state, 'limit')
+
+        Transaction.objects.filter(user=self.user).first().delete()
+        self.assertFalse(Alert.objects.filter(user=self.user, alert_type='budget').exists())
+
+    def test_alert_references_budget_period(self):
+        first = self.add_expense('60.00')
+        second = self.add_expense('35.00')
+
+        alert = Alert.objects.get(user=self.user, alert_type='budget')
+        self.assertEqual(alert.budget, self.budget)
+        self.assertTrue(alert.period_start <= first.date < alert.period_end)
+        self.assertEqual(list(alert.get_related_transactions()), [second, first])
+        self.assertFalse(Alert.transactions.through.objects.exists())
+
+    def test_collapse_legacy_alert_links(self):
+        expenses = [
+            Transaction.objects.create(user=self.user, category=self.category, amount=Decimal('1.00'))
+            for _ in range(3)
+        ]
+        period_key = expenses[0].date.astimezone(self.profile.tzinfo).strftime('%Y-%m')
+        legacy = Alert.objects.create(
+            user=self.user, title='Antigua', message='-', alert_type='budget',
+            dedup_key=Alert.build_dedup_key('budget', self.budget.pk, period_key)
+        )
+        keyless = Alert.objects.create(user=self.user, title='Sin clave', message='-', alert_type='budget')
+        legacy.transactions.add(*expenses)
+        keyless.transactions.add(*expenses[:2])
+
+        call_command('collapse_alert_transactions', stdout=StringIO())
+
+        self.assertFalse(Alert.transactions.through.objects.exists())
+        legacy.refresh_from_db()
+        keyless.refresh_from_db()
+        self.assertEqual(legacy.budget, self.budget)
+        self.assertEqual(legacy.period_start.astimezone(self.profile.tzinfo).day, 1)
+        self.assertEqual(set(legacy.get_related_transactions()), set(expenses))
+        self.assertEqual(keyless.budget, self.budget)
+        self.assertEqual(set(keyless.get_related_transactions()), set(expenses[:2]))
+
+    def test_expense_without_budget_costs_no_extra_queries(self):
+        other = Category.objects.create(name="Ocio", is_expense=True)
+        budget_index(self.user.pk)
+        # INSERT de la transacción y su entrada en el registro de cambios
+        with self.assertNumQueries(2):
+            Transaction.objects.create(user=self.user, category=other, amount=Decimal('5.00'))
+
+    def test_budget_index_follows_budget_changes(self):
+        self.assertEqual(budget_index(self.user.pk)['budgets'][self.category.pk]['amount'], Decimal('100.00'))
+        self.budget.amount = Decimal('500.00')
+        self.budget.save()
+        self.add_expense('95.00')
+        self.assertFalse(Alert.objects.filter(user=self.user, alert_type='budget').exists())
+
+        self.budget.delete()
+        self.assertEqual(budget_index(self.user.pk)['budgets'], {})
+
+    def test_one_active_budget_per_category(self):
+        Budget.objects.create(
+            user=self.user, category=self.category, amount=Decimal('50.00'), frequency='yearly', is_active=False
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Budget.objects.create(user=self.user, category=self.category, amount=Decimal('50.00'), frequency='yearly')
+
+    def test_upsert_updates_existing_alert(self):
+        key = Alert.build_dedup_key('system', 1)
+        Alert.upsert(self.user, key, 'system', 'Aviso', 'Primero')
+        Alert.upsert(self.user, key, 'system', 'Aviso', 'Segundo')
+        self.assertEqual(Alert.objects.get(user=self.user, dedup_key=key).message, 'Segundo')
+
+
+class BudgetPeriodTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR')
+        self.category = Category.objects.create(name="Comida", is_expense=True)
+        self.budget = Budget.objects.create(
+            user=self.user, category=self.category, amount=Decimal('100.00'), frequency='monthly'
+        )
+        self.current = month_period(tz=self.profile.tzinfo)
+        self.previous = month_period(tz=self.profile.tzinfo, offset=-1)
+
+    def add_expense(self, amount, date=None):
+        return Transaction.objects.create(
+            user=self.user, category=self.category, amount=Decimal(amount), date=date or timezone.now()
+        )
+
+    def test_spend_is_applied_incrementally(self):
+        self.add_expense('40.00')
+        expense = self.add_expense('55.00')
+        row = BudgetPeriod.objects.get(budget=self.budget, start=self.current.start)
+        self.assertEqual((row.spent, row.state), (Decimal('95.00'), 'limit'))
+
+        expense.delete()
+        row.refresh_from_db()
+        self.assertEqual((row.spent, row.state), (Decimal('40.00'), 'ok'))
+
+    def test_edit_applies_only_the_difference(self):
+        other = Category.objects.create(name="Ocio", is_expense=True)
+        other_budget = Budget.objects.create(
+            user=self.user, category=other, amount=Decimal('100.00'), frequency='monthly'
+        )
+        expense = Transaction.objects.get(pk=self.add_expense('40.00').pk)
+
+        expense.amount = Decimal('95.00')
+        expense.save()
+        row = BudgetPeriod.objects.get(budget=self.budget, start=self.current.start)
+        self.assertEqual((row.spent, row.state), (Decimal('95.00'), 'limit'))
+
+        # Cambio de categoría y fecha: sale de un período y entra en el otro
+        expense.category = other
+        expense.date = self.previous.start
+        expense.save()
+        row.refresh_from_db()
+        self.assertEqual((row.spent, row.state), (Decimal('0.00'), 'ok'))
+        self.assertEqual(BudgetPeriod.objects.get(budget=other_budget, start=self.previous.start).spent, Decimal('95.00'))
+
+        # Guardar sin cambios no toca los presupuestos: UPDATE y registro de cambios
+        with self.assertNumQueries(2):
+            expense.save()
+
+    def test_backdated_expense_updates_its_own_period(self):
+        self.add_expense('120.00', date=self.previous.start)
+        self.assertEqual(BudgetPeriod.objects.get(start=self.previous.start).state, 'overlimit')
+        self.assertFalse(BudgetPeriod.objects.current().exists())
+        self.assertEqual(Budget.objects.with_current_period().get().current_state, 'ok')
+
+    def test_new_period_resets_state_and_rolls_over(self):
+        Budget.objects.filter(pk=self.budget.pk).update(state='overlimit', rollover=True)
+        BudgetPeriod.objects.create(
+            budget=self.budget, start=self.previous.start, end=self.previous.end,
+            amount=Decimal('100.00'), spent=Decimal('40.00')
+        )
+
+        call_command('open_budget_periods', stdout=StringIO())
+
+        row = BudgetPeriod.objects.current().get()
+        self.assertEqual((row.amount, row.rollover, row.state), (Decimal('160.00'), Decimal('60.00'), 'ok'))
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.state, 'ok')
+        self.assertEqual(JobRun.objects.get(job='open_budget_periods').processed, 1)
+
+    def test_history_chart_data(self):
+        self.add_expense('30.00', date=self.previous.start)
+        self.add_expense('10.00')
+        data = BudgetPeriod.objects.filter(budget=self.budget).chart_data(limit=12)
+        self.assertEqual(data['spent'], [30.0, 10.0])
+        self.assertEqual(data['amounts'], [100.0, 100.0])
+
+
+class PurgeAlertsCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR')
+        old = timezone.now() - timedelta(days=200)
+        for i in range(5):
+            alert = Alert.objects.create(user=self.user, title=f'Vieja {i}', message='-', alert_type='system', read=True)
+            Alert.objects.filter(pk=alert.pk).update(created_at=old)
+        Alert.objects.create(user=self.user, title='Reciente', message='-', alert_type='system', read=True)
+        unread = Alert.objects.create(user=self.user, title='No leída', message='-', alert_type='system')
+        Alert.objects.filter(pk=unread.pk).update(created_at=old)
+
+    def test_archive_in_batches(self):
+        call_command('purge_alerts', days=90, archive=True, batch_size=2, stdout=StringIO())
+        self.assertEqual(Alert.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(ArchivedAlert.objects.filter(user=self.user).count(), 5)
+
+    def test_delete_without_archive(self):
+        call_command('purge_alerts', days=90, stdout=StringIO())
+        self.assertEqual(Alert.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(ArchivedAlert.objects.exists())
+
+    def test_purge_logs_each_batch_once(self):
+        purged = set(Alert.objects.filter(title__startswith='Vieja').values_list('pk', flat=True))
+        ChangeLog.objects.all().delete()
+
+        # Por lote (2, 2 y 1 alertas): lectura, savepoints, borrado del M2M, borrado y un solo registro
+        with self.assertNumQueries(3 * 6 + 1):
+            call_command('purge_alerts', days=90, batch_size=2, stdout=StringIO())
+
+        self.assertEqual(
+            set(ChangeLog.objects.filter(model='alert', deleted=True).values_list('object_id', flat=True)), purged
+        )
+
+
+class GoalQuerySetTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR')
+        Goal.objects.create(user=self.user, subject="Coche", target_amount=Decimal('3000.00'),
+                            current_amount=Decimal('1000.00'))
+        Goal.objects.create(user=self.user, subject="Viaje", target_amount=Decimal('500.00'),
+                            current_amount=Decimal('600.00'))
+
+    def test_with_progress(self):
+        goals = {goal.subject: goal for goal in Goal.objects.with_progress()}
+        self.assertEqual(goals["Coche"].progress_pct, 33)
+        self.assertEqual(goals["Coche"].remaining_amount, Decimal('2000.00'))
+        self.assertFalse(goals["Coche"].is_completed)
+        self.assertEqual(goals["Viaje"].progress_pct, 100)
+        self.assertEqual(goals["Viaje"].remaining_amount, 0)
+        self.assertTrue(goals["Viaje"].is_completed)
+
+    def test_progress_matches_python(self):
+        for goal in Goal.objects.with_progress():
+            self.assertEqual(goal.progress_pct, goal.progress_percentage())
+
+    def test_chart_data(self):
+        data = Goal.objects.filter(user=self.user, status='in_progress').chart_data()
+        self.assertEqual(data, {'labels': ["Coche"], 'target': [3000.0], 'current': [1000.0], 'progress': [33]})
+
+
+class GoalContributionTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR')
+        self.goal = Goal.objects.create(
+            user=self.user,
+            subject="Ahorro vacaciones",
+            target_amount=Decimal('1000.00'),
+            current_amount=Decimal('200.00')
+        )
+
+    def test_initial_amount_is_recorded(self):
+        self.assertEqual(self.goal.contributions.get().amount, Decimal('200.00'))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.goals_saved, Decimal('200.00'))
+
+    def test_add_contribution_updates_incrementally(self):
+        self.goal.add_contribution(Decimal('300.00'))
+        self.goal.add_contribution(Decimal('-100.00'))
+        self.assertEqual(self.goal.current_amount, Decimal('400.00'))
+        self.assertEqual(self.goal.contributions.count(), 3)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.goals_saved, Decimal('400.00'))
+
+    def test_withdrawal_cannot_go_negative(self):
+        with self.assertRaises(ValidationError):
+            self.goal.add_contribution(Decimal('-500.00'))
+        self.goal.refresh_from_db()
+        self.assertEqual(self.goal.current_amount, Decimal('200.00'))
+
+    def test_completion_sets_status_and_alert(self):
+        self.goal.add_contribution(Decimal('800.00'))
+        self.assertEqual(self.goal.status, 'completed')
+        self.assertTrue(Alert.objects.filter(user=self.user, alert_type='goal').exists())
+
+    def test_delete_releases_savings(self):
+        self.goal.delete()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.goals_saved, Decimal('0'))
+
+
+class ReminderIndexTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR')
+        self.today = timezone.now().date()
+        self.payment = RecurringPayment.objects.create(
+            user=self.user, name="Gimnasio", amount=Decimal('30.00'),
+            start_date=self.today, next_due_date=self.today + timedelta(days=5),
+            frequency='monthly', reminder_days=5
+        )
+
+    def test_reminder_date_follows_due_date(self):
+        self.assertEqual(self.payment.reminder_date, self.today)
+        self.payment.next_due_date += timedelta(days=10)
+        self.payment.save(update_fields=['next_due_date'])
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.reminder_date, self.today + timedelta(days=10))
+
+    def test_backfill_command_fills_missing_reminder_dates(self):
+        RecurringPayment.objects.filter(pk=self.payment.pk).update(reminder_date=None)
+        call_command('backfill_reminder_dates', stdout=StringIO())
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.reminder_date, self.today)
+
+    def test_reminder_created_once(self):
+        Alert.objects.all().delete()
+        call_command('process_recurring_payments', stdout=StringIO())
+        call_command('process_recurring_payments', stdout=StringIO())
+        self.assertEqual(Alert.objects.filter(title__startswith="Recordatorio de pago").count(), 1)
+
+    def test_income_reminder_created_once(self):
+        RecurringIncome.objects.create(
+            user=self.user, name="Nómina", amount=Decimal('1200.00'), start_date=self.today,
+            next_income_date=self.today + timedelta(days=RecurringIncome.REMINDER_DAYS), frequency='monthly'
+        )
+        Alert.objects.all().delete()
+        call_command('process_recurring_incomes', stdout=StringIO())
+        call_command('process_recurring_incomes', stdout=StringIO())
+        self.assertEqual(Alert.objects.filter(title__startswith="Recordatorio de ingreso").count(), 1)
+
+
+class JobRunTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR')
+        self.today = date.today()
+        self.payments = [
+            RecurringPayment.objects.create(
+                user=self.user, name=f"Pago {i}", amount=Decimal('10.00'),
+                start_date=self.today, next_due_date=self.today, frequency='monthly'
+            )
+            for i in range(3)
+        ]
+
+    def test_process_due_payments_once_each(self):
+        transactions = RecurringPayment.process_due_payments()
+        self.assertEqual(len(transactions), 3)
+        self.assertEqual(Transaction.objects.count(), 3)
+
+    def test_same_occurrence_is_not_charged_twice(self):
+        payment = self.payments[0]
+        self.assertIsNotNone(payment.process_payment())
+        # Fecha restaurada a mano, como si el avance se hubiera perdido
+        RecurringPayment.objects.filter(pk=payment.pk).update(next_due_date=self.today)
+        payment.refresh_from_db()
+        self.assertIsNone(payment.process_payment())
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_income_alert_is_created_with_the_income(self):
+        income = RecurringIncome.objects.create(
+            user=self.user, name="Nómina", amount=Decimal('1200.00'), start_date=self.today,
+            next_income_date=self.today, frequency='monthly'
+        )
+        self.assertIsNotNone(income.process_income())
+        RecurringIncome.objects.filter(pk=income.pk).update(next_income_date=self.today)
+        income.refresh_from_db()
+        self.assertIsNone(income.process_income())
+
+        alert = Alert.objects.get(title="Ingreso registrado: Nómina")
+        self.assertEqual(alert.dedup_key, Alert.build_dedup_key('income_received', income.pk, self.today.isoformat()))
+
+    def test_run_records_counts(self):
+        call_command('process_recurring_payments', chunk_size=2, stdout=StringIO())
+        run = JobRun.objects.get(job='process_recurring_payments')
+        self.assertEqual(run.status, 'completed')
+        self.assertEqual(run.processed, 3)
+        self.assertEqual(run.checkpoint, self.payments[-1].pk)
+        self.assertIsNotNone(run.duration)
+
+    def test_failed_rows_are_retried(self):
+        failing = {self.payments[1].pk}
+
+        def handler(payment):
+            if payment.pk in failing:
+                raise ValueError("Fallo")
+            return True
+
+        run = JobRun.start('test_job', self.today)
+        run.process(RecurringPayment.objects.all(), handler, chunk_size=2)
+        run.finish()
+        self.assertEqual((run.status, run.processed, run.failed), ('failed', 2, 1))
+        self.assertEqual(run.checkpoint, self.payments[0].pk)
+
+        failing.clear()
+        retry = JobRun.start('test_job', self.today)
+        self.assertEqual(retry.pk, run.pk)
+        seen = []
+        retry.process(RecurringPayment.objects.all(), lambda payment: seen.append(payment.pk) or True)
+        retry.finish()
+        self.assertEqual(seen, [self.payments[1].pk, self.payments[2].pk])
+        self.assertEqual((retry.status, retry.failed), ('completed', 0))
+
+    def test_failed_run_resumes_from_checkpoint(self):
+        JobRun.objects.create(
+            job='process_recurring_payments', run_date=timezone.now().date(),
+            status='failed', checkpoint=self.payments[0].pk
+        )
+        call_command('process_recurring_payments', stdout=StringIO())
+
+        run = JobRun.objects.get(job='process_recurring_payments')
+        self.assertEqual(run.status, 'completed')
+        self.assertEqual(run.attempts, 2)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.payments[0].refresh_from_db()
+        self.assertEqual(self.payments[0].next_due_date, self.today)
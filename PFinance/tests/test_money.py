@@ -0,0 +1,33 @@
+from decimal import Decimal
+
+from django import forms
+from django.test import SimpleTestCase
+
+from ..money import MoneyField, format_cents, format_money, from_cents, to_cents
+
+
+class MoneyHelpersTest(SimpleTestCase):
+    def test_cents_round_trip(self):
+        self.assertEqual(to_cents(Decimal('12.345')), 1235)
+        self.assertEqual(to_cents(0.1 + 0.2), 30)
+        self.assertEqual(to_cents('-7.5'), -750)
+        self.assertEqual(from_cents(1235), Decimal('12.35'))
+
+    def test_exact_formatting(self):
+        self.assertEqual(format_cents(123456789012345), "1234567890123.45")
+        self.assertEqual(format_cents(-5, 'EUR'), "-0.05 EUR")
+        self.assertEqual(format_money(Decimal('19.9'), 'USD'), "19.90 USD")
+
+
+class MoneyFieldTest(SimpleTestCase):
+    def test_stores_cents_and_reads_decimal(self):
+        field = MoneyField(max_digits=10)
+        self.assertEqual(field.get_prep_value(Decimal('10.05')), 1005)
+        self.assertIsNone(field.get_prep_value(None))
+        self.assertEqual(field.from_db_value(1005, None, None), Decimal('10.05'))
+        self.assertEqual(field.to_python(3), Decimal('3.00'))
+
+    def test_form_field_is_decimal(self):
+        formfield = MoneyField(max_digits=10).formfield()
+        self.assertIsInstance(formfield, forms.DecimalField)
+        self.assertEqual(formfield.decimal_places, 2)
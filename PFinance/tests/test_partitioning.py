@@ -0,0 +1,76 @@
+from datetime import datetime
+from io import StringIO
+from zoneinfo import ZoneInfo
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from ..partitioning import TABLE, convert_table, detect_interval, foreign_keys, partition_bounds
+
+MADRID = ZoneInfo('Europe/Madrid')
+
+
+class PartitionBoundsTest(SimpleTestCase):
+    def test_monthly_bounds_are_contiguous(self):
+        bounds = partition_bounds(
+            datetime(2023, 11, 20, tzinfo=MADRID), datetime(2024, 2, 1, tzinfo=MADRID), 'month', MADRID
+        )
+        self.assertEqual([name for name, _, _ in bounds], [
+            f"{TABLE}_p2023_11", f"{TABLE}_p2023_12", f"{TABLE}_p2024_01", f"{TABLE}_p2024_02",
+        ])
+        self.assertEqual(bounds[0][1], datetime(2023, 11, 1, tzinfo=MADRID))
+        for previous, current in zip(bounds, bounds[1:]):
+            self.assertEqual(previous[2], current[1])
+
+    def test_yearly_bounds_and_interval_detection(self):
+        bounds = partition_bounds(
+            datetime(2022, 6, 1, tzinfo=MADRID), datetime(2023, 1, 1, tzinfo=MADRID), 'year', MADRID
+        )
+        self.assertEqual([(name, start.year, end.year) for name, start, end in bounds], [
+            (f"{TABLE}_p2022", 2022, 2023), (f"{TABLE}_p2023", 2023, 2024),
+        ])
+        names = {name for name, _, _ in bounds} | {f"{TABLE}_default"}
+        self.assertEqual(detect_interval(names), 'year')
+        self.assertEqual(detect_interval({f"{TABLE}_p2024_01", f"{TABLE}_default"}), 'month')
+
+
+class RecordingCursor:
+    """Cursor que solo guarda las sentencias: la conversión real necesita PostgreSQL"""
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+    def fetchall(self):
+        return []
+
+
+class ConvertTableTest(SimpleTestCase):
+    def test_every_foreign_key_keeps_constraint_and_index(self):
+        cursor = RecordingCursor()
+        convert_table(
+            cursor, 'month', datetime(2024, 1, 1, tzinfo=MADRID), datetime(2024, 2, 1, tzinfo=MADRID)
+        )
+
+        columns = {field.column for field in foreign_keys()}
+        self.assertTrue({'user_id', 'category_id', 'recurring_payment_id'} <= columns)
+        for column in columns:
+            quoted = connection.ops.quote_name(column)
+            self.assertTrue(any(f"FOREIGN KEY ({quoted})" in sql for sql in cursor.statements), column)
+            self.assertTrue(
+                any(sql.startswith('CREATE INDEX') and f"({quoted}" in sql for sql in cursor.statements), column
+            )
+
+
+class PartitionCommandTest(TestCase):
+    def test_requires_postgresql(self):
+        with self.assertRaises(CommandError):
+            call_command('partition_transactions', convert=True, stdout=StringIO())
+
+    def test_benchmark_reports_unpartitioned_table(self):
+        out = StringIO()
+        call_command('benchmark', scenario='partitions', rows=50, users=1, repeat=1, stdout=out)
+        self.assertIn("partition_transactions --convert", out.getvalue())
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from zoneinfo import ZoneInfo
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+
+from ..middleware import UserTimezoneMiddleware
+from ..models import Category, UserProfile, Transaction
+from ..periods import budget_period, last_months, month_period, period_from_key, year_period
+from ..views import DashboardView
+
+MADRID = ZoneInfo('Europe/Madrid')
+
+
+class PeriodTest(SimpleTestCase):
+    def test_month_is_half_open(self):
+        period = month_period(datetime(2024, 12, 15, 12, tzinfo=MADRID), MADRID)
+        self.assertEqual(period.start, datetime(2024, 12, 1, tzinfo=MADRID))
+        self.assertEqual(period.end, datetime(2025, 1, 1, tzinfo=MADRID))
+        self.assertIn(datetime(2024, 12, 31, 23, 59, 59, tzinfo=MADRID), period)
+        self.assertNotIn(period.end, period)
+        self.assertEqual(period.key, "2024-12")
+
+    def test_local_month_from_utc(self):
+        # 31/01 23:30 UTC ya es febrero en Madrid
+        period = month_period(datetime(2024, 1, 31, 23, 30, tzinfo=ZoneInfo('UTC')), MADRID)
+        self.assertEqual(period.key, "2024-02")
+
+    def test_year_and_budget_period(self):
+        moment = datetime(2024, 6, 1, tzinfo=MADRID)
+        self.assertEqual(year_period(moment, MADRID).key, "2024")
+        self.assertEqual(budget_period('yearly', moment, MADRID), year_period(moment, MADRID))
+        self.assertEqual(budget_period('monthly', moment, MADRID).filter(), {
+            'date__gte': datetime(2024, 6, 1, tzinfo=MADRID),
+            'date__lt': datetime(2024, 7, 1, tzinfo=MADRID),
+        })
+
+    def test_period_from_key(self):
+        moment = datetime(2024, 6, 1, tzinfo=MADRID)
+        self.assertEqual(period_from_key("2024-06", MADRID), month_period(moment, MADRID))
+        self.assertEqual(period_from_key("2024", MADRID), year_period(moment, MADRID))
+        self.assertIsNone(period_from_key("2024-13", MADRID))
+        self.assertIsNone(period_from_key("junio", MADRID))
+
+    def test_last_months_are_contiguous(self):
+        periods = last_months(6, datetime(2024, 3, 31, tzinfo=MADRID), MADRID)
+        self.assertEqual([p.key for p in periods], ['2023-10', '2023-11', '2023-12', '2024-01', '2024-02', '2024-03'])
+        for previous, current in zip(periods, periods[1:]):
+            self.assertEqual(previous.end, current.start)
+
+
+class DashboardPeriodsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        UserProfile.objects.create(user=self.user, currency='EUR')
+        self.category = Category.objects.create(name="Comida", is_expense=True)
+
+    def test_category_expenses_only_current_year(self):
+        now = timezone.now()
+        Transaction.objects.create(user=self.user, amount=Decimal('10.00'), category=self.category, date=now)
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('99.00'), category=self.category, date=now - timedelta(days=366)
+        )
+        data = DashboardView().get_category_expenses(self.user)
+        self.assertEqual(data['values'], [10.0])
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark', rows=200, users=2, repeat=1, stdout=out)
+        self.assertIn("rango", out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='benchmark-').exists())
+
+
+class UserTimezoneTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR', timezone='America/New_York')
+        self.category = Category.objects.create(name="Comida", is_expense=True)
+
+    def test_middleware_activates_profile_timezone(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        seen = []
+        UserTimezoneMiddleware(lambda request: seen.append(str(timezone.get_current_timezone())))(request)
+        self.assertEqual(seen, ['America/New_York'])
+        # Tras la petición se vuelve a la zona por defecto
+        self.assertEqual(str(timezone.get_current_timezone()), 'Europe/Madrid')
+
+    def test_month_boundary_uses_local_time(self):
+        tz = self.profile.tzinfo
+        now = timezone.localtime(timezone.now(), tz)
+        start = month_period(now, tz).start
+        # 1 de mes a las 02:00 en Madrid sigue siendo el mes anterior en Nueva York
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('10.00'), category=self.category,
+            date=start - timedelta(hours=1)
+        )
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('5.00'), category=self.category, date=start
+        )
+        with timezone.override(tz):
+            data = DashboardView().get_category_expenses(self.user)
+        self.assertEqual(data['values'], [5.0])
+
+    def test_boundaries_are_cached(self):
+        tz = self.profile.tzinfo
+        moment = datetime(2024, 5, 10, tzinfo=tz)
+        self.assertIs(month_period(moment, tz), month_period(moment, tz))
@@ -0,0 +1,141 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from ..currency import rate_table
+from ..models import Alert, Budget, BudgetPeriod, Category, ExchangeRate, JobRun, RecurringPayment, Transaction, UserProfile
+from ..periods import month_period
+from ..projections import forecast_alerts, posted_payments, project, scheduled_payments
+
+MADRID = ZoneInfo('Europe/Madrid')
+
+
+class ProjectionTest(SimpleTestCase):
+    def test_rate_needs_some_elapsed_days(self):
+        projected = project(
+            np.array([3000., 3000.]), np.array([1., 10.]), np.array([20., 20.]), np.array([0, 500])
+        )
+        self.assertEqual(projected.tolist(), [3000., 3000. + 300 * 20 + 500])
+
+    def test_posted_recurring_spend_is_not_extrapolated(self):
+        projected = project(np.array([90000.]), np.array([4.]), np.array([26.]), np.array([0]), np.array([80000]))
+        self.assertEqual(projected.tolist(), [90000. + 2500 * 26])
+
+    def test_scheduled_payments_per_budget(self):
+        payments = [
+            (1, 10, date(2024, 6, 3), 'weekly', None, 1000, date(2024, 1, 1)),  # 3, 10, 17, 24 de junio
+            (1, 10, date(2024, 6, 20), 'monthly', date(2024, 6, 15), 5000, date(2024, 1, 20)),  # Ya terminó
+            (2, 10, date(2024, 6, 28), 'monthly', None, 700, date(2024, 1, 28)),
+            (2, 99, date(2024, 6, 5), 'monthly', None, 900, date(2024, 1, 5)),  # Categoría sin presupuesto
+        ]
+        scheduled = scheduled_payments(
+            [(1, 10), (2, 10), (3, 10)], [date(2024, 6, 30), date(2024, 6, 27), date(2024, 6, 30)],
+            payments, date(2024, 6, 1)
+        )
+        self.assertEqual(scheduled.tolist(), [4000, 0, 0])
+
+
+class ForecastAlertsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        UserProfile.objects.create(user=self.user, currency='EUR', timezone='Europe/Madrid')
+        self.now = timezone.make_aware(timezone.datetime(2024, 6, 16, 12), MADRID)
+        self.period = month_period(self.now, MADRID)
+
+    def add_budget(self, name, spent):
+        budget = Budget.objects.create(
+            user=self.user, category=Category.objects.create(name=name, is_expense=True),
+            amount=Decimal('100.00'), frequency='monthly'
+        )
+        BudgetPeriod.objects.create(
+            budget=budget, start=self.period.start, end=self.period.end, amount=budget.amount, spent=Decimal(spent)
+        )
+        return budget
+
+    def test_alerts_for_projected_overspend(self):
+        fast = self.add_budget('Ocio', '60.00')
+        self.add_budget('Comida', '30.00')
+        scheduled = self.add_budget('Hogar', '20.00')
+        RecurringPayment.objects.create(
+            user=self.user, name='Alquiler garaje', amount=Decimal('90.00'), category=scheduled.category,
+            start_date=date(2024, 1, 25), next_due_date=date(2024, 6, 25), frequency='monthly'
+        )
+
+        alerts = forecast_alerts(Budget.objects.all(), self.now)
+
+        self.assertEqual({alert.budget_id for alert in alerts}, {fast.pk, scheduled.pk})
+        self.assertIn(f"budget_forecast:{fast.pk}:2024-06", {alert.dedup_key for alert in alerts})
+        self.assertTrue(all(alert.period_start == self.period.start for alert in alerts))
+
+    def test_recurring_charge_at_period_start_is_not_a_daily_rate(self):
+        category = Category.objects.create(name='Vivienda', is_expense=True)
+        rent = RecurringPayment.objects.create(
+            user=self.user, name='Alquiler', amount=Decimal('80.00'), category=category,
+            start_date=date(2024, 5, 2), next_due_date=date(2024, 7, 2), frequency='monthly'
+        )
+        charged = timezone.make_aware(timezone.datetime(2024, 6, 2, 9), MADRID)
+        for when, amount in ((charged, '80.00'), (charged - timedelta(days=31), '80.00'), (self.now, '5.00')):
+            Transaction.objects.create(
+                user=self.user, category=category, amount=Decimal(amount), date=when,
+                recurring_payment=rent if amount == '80.00' else None
+            )
+        budget = Budget.objects.create(user=self.user, category=category, amount=Decimal('100.00'), frequency='monthly')
+        BudgetPeriod.objects.create(
+            budget=budget, start=self.period.start, end=self.period.end, amount=budget.amount, spent=Decimal('85.00')
+        )
+
+        # 85 / 15,5 días * 14,5 restantes daría ~164; sin el alquiler el ritmo es de 5 en 15,5 días
+        self.assertEqual(forecast_alerts(Budget.objects.all(), self.now), [])
+
+        charges = [(self.user.pk, category.pk, charged, 8000), (self.user.pk, category.pk, charged - timedelta(days=31), 8000)]
+        self.assertEqual(posted_payments([(self.user.pk, category.pk)], [self.period.start], charges).tolist(), [8000])
+
+    def test_foreign_currency_recurring_charge_is_converted(self):
+        ExchangeRate.objects.create(currency='GBP', date=date(2024, 6, 1), rate=Decimal('0.50'))
+        rate_table.invalidate()
+        category = Category.objects.create(name='Vivienda', is_expense=True)
+        rent = RecurringPayment.objects.create(
+            user=self.user, name='Alquiler', amount=Decimal('40.00'), category=category,
+            start_date=date(2024, 5, 2), next_due_date=date(2024, 7, 2), frequency='monthly'
+        )
+        Transaction.objects.create(
+            user=self.user, category=category, amount=Decimal('40.00'), currency='GBP', recurring_payment=rent,
+            date=timezone.make_aware(timezone.datetime(2024, 6, 2, 9), MADRID)
+        )
+        budget = Budget.objects.create(user=self.user, category=category, amount=Decimal('100.00'), frequency='monthly')
+        BudgetPeriod.objects.create(
+            budget=budget, start=self.period.start, end=self.period.end, amount=budget.amount, spent=Decimal('85.00')
+        )
+
+        # 40 GBP son 80 EUR: restar 40 dejaría un ritmo de 45 en 15,5 días y una alerta falsa
+        self.assertEqual(forecast_alerts(Budget.objects.all(), self.now), [])
+
+
+class ProjectBudgetsCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        UserProfile.objects.create(user=self.user, currency='EUR')
+        category = Category.objects.create(name='Suscripciones', is_expense=True)
+        Budget.objects.create(user=self.user, category=category, amount=Decimal('50.00'), frequency='monthly')
+        today = timezone.localdate()
+        RecurringPayment.objects.create(
+            user=self.user, name='Gimnasio', amount=Decimal('60.00'), category=category,
+            start_date=today, next_due_date=today + timedelta(days=30), frequency='monthly'
+        )
+        RecurringPayment.objects.filter(user=self.user).update(next_due_date=today)
+
+    def test_single_alert_per_period(self):
+        call_command('project_budgets', stdout=StringIO())
+        JobRun.objects.update(status='completed', checkpoint=0)
+        call_command('project_budgets', stdout=StringIO())
+
+        alerts = Alert.objects.filter(user=self.user, dedup_key__startswith='budget_forecast:')
+        self.assertEqual(alerts.count(), 1)
+        self.assertIn("Suscripciones", alerts.get().title)
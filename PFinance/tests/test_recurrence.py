@@ -0,0 +1,107 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+
+from ..models import UserProfile, RecurringIncome, RecurringPayment
+from ..recurrence import add_months, days_in_month, next_occurrence, nth_occurrence, occurrences
+
+
+def every_day(start, end):
+    current = start
+    while current <= end:
+        yield current
+        current += timedelta(days=1)
+
+
+class RecurrencePropertiesTest(SimpleTestCase):
+    """Propiedades comprobadas para cada día entre 1990 y 2050"""
+    START = date(1990, 1, 1)
+    END = date(2050, 12, 31)
+
+    def test_add_months_keeps_or_clamps_day(self):
+        for current in every_day(self.START, self.END):
+            for months in (1, 12):
+                result = add_months(current, months)
+                self.assertEqual((result.year * 12 + result.month) - (current.year * 12 + current.month), months)
+                self.assertEqual(result.day, min(current.day, days_in_month(result.year, result.month)))
+
+    def test_next_occurrence_is_strictly_increasing(self):
+        for current in every_day(self.START, self.END):
+            for frequency in ('weekly', 'monthly', 'yearly'):
+                self.assertGreater(next_occurrence(current, frequency), current)
+
+    def test_anchored_occurrences_never_drift(self):
+        for anchor in every_day(date(2000, 1, 1), date(2001, 12, 31)):
+            for n, current in enumerate(islice(occurrences(anchor, 'monthly'), 24)):
+                self.assertEqual(current, add_months(anchor, n))
+                self.assertEqual(current.day, min(anchor.day, days_in_month(current.year, current.month)))
+
+    def test_weekly_interval(self):
+        anchor = date(2024, 2, 26)
+        self.assertEqual(
+            list(occurrences(anchor, 'weekly', interval=2, end=date(2024, 4, 1))),
+            [date(2024, 2, 26), date(2024, 3, 11), date(2024, 3, 25)]
+        )
+
+
+class RecurrenceEdgeCasesTest(SimpleTestCase):
+    def test_leap_day_yearly(self):
+        self.assertEqual(next_occurrence(date(2024, 2, 29), 'yearly'), date(2025, 2, 28))
+        self.assertEqual(nth_occurrence(date(2024, 2, 29), 'yearly', 4), date(2028, 2, 29))
+
+    def test_anchor_recovers_clamped_day(self):
+        self.assertEqual(next_occurrence(date(2024, 2, 29), 'monthly', anchor=date(2024, 1, 31)), date(2024, 3, 31))
+        self.assertEqual(next_occurrence(date(2024, 4, 15), 'monthly', anchor=date(2024, 1, 31)), date(2024, 5, 15))
+
+    def test_unknown_frequency(self):
+        with self.assertRaises(ValueError):
+            next_occurrence(date(2024, 1, 1), 'hourly')
+
+
+class RecurringModelsDatesTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR')
+
+    def test_yearly_income_on_leap_day(self):
+        income = RecurringIncome.objects.create(
+            user=self.user, name="Bonus", amount=Decimal('100.00'),
+            start_date=date(2024, 2, 29), next_income_date=date(2024, 2, 29), frequency='yearly'
+        )
+        income.update_next_income_date()
+        self.assertEqual(income.next_income_date, date(2025, 2, 28))
+
+    def test_payment_and_income_agree(self):
+        payment = RecurringPayment.objects.create(
+            user=self.user, name="Seguro", amount=Decimal('50.00'),
+            start_date=date(2024, 1, 31), next_due_date=date(2024, 1, 31), frequency='monthly'
+        )
+        income = RecurringIncome.objects.create(
+            user=self.user, name="Nómina", amount=Decimal('50.00'),
+            start_date=date(2024, 1, 31), next_income_date=date(2024, 1, 31), frequency='monthly'
+        )
+        for _ in range(3):
+            payment.update_next_due_date()
+            income.update_next_income_date()
+            self.assertEqual(payment.next_due_date, income.next_income_date)
+        self.assertEqual(payment.next_due_date, date(2024, 4, 30))
+
+    def test_models_use_the_memoized_engine(self):
+        payment = RecurringPayment.objects.create(
+            user=self.user, name="Seguro", amount=Decimal('50.00'),
+            start_date=date(2024, 1, 31), next_due_date=date(2024, 2, 29), frequency='monthly'
+        )
+        income = RecurringIncome.objects.create(
+            user=self.user, name="Nómina", amount=Decimal('50.00'),
+            start_date=date(2024, 1, 31), next_income_date=date(2024, 2, 29), frequency='monthly'
+        )
+        next_occurrence.cache_clear()
+
+        payment.update_next_due_date()
+        income.update_next_income_date()
+
+        self.assertGreaterEqual(next_occurrence.cache_info().hits, 1)
+        self.assertEqual(income.next_income_date, date(2024, 3, 31))
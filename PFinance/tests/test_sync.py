@@ -0,0 +1,150 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Alert, Budget, Category, ChangeLog, Goal, Transaction, UserProfile
+from ..sync import COMMIT_LAG, changes_since
+
+
+def settle():
+    """Envejece el registro más allá de ``COMMIT_LAG``, como si todo estuviera confirmado"""
+    ChangeLog.objects.update(created_at=F('created_at') - COMMIT_LAG)
+
+
+class ChangeLogTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        UserProfile.objects.create(user=self.user, currency='EUR')
+        self.category = Category.objects.create(name="Supermercado", is_expense=True)
+
+    def cursor(self):
+        return ChangeLog.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+    def test_save_and_delete_are_logged(self):
+        transaction = Transaction.objects.create(user=self.user, amount=Decimal('10.00'), category=self.category)
+        pk = transaction.pk
+        transaction.delete()
+
+        log = list(ChangeLog.objects.filter(user=self.user).values_list('model', 'object_id', 'deleted'))
+        self.assertEqual(log, [('transaction', pk, False), ('transaction', pk, True)])
+
+    def test_bulk_paths_are_logged(self):
+        goal = Goal.objects.create(user=self.user, subject="Coche", target_amount=Decimal('100.00'))
+        Alert.create_missing([
+            Alert(user=self.user, dedup_key=f"system:{i}", alert_type='system', title="Aviso", message="...")
+            for i in range(3)
+        ])
+        since = self.cursor()
+
+        goal.add_contribution(Decimal('25.00'))
+        self.client.login(username='testuser', password='12345')
+        self.client.post(reverse('pfinance:mark_alerts_read_bulk'))
+        settle()
+
+        changes = changes_since(self.user.pk, since)['changes']
+        self.assertEqual(changes['goal']['upserts'][0][0], goal.pk)
+        read = changes['alert']['fields'].index('read')
+        self.assertEqual(len(changes['alert']['upserts']), 3)
+        self.assertTrue(all(row[read] for row in changes['alert']['upserts']))
+
+    def test_cascade_from_account_deletion_is_not_logged(self):
+        Transaction.objects.create(user=self.user, amount=Decimal('10.00'), category=self.category)
+        self.user.delete()
+        self.assertFalse(ChangeLog.objects.exists())
+
+
+class SyncViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        UserProfile.objects.create(user=self.user, currency='EUR')
+        self.category = Category.objects.create(name="Supermercado", is_expense=True)
+        self.client.login(username='testuser', password='12345')
+
+    def sync(self, since):
+        return self.client.get(reverse('pfinance:sync'), {'since': since}).json()
+
+    def test_full_copy_then_compact_deltas(self):
+        kept = Transaction.objects.create(user=self.user, amount=Decimal('10.00'), category=self.category)
+        settle()
+        first = self.sync(0)
+        self.assertTrue(first['reset'])
+        self.assertEqual([row[0] for row in first['changes']['transaction']['upserts']], [kept.pk])
+
+        # Cambios posteriores; los de otro usuario no aparecen
+        kept.description = "Mercado"
+        kept.save()
+        kept.save()
+        removed = Transaction.objects.create(user=self.user, amount=Decimal('3.00'), category=self.category)
+        removed_pk = removed.pk
+        removed.delete()
+        budget = Budget.objects.create(user=self.user, category=self.category, amount=Decimal('200.00'))
+        other = User.objects.create_user(username='other', password='12345')
+        Transaction.objects.create(user=other, amount=Decimal('1.00'), category=self.category)
+        settle()
+
+        delta = self.sync(first['cursor'])
+        self.assertFalse(delta['reset'])
+        self.assertFalse(delta['more'])
+        transactions = delta['changes']['transaction']
+        description = transactions['fields'].index('description')
+        self.assertEqual([(row[0], row[description]) for row in transactions['upserts']], [(kept.pk, "Mercado")])
+        self.assertEqual(transactions['deletes'], [removed_pk])
+        self.assertEqual(delta['changes']['budget']['upserts'][0][0], budget.pk)
+
+        self.assertEqual(self.sync(delta['cursor'])['changes'], {})
+
+    def test_batches_and_invalid_cursor(self):
+        Budget.objects.create(user=self.user, category=self.category, amount=Decimal('200.00'))
+        settle()
+        cursor = self.sync(0)['cursor']
+        for _ in range(3):
+            Transaction.objects.create(user=self.user, amount=Decimal('1.00'), category=self.category)
+        settle()
+        page = changes_since(self.user.pk, cursor, batch_size=2)
+        self.assertTrue(page['more'])
+        self.assertEqual(len(changes_since(self.user.pk, page['cursor'], batch_size=2)['changes']['transaction']['upserts']), 1)
+
+        response = self.client.get(reverse('pfinance:sync'), {'since': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_before_compaction_horizon_resets(self):
+        transaction = Transaction.objects.create(user=self.user, amount=Decimal('1.00'), category=self.category)
+        settle()
+        cursor = self.sync(0)['cursor']
+        transaction.save()
+        transaction.save()
+        ChangeLog.objects.filter(pk__lte=cursor).update(created_at=timezone.now() - timedelta(days=100))
+
+        call_command('compact_changelog', days=90, stdout=StringIO())
+        # Solo queda el último cambio del objeto
+        self.assertEqual(ChangeLog.objects.filter(object_id=transaction.pk, model='transaction').count(), 1)
+        self.assertTrue(self.sync(cursor - 1)['reset'])
+        self.assertFalse(self.sync(cursor)['reset'])
+
+    def test_late_commit_is_not_skipped(self):
+        Budget.objects.create(user=self.user, category=self.category, amount=Decimal('200.00'))
+        settle()
+        cursor = self.sync(0)['cursor']
+        late = Transaction.objects.create(user=self.user, amount=Decimal('1.00'), category=self.category)
+        early = Transaction.objects.create(user=self.user, amount=Decimal('2.00'), category=self.category)
+
+        # La entrada de ``late`` tiene el id menor pero su transacción sigue abierta: aún no se ve
+        pending = ChangeLog.objects.get(model='transaction', object_id=late.pk)
+        pending.delete()
+        delta = self.sync(cursor)
+        self.assertEqual(delta['changes'], {})
+        self.assertEqual(delta['cursor'], cursor)
+        self.assertEqual(self.sync(0)['cursor'], cursor)
+
+        # Confirma: aparece con su id original, por debajo de la otra
+        pending.save(force_insert=True)
+        settle()
+        delta = self.sync(delta['cursor'])
+        self.assertEqual(sorted(row[0] for row in delta['changes']['transaction']['upserts']), [late.pk, early.pk])
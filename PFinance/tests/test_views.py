@@ -1,3 +1,6 @@
+import shutil
+import tempfile
+
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, RequestFactory, override_settings
 from django.urls import reverse
@@ -5,6 +8,13 @@ from datetime import date
 from decimal import Decimal
 from PFinance.views import *
 
+# Las imágenes de perfil de los tests van a un directorio temporal, no a media/ del repositorio
+TEST_MEDIA_ROOT = tempfile.mkdtemp(prefix='pfinance-media-')
+
+
+def tearDownModule():
+    shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+
 
 class LandingPageViewTest(TestCase):
     def test_landing_page_unauthenticated(self):
@@ -71,6 +81,21 @@ class DashboardViewTest(TestCase):
         self.assertEqual(data['labels'][0], 'Comida')
         self.assertEqual(data['values'][0], 50.0)
 
+    def test_get_budgets_data_uses_current_period(self):
+        budget = Budget.objects.get(user=self.user)
+        period = month_period(tz=self.profile.tzinfo)
+        # Con arrastre el límite del período no es budget.amount
+        BudgetPeriod.objects.update_or_create(
+            budget=budget, start=period.start,
+            defaults={'end': period.end, 'amount': Decimal('360.00'), 'spent': Decimal('350.00'), 'state': 'limit'}
+        )
+
+        data = DashboardView().get_budgets_data(self.user)
+
+        self.assertEqual(
+            (data['amounts'], data['spent'], data['states']), ([360.0], [350.0], ['limit'])
+        )
+
     def test_get_monthly_summary(self):
         view = DashboardView()
         request = self.factory.get('/')
@@ -82,6 +107,7 @@ class DashboardViewTest(TestCase):
         self.assertGreater(data['expenses'][-1], 0)  # El último mes debería tener gastos
 
 
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
 class SignUpViewTest(TestCase):
     def test_signup_get(self):
         response = self.client.get(reverse('pfinance:register'))
@@ -101,6 +127,7 @@ class SignUpViewTest(TestCase):
         self.assertTrue(User.objects.filter(username='newuser').exists())
 
 
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
 class ProfileViewTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='testuser', password='12345')
@@ -216,6 +243,42 @@ class TransactionCreateViewTest(TestCase):
         self.assertEqual(Transaction.objects.count(), 1)
 
 
+class TransactionUpdateViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR')
+        self.category = Category.objects.create(name='Comida', is_expense=True)
+        self.budget = Budget.objects.create(
+            user=self.user, category=self.category, amount=Decimal('100.00'), frequency='monthly'
+        )
+        self.transaction = Transaction.objects.create(
+            user=self.user, amount=Decimal('20.00'), category=self.category, is_expense=True
+        )
+        self.client.login(username='testuser', password='12345')
+
+    def test_transaction_update_post(self):
+        data = {
+            'amount': '95.00',
+            'currency': 'EUR',
+            'category': self.category.id,
+            'is_expense': True,
+            'date': timezone.localtime(self.transaction.date).strftime('%Y-%m-%dT%H:%M'),
+            'description': 'Cena'
+        }
+        response = self.client.post(reverse('pfinance:transactions_update', args=[self.transaction.pk]), data)
+        self.assertRedirects(response, reverse('pfinance:transactions_list'))
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.amount, Decimal('95.00'))
+        self.assertEqual(BudgetPeriod.objects.get(budget=self.budget).spent, Decimal('95.00'))
+
+    def test_transaction_update_other_user_404(self):
+        other = User.objects.create_user(username='other', password='12345')
+        UserProfile.objects.create(user=other, currency='EUR')
+        self.client.login(username='other', password='12345')
+        response = self.client.get(reverse('pfinance:transactions_update', args=[self.transaction.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
 class BudgetListViewTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='testuser', password='12345')
@@ -259,6 +322,31 @@ class BudgetCreateViewTest(TestCase):
         self.assertEqual(response.status_code, 302)  # Redirección después de creación
         self.assertEqual(Budget.objects.count(), 1)
 
+    def test_budget_history_json(self):
+        budget = Budget.objects.create(user=self.user, category=self.category, amount=Decimal('50.00'), frequency='monthly')
+        Transaction.objects.create(user=self.user, category=self.category, amount=Decimal('20.00'))
+        self.client.login(username='testuser', password='12345')
+        response = self.client.get(reverse('pfinance:budgets_history', args=[budget.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['spent'], [20.0])
+
+        User.objects.create_user(username='other', password='12345')
+        self.client.login(username='other', password='12345')
+        self.assertEqual(self.client.get(reverse('pfinance:budgets_history', args=[budget.pk])).status_code, 404)
+
+    def test_budget_create_rejects_second_active_budget(self):
+        Budget.objects.create(user=self.user, category=self.category, amount=Decimal('100.00'), frequency='yearly')
+        self.client.login(username='testuser', password='12345')
+        data = {
+            'category': self.category.id,
+            'amount': '300.00',
+            'frequency': 'monthly'
+        }
+        response = self.client.post(reverse('pfinance:budgets_create'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Ya existe un presupuesto activo para esta categoría")
+        self.assertEqual(Budget.objects.count(), 1)
+
 
 class RecurringPaymentListViewTest(TestCase):
     def setUp(self):
@@ -341,4 +429,66 @@ class AlertListViewTest(TestCase):
         response = self.client.get(reverse('pfinance:alerts'))
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'pfinance/alerts_list.html')
-        self.assertEqual(len(response.context['alerts']), 1)
\ No newline at end of file
+        self.assertEqual(len(response.context['alerts']), 1)
+
+    def test_alert_detail_resolves_period_transactions(self):
+        category = Category.objects.create(name='Comida', is_expense=True)
+        Budget.objects.create(user=self.user, category=category, amount=Decimal('10.00'), frequency='monthly')
+        Transaction.objects.create(user=self.user, category=category, amount=Decimal('12.00'))
+        alert = Alert.objects.get(user=self.user, budget__isnull=False)
+
+        self.client.login(username='testuser', password='12345')
+        response = self.client.get(reverse('pfinance:alert_detail', args=[alert.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['transactions']), 1)
+        self.assertContains(response, '12.00')
+
+@override_settings(CSRF_COOKIE_SECURE=False, CSRF_COOKIE_HTTPONLY=False)
+class MarkAlertsReadBulkViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.profile = UserProfile.objects.create(user=self.user, currency='EUR')
+        self.alerts = [
+            Alert.objects.create(user=self.user, title=f'Alerta {i}', message='Mensaje', alert_type='system')
+            for i in range(3)
+        ]
+        self.client.login(username='testuser', password='12345')
+
+    def test_mark_selected(self):
+        response = self.client.post(reverse('pfinance:mark_alerts_read_bulk'), {
+            'scope': 'selected',
+            'alert_ids': [self.alerts[0].pk, self.alerts[1].pk]
+        })
+        self.assertRedirects(response, reverse('pfinance:alerts'))
+        self.assertEqual(Alert.objects.filter(user=self.user, read=False).count(), 1)
+
+    def test_mark_selected_rejects_invalid_ids(self):
+        response = self.client.post(reverse('pfinance:mark_alerts_read_bulk'), {
+            'scope': 'selected',
+            'alert_ids': [self.alerts[0].pk, 'x']
+        })
+        self.assertRedirects(response, reverse('pfinance:alerts'))
+        self.assertEqual(Alert.objects.filter(user=self.user, read=False).count(), 3)
+
+    def test_mark_all(self):
+        self.client.post(reverse('pfinance:mark_alerts_read_bulk'), {'scope': 'all'})
+        self.assertFalse(Alert.objects.filter(user=self.user, read=False).exists())
+        response = self.client.get(reverse('pfinance:alerts'))
+        self.assertEqual(response.context['unread_count'], 0)
+
+    def test_mark_all_logs_only_unread(self):
+        Alert.objects.filter(pk=self.alerts[0].pk).update(read=True)
+        ChangeLog.objects.all().delete()
+
+        self.client.post(reverse('pfinance:mark_alerts_read_bulk'), {'scope': 'all'})
+
+        self.assertEqual(
+            set(ChangeLog.objects.filter(model='alert').values_list('object_id', flat=True)),
+            {self.alerts[1].pk, self.alerts[2].pk}
+        )
+
+    def test_mark_single_other_user_404(self):
+        other = User.objects.create_user(username='other', password='12345')
+        alert = Alert.objects.create(user=other, title='Ajena', message='Mensaje', alert_type='system')
+        response = self.client.post(reverse('pfinance:mark_alerts_read', args=[alert.pk]))
+        self.assertEqual(response.status_code, 404)
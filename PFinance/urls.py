@@ -11,6 +11,7 @@ app_name = 'pfinance'
 urlpatterns = [
     # Autenticación, dashboard y landing page
     path('dashboard/', views.DashboardView.as_view(), name="dashboard"),
+    path('dashboard/forecast/', views.ForecastView.as_view(), name="forecast"),
     path('register/', views.SignUpView.as_view(template_name='registration/register.html'), name='register'),
     path('login/', LoginView.as_view(template_name='registration/login.html'), name='login'),
     path('logout/', LogoutView.as_view(template_name='registration/logout.html'), name='logout'),
@@ -25,6 +26,7 @@ urlpatterns = [
     # Alertas
     path('alerts/', views.AlertsListView.as_view(), name='alerts'),
     path('alerts/<int:alert_id>/', views.AlertDetailView.as_view(), name='alert_detail'),
+    path('alerts/mark-read/', views.MarkAlertsReadBulkView.as_view(), name='mark_alerts_read_bulk'),
     path('alerts/<int:pk>/mark-read/', views.MarkAlertReadView.as_view(), name='mark_alerts_read'),
     path('alerts/<int:pk>/delete/', views.AlertDeleteView.as_view(), name='alert_delete'),
 
@@ -32,13 +34,18 @@ urlpatterns = [
     # Transacciones
     path('transactions/', views.TransactionListView.as_view(), name='transactions_list'),
     path('transactions/create/', views.TransactionCreateView.as_view(), name='transactions_create'),
+    path('transactions/<int:pk>/edit/', views.TransactionUpdateView.as_view(), name='transactions_update'),
     path('transactions/<int:pk>/delete/', views.TransactionDeleteView.as_view(), name='transactions_delete'),
+    path('transactions/bulk/delete/', views.TransactionBulkView.as_view(action='delete'), name='transactions_bulk_delete'),
+    path('transactions/bulk/recategorize/', views.TransactionBulkView.as_view(action='recategorize'), name='transactions_bulk_recategorize'),
+    path('transactions/bulk/edit/', views.TransactionBulkView.as_view(action='edit'), name='transactions_bulk_edit'),
 
 
     # Presupuestos
     path('budgets/', views.BudgetListView.as_view(), name='budgets_list'),
     path('budgets/create/', views.BudgetCreateView.as_view(), name='budgets_create'),
     path('budgets/<int:pk>/delete/', views.BudgetDeleteView.as_view(), name='budgets_delete'),
+    path('budgets/<int:pk>/history/', views.BudgetHistoryView.as_view(), name='budgets_history'),
 
 
     # Pagos recurrentes
@@ -59,6 +66,14 @@ urlpatterns = [
     path('goals/<int:pk>/delete/', views.GoalDeleteView.as_view(), name='goal_delete'),
     path('<int:pk>/edit/', views.GoalUpdateAmountView.as_view(), name='goal_edit'),
 
+
+    # Sincronización de clientes
+    path('sync/', views.SyncView.as_view(), name='sync'),
+
+
+    # Monitorización
+    path('cache/stats/', views.CacheStatsView.as_view(), name='cache_stats'),
+
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 if settings.DEBUG:
@@ -1,19 +1,28 @@
 import json
-from datetime import timedelta
 
 from django.contrib import messages
 from django.contrib.auth import login
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.messages.views import SuccessMessageMixin
-from django.db.models import Sum, Q
-from django.shortcuts import get_object_or_404, redirect
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.http import JsonResponse, Http404
+from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.views.generic import TemplateView, CreateView, UpdateView, DetailView, DeleteView, ListView, View
 
-
+from PFinance.analytics import category_name, day_number, load_snapshot, month_bounds
+from PFinance.archive import archived_category_cents, archived_total
+from PFinance.bulk import bulk_delete, bulk_update
+from PFinance.cache import alerts_cache, cache_stats
+from PFinance.categories import category_registry
+from PFinance.currency import convert, converted_sum
+from PFinance.forecast import forecast_cash_flow
 from PFinance.forms import *
 
-from PFinance.models import UserProfile, Alert, Budget, Transaction, RecurringPayment, RecurringIncome, Goal
+from PFinance.models import UserProfile, Alert, Budget, BudgetPeriod, ChangeLog, Transaction, RecurringPayment, RecurringIncome, Goal
+from PFinance.periods import last_months, month_period
+from PFinance.sync import changes_since
 
 
 CURRENCY_SYMBOLS = {
@@ -82,118 +91,66 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             'goals_data': self.get_goals_data(user),
             'budgets_data': self.get_budgets_data(user),
             'recurring_incomes_data': self.get_recurring_incomes_data(user),
-            'recurring_payments_data': self.get_recurring_payments_data(user)
+            'recurring_payments_data': self.get_recurring_payments_data(user),
+            'forecast_data': forecast_cash_flow(user, months=6)['monthly']
         })
         return context
 
     def get_category_expenses(self, user):
         """Gastos agrupados por categoría (mes actual)"""
-        current_month = timezone.now().month
-        queryset = (
-            Transaction.objects
-            .filter(user=user, is_expense=True, date__month=current_month)
-            .values('category__name')
-            .annotate(total=Sum('amount')))
+        period = month_period()
+        totals = load_snapshot(user).totals_by_category(
+            day_number(period.start), day_number(period.end), is_expense=True
+        )
 
         return {
-            'labels': [item['category__name'] for item in queryset],
-            'values': [float(item['total']) for item in queryset]
+            'labels': [category_name(category_id) for category_id in totals],
+            'values': [cents / 100 for cents in totals.values()]
         }
 
     def get_monthly_summary(self, user):
         """Resumen de ingresos/gastos últimos 6 meses"""
-        data = []
-        for i in range(5, -1, -1):  # Desde hace 5 meses hasta el actual
-            month = timezone.now() - timedelta(days=30 * i)
-            month_start = month.replace(day=1, hour=0, minute=0, second=0)
-            month_end = (month_start + timedelta(days=32)).replace(day=1)
-
-            monthly = (
-                Transaction.objects
-                .filter(user=user, date__range=(month_start, month_end))
-                .aggregate(
-                    expenses=Sum('amount', filter=Q(is_expense=True)),
-                    income=Sum('amount', filter=Q(is_expense=False))
-                )
-            )
-
-            data.append({
-                'label': month.strftime("%b %Y"),
-                'expenses': float(monthly['expenses'] or 0),
-                'income': float(monthly['income'] or 0)
-            })
+        periods = last_months(6)  # Desde hace 5 meses hasta el actual
+        bounds = month_bounds(periods)
+        snapshot = load_snapshot(user)
+        expenses = snapshot.totals_by_bucket(bounds, is_expense=True)
+        income = snapshot.totals_by_bucket(bounds, is_expense=False)
 
         return {
-            'labels': [item['label'] for item in data],
-            'expenses': [item['expenses'] for item in data],
-            'income': [item['income'] for item in data]
+            'labels': [period.start.strftime("%b %Y") for period in periods],
+            'expenses': (expenses / 100).tolist(),
+            'income': (income / 100).tolist()
         }
 
     def get_category_trends(self, user):
         """Evolución mensual de gastos por categoría (últimos 6 meses)"""
-        # Obtener solo las 5 categorías con más gastos
-        top_categories = (
-            Transaction.objects
-            .filter(user=user, is_expense=True)
-            .values('category__name')
-            .annotate(total=Sum('amount'))
-            .order_by('-total')[:5]
-        )
-        categories = [item['category__name'] for item in top_categories]
+        snapshot = load_snapshot(user)
+        periods = last_months(6)
 
-        # Preparar estructura de datos
-        data = {
-            'labels': [],
-            'data': {},
+        # Solo las 5 categorías con más gastos (histórico, incluido el archivo), en una matriz categoría x mes
+        categories = snapshot.top_categories(5, extra=archived_category_cents(user.pk, user.profile.currency))
+        matrix = snapshot.totals_by_bucket(month_bounds(periods), is_expense=True, categories=categories)
+
+        return {
+            'labels': [period.start.strftime("%b %Y") for period in periods],
+            'data': {
+                category_name(category_id): (row / 100).tolist()
+                for category_id, row in zip(categories, matrix)
+            },
             'colors': [
                 '#4e73df', '#1cc88a', '#36b9cc', '#f6c23e',
                 '#e74a3b', '#858796', '#5a5c69', '#2e59d9'
             ]
         }
 
-        # Obtener últimos 6 meses
-        for i in range(5, -1, -1):
-            month = timezone.now() - timedelta(days=30 * i)
-            month_label = month.strftime("%b %Y")
-            data['labels'].append(month_label)
-
-            month_start = month.replace(day=1, hour=0, minute=0, second=0)
-            month_end = (month_start + timedelta(days=32)).replace(day=1)
-
-            # Consulta por categoría
-            for category in categories:
-                total = (
-                        Transaction.objects
-                        .filter(
-                            user=user,
-                            is_expense=True,
-                            category__name=category,
-                            date__range=(month_start, month_end)
-                        )
-                        .aggregate(total=Sum('amount'))['total'] or 0
-                )
-
-                if category not in data['data']:
-                    data['data'][category] = []
-
-                data['data'][category].append(float(total))
-
-        return data
-
     def get_goals_data(self, user):
         """Datos para gráfico de metas en formato bar stacked"""
-        goals = Goal.objects.filter(user=user, status='in_progress')
-        return {
-            'labels': [goal.subject for goal in goals],
-            'target': [float(goal.target_amount) for goal in goals],
-            'current': [float(goal.current_amount) for goal in goals],
-            'progress': [goal.progress_percentage() for goal in goals]
-        }
+        return Goal.objects.filter(user=user, status='in_progress').chart_data()
 
     def get_budgets_data(self, user):
         """Datos para gráfico de presupuestos con filtro por período"""
-        budgets = Budget.objects.filter(user=user, is_active=True).select_related('category')
-        now = timezone.now()
+        # Límite, gasto y estado salen del mismo período: con arrastre el límite no es budget.amount
+        budgets = Budget.objects.filter(user=user, is_active=True).select_related('category').with_current_period()
 
         budgets_data = {
             'labels': [],
@@ -203,31 +160,10 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         }
 
         for budget in budgets:
-            # Determinar rango de fechas según frecuencia
-            if budget.frequency == 'yearly':
-                date_filter = {
-                    'date__year': now.year
-                }
-            else:  # monthly
-                date_filter = {
-                    'date__year': now.year,
-                    'date__month': now.month
-                }
-
-            # Calcular gastos solo para el período
-            spent = float(
-                Transaction.objects.filter(
-                    user=user,
-                    category=budget.category,
-                    is_expense=True,
-                    **date_filter
-                ).aggregate(total=Sum('amount'))['total'] or 0
-            )
-
             budgets_data['labels'].append(budget.category.name)
-            budgets_data['amounts'].append(float(budget.amount))
-            budgets_data['spent'].append(spent)
-            budgets_data['states'].append(budget.state)
+            budgets_data['amounts'].append(float(budget.current_amount))
+            budgets_data['spent'].append(float(budget.current_spent))
+            budgets_data['states'].append(budget.current_state)
 
         return budgets_data
 
@@ -251,6 +187,16 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         }
 
 
+# Previsión del balance en JSON (?months=N, máximo 24)
+class ForecastView(LoginRequiredMixin, View):
+    def get(self, request, *args, **kwargs):
+        try:
+            months = int(request.GET.get('months', 6))
+        except ValueError:
+            return JsonResponse({'error': "El parámetro 'months' debe ser un número"}, status=400)
+        return JsonResponse(forecast_cash_flow(request.user, months=months))
+
+
 # Vista de registro
 class SignUpView(CreateView):
     form_class = SignUpForm
@@ -306,8 +252,8 @@ class AlertDetailView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         alert_id = self.kwargs.get('alert_id')
-        alert = self.request.user.alerts.get(id=alert_id)
-        transactions = alert.transactions.all()
+        alert = self.request.user.alerts.select_related('budget').get(id=alert_id)
+        transactions = alert.get_related_transactions()
         if not alert.read:
             alert.read = True
             alert.save(update_fields=['read'])
@@ -330,10 +276,36 @@ class AlertDeleteView(LoginRequiredMixin, DeleteView):
 class MarkAlertReadView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         alert_id = kwargs.get('pk')
-        alert = get_object_or_404(Alert, pk=alert_id, user=request.user)
-        if not alert.read:
-            alert.read = True
-            alert.save()
+        if not Alert.objects.filter(pk=alert_id, user=request.user).update(read=True):
+            raise Http404
+        # update() no envía post_save
+        ChangeLog.record(Alert, [(alert_id, request.user.pk)])
+        alerts_cache.invalidate(request.user.pk)
+        return redirect('pfinance:alerts')
+
+
+# Vista para marcar varias (o todas) las alertas como leídas con un solo UPDATE
+class MarkAlertsReadBulkView(LoginRequiredMixin, View):
+    def post(self, request, *args, **kwargs):
+        form = AlertBulkReadForm(request.POST)
+        if not form.is_valid():
+            messages.error(request, "Selección de alertas no válida")
+            return redirect('pfinance:alerts')
+
+        alerts = Alert.objects.filter(user=request.user, read=False)
+
+        if form.cleaned_data['scope'] == 'selected':
+            alerts = alerts.filter(pk__in=form.cleaned_data['alert_ids'])
+
+        # Solo las no leídas, bloqueadas hasta el UPDATE: se registran exactamente las que cambian
+        with db_transaction.atomic():
+            pks = list(alerts.select_for_update().values_list('pk', flat=True))
+            updated = Alert.objects.filter(pk__in=pks).update(read=True)
+            if updated:
+                ChangeLog.record(Alert, [(pk, request.user.pk) for pk in pks])
+        if updated:
+            alerts_cache.invalidate(request.user.pk)
+            messages.success(request, f"{updated} alertas marcadas como leídas")
         return redirect('pfinance:alerts')
 
 
@@ -344,7 +316,19 @@ class BudgetListView(LoginRequiredMixin, ListView):
     context_object_name = 'budgets'
 
     def get_queryset(self):
-        return Budget.objects.filter(user=self.request.user).select_related('category')
+        return Budget.objects.filter(user=self.request.user).select_related('category').with_current_period()
+
+
+# Histórico de un presupuesto por períodos en JSON (?periods=N, 12 por defecto)
+class BudgetHistoryView(LoginRequiredMixin, View):
+    def get(self, request, pk, *args, **kwargs):
+        try:
+            count = int(request.GET.get('periods', 12))
+        except ValueError:
+            return JsonResponse({'error': "El parámetro 'periods' debe ser un número"}, status=400)
+        if not Budget.objects.filter(pk=pk, user=request.user).exists():
+            raise Http404
+        return JsonResponse(BudgetPeriod.objects.filter(budget_id=pk).chart_data(limit=max(1, min(count, 60))))
 
 
 # Vista para crear presupuestos
@@ -400,18 +384,27 @@ class TransactionListView(LoginRequiredMixin, ListView):
         context = super().get_context_data(**kwargs)
         user = self.request.user
 
-        # Totales para resumen
-        context['total_expenses'] = Transaction.objects.filter(
-            user=user, is_expense=True
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        context['total_income'] = Transaction.objects.filter(
-            user=user, is_expense=False
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        # Totales para resumen: una sola consulta más los resúmenes anuales del archivo
+        currency = user.profile.currency
+        totals = Transaction.objects.filter(user=user).aggregate(
+            expenses=converted_sum(currency, filter=Q(is_expense=True)),
+            income=converted_sum(currency, filter=Q(is_expense=False)),
+        )
+        context['total_expenses'] = (totals['expenses'] or 0) + archived_total(user.pk, currency, is_expense=True)
+        context['total_income'] = (totals['income'] or 0) + archived_total(user.pk, currency, is_expense=False)
 
-        context['metas'] = Goal.objects.filter(user=user).aggregate(total=Sum('current_amount'))['total'] or 0
+        # Mantenido incrementalmente por las aportaciones a metas
+        context['metas'] = user.profile.goals_saved
 
         context['balance'] = context['total_income'] - context['total_expenses'] - context['metas']
+        context['bulk_form'] = TransactionBulkForm()
+
+        # Importe en la divisa del perfil para las filas en otra divisa (tabla de tipos en memoria)
+        for transaction in context['transactions']:
+            if transaction.currency and transaction.currency != currency:
+                transaction.converted_amount = convert(
+                    transaction.amount, transaction.currency, currency, transaction.date
+                )
 
         return context
 
@@ -428,6 +421,10 @@ class TransactionCreateView(LoginRequiredMixin, CreateView):
         kwargs['user'] = self.request.user
         return kwargs
 
+    def get_initial(self):
+        # El perfil ya está cargado por el middleware de zona horaria
+        return {**super().get_initial(), 'currency': self.request.user.profile.currency}
+
     def form_valid(self, form):
         form.instance.user = self.request.user
         return super().form_valid(form)
@@ -435,8 +432,30 @@ class TransactionCreateView(LoginRequiredMixin, CreateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        context['categories'] = Category.objects.all()
+        context['categories'] = category_registry.all()
+
+        return context
+
+
+# Vista para editar transacciones (las señales ajustan solo la diferencia en los presupuestos)
+class TransactionUpdateView(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
+    model = Transaction
+    form_class = TransactionForm
+    template_name = 'pfinance/transactions_create.html'
+    success_url = reverse_lazy('pfinance:transactions_list')
+    success_message = "Transacción actualizada"
+
+    def get_queryset(self):
+        return Transaction.objects.filter(user=self.request.user)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        return kwargs
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['categories'] = category_registry.all()
         return context
 
 
@@ -450,6 +469,44 @@ class TransactionDeleteView(LoginRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
+# Operaciones en bloque sobre las transacciones seleccionadas en la lista
+class TransactionBulkView(LoginRequiredMixin, View):
+    action = None  # 'delete', 'recategorize' o 'edit'
+
+    def post(self, request, *args, **kwargs):
+        form = TransactionBulkForm(request.POST)
+        if not form.is_valid():
+            messages.error(request, "Selecciona al menos una transacción")
+            return redirect('pfinance:transactions_list')
+        pks = form.cleaned_data['transaction_ids']
+
+        if self.action == 'delete':
+            count = bulk_delete(request.user, pks)
+            messages.success(request, f"{count} transacciones eliminadas")
+            return redirect('pfinance:transactions_list')
+
+        if self.action == 'recategorize':
+            changes = {'category': form.cleaned_data['category']}
+            if changes['category'] is None:
+                messages.error(request, "Selecciona la nueva categoría")
+                return redirect('pfinance:transactions_list')
+        else:
+            changes = form.changes()
+            if not changes:
+                messages.error(request, "Indica al menos un campo que modificar")
+                return redirect('pfinance:transactions_list')
+
+        try:
+            count = bulk_update(request.user, pks, **changes)
+        except ValueError as error:
+            # Categoría y tipo de transacción no concuerdan en alguna fila
+            messages.error(request, str(error))
+            return redirect('pfinance:transactions_list')
+        verb = "recategorizadas" if self.action == 'recategorize' else "actualizadas"
+        messages.success(request, f"{count} transacciones {verb}")
+        return redirect('pfinance:transactions_list')
+
+
 # Vista para la lista de pagos recurrentes
 class RecurringPaymentListView(LoginRequiredMixin, ListView):
     model = RecurringPayment
@@ -542,7 +599,7 @@ class GoalListView(LoginRequiredMixin, ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        return self.request.user.goals.all()
+        return self.request.user.goals.with_progress()
 
 
 # Vista para crear metas
@@ -570,10 +627,16 @@ class GoalUpdateAmountView(LoginRequiredMixin, UpdateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['progress_percentage'] = self.object.progress_percentage()
+        context['contributions'] = self.object.contributions.all()[:10]
         return context
 
     def form_valid(self, form):
-        response = super().form_valid(form)
+        # Se registra la diferencia como aportación en lugar de sobrescribir el monto
+        previous = Goal.objects.filter(pk=self.object.pk).values_list('current_amount', flat=True).get()
+        delta = form.cleaned_data['current_amount'] - previous
+        if delta:
+            self.object.add_contribution(delta, note="Actualización manual")
+        response = redirect(self.get_success_url())
 
         # Verificación adicional en la vista
         if self.object.current_amount >= self.object.target_amount:
@@ -594,4 +657,20 @@ class GoalDeleteView(LoginRequiredMixin, DeleteView):
         return self.request.user.goals.all()
 
 
+# Vista de sincronización incremental para clientes móviles/offline
+class SyncView(LoginRequiredMixin, View):
+    def get(self, request, *args, **kwargs):
+        try:
+            since = int(request.GET.get('since', 0))
+        except ValueError:
+            return JsonResponse({'error': "El parámetro 'since' debe ser un número"}, status=400)
+        return JsonResponse(changes_since(request.user.pk, since))
+
+
+# Vista de monitorización de la caché (solo staff)
+class CacheStatsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    def test_func(self):
+        return self.request.user.is_staff
 
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(cache_stats())
@@ -59,6 +59,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'PFinance.middleware.UserTimezoneMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -100,6 +101,35 @@ DATABASES = {
     }
 }
 
+# Importes en céntimos (BIGINT) en lugar de NUMERIC (ver PFinance/money.py).
+# Cambiarlo en una base de datos existente requiere convert_money_columns.
+PFINANCE_INTEGER_MONEY = env.bool('PFINANCE_INTEGER_MONEY', default=False)
+
+
+# Caché
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Con REDIS_CACHE_URL (p. ej. redis://redis:6379/1) se usa el Redis del
+# docker-compose; sin ella, caché local en memoria por proceso.
+REDIS_CACHE_URL = env('REDIS_CACHE_URL', default='')
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': 'pfinance',
+            'TIMEOUT': env.int('CACHE_TIMEOUT', default=300),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'pfinance',
+            'TIMEOUT': env.int('CACHE_TIMEOUT', default=300),
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -187,5 +217,33 @@ CELERY_BEAT_SCHEDULE = {
     'process_recurring_payments':{
         'task': 'PFinance.tasks.process_recurring_payments',
         'schedule': crontab(hour=0, minute=0),  # Ejecutar cada día a las 00:00
-    }
+    },
+    'purge_old_alerts': {
+        'task': 'PFinance.tasks.purge_old_alerts',
+        'schedule': crontab(hour=3, minute=0, day_of_week=0),  # Domingos a las 03:00
+    },
+    'detect_anomalies': {
+        'task': 'PFinance.tasks.detect_anomalies',
+        'schedule': crontab(hour=2, minute=0),  # Cada noche a las 02:00
+    },
+    'open_budget_periods': {
+        'task': 'PFinance.tasks.open_budget_periods',
+        'schedule': crontab(hour=0, minute=15),  # Cada día a las 00:15
+    },
+    'project_budgets': {
+        'task': 'PFinance.tasks.project_budgets',
+        'schedule': crontab(hour=1, minute=0),  # Cada noche a las 01:00, tras los pagos recurrentes
+    },
+    'create_transaction_partitions': {
+        'task': 'PFinance.tasks.create_transaction_partitions',
+        'schedule': crontab(hour=4, minute=0, day_of_month=25),  # Día 25 de cada mes (sin efecto si no hay particiones)
+    },
+    'compact_changelog': {
+        'task': 'PFinance.tasks.compact_changelog',
+        'schedule': crontab(hour=3, minute=30, day_of_week=0),  # Domingos a las 03:30
+    },
+    'archive_transactions': {
+        'task': 'PFinance.tasks.archive_transactions',
+        'schedule': crontab(hour=4, minute=30, day_of_month=2, month_of_year=1),  # 2 de enero: archiva el año que sale de la ventana
+    },
 }